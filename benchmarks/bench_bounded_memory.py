@@ -0,0 +1,84 @@
+"""
+measures the memory taken by the values, the hit rate and the
+read throughput of a skewed read workload against max_items
+
+usage: python benchmarks/bench_bounded_memory.py [record count] [reads]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from dictstore import DictStore
+
+DEFAULT_RECORD_COUNT = 100000
+DEFAULT_READ_COUNT = 200000
+MAX_ITEMS = [None, 100000, 10000, 1000]
+
+
+def skewed_keys(record_count, read_count):
+    """returns keys read mostly from a small set of hot keys"""
+    generator = random.Random(25)
+    return [
+        int(record_count * generator.random() ** 4)
+        for _ in range(read_count)
+        ]
+
+
+def main(record_count, read_count):
+    """prints the memory, hit rate and read time for every max_items"""
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'bounded.dictstore')
+        with DictStore(file_name) as dict_store:
+            dict_store.set_many(
+                (number, {'name': 'user ' + str(number), 'data': 'x' * 200})
+                for number in range(record_count)
+                )
+
+        keys = skewed_keys(record_count, read_count)
+
+        print('{} records, {} reads'.format(record_count, read_count))
+        print('{:>10} {:>12} {:>10} {:>12} {:>10}'.format(
+            'max_items', 'memory (MB)', 'hit rate', 'reads (k/s)',
+            'evictions'))
+
+        for max_items in MAX_ITEMS:
+            tracemalloc.start()
+            if max_items is None:
+                dict_store = DictStore(file_name)
+            else:
+                dict_store = DictStore(file_name, max_items=max_items)
+
+            start_time = time.perf_counter()
+            for key in keys:
+                dict_store[key]
+            elapsed_time = time.perf_counter() - start_time
+
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            info = dict_store.cache_info()
+            if info is None:
+                hit_rate, evictions = 1.0, 0
+            else:
+                hit_rate = info.hits / (info.hits + info.misses)
+                evictions = info.evictions
+            dict_store.close()
+
+            print('{:>10} {:>12.1f} {:>10.3f} {:>12.0f} {:>10}'.format(
+                'all' if max_items is None else max_items,
+                memory / 1024 / 1024,
+                hit_rate,
+                read_count / elapsed_time / 1000,
+                evictions
+                ))
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RECORD_COUNT,
+        int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_READ_COUNT
+        )
@@ -0,0 +1,75 @@
+"""
+measures the time taken by find with and without an index
+on the queried field, the time taken to build the index
+and the time of writes keeping it up to date
+
+usage: python benchmarks/bench_field_index.py [record count] [repeats]
+"""
+
+import itertools
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+from dictstore import DictStore
+
+DEFAULT_RECORD_COUNT = 200000
+STATUSES = ['done'] * 97 + ['queued'] * 2 + ['failed']
+
+
+def main(record_count, repeats):
+    """prints the find and write times with and without the index"""
+    with tempfile.TemporaryDirectory() as directory:
+        dict_store = DictStore(
+            os.path.join(directory, 'indexed.dictstore'),
+            append_only=True,
+            compaction_ratio=None
+            )
+        dict_store.set_many(
+            ('job:' + str(number),
+             {'status': STATUSES[number % len(STATUSES)],
+              'owner': 'user ' + str(number % 50)})
+            for number in range(record_count)
+            )
+
+        scan_time = min(timeit.repeat(
+            lambda: dict_store.find(status='failed'),
+            number=1, repeat=repeats)) * 1000
+
+        numbers = itertools.count(record_count)
+        plain_write_time = min(timeit.repeat(
+            lambda: dict_store.upsert_record(
+                'job:' + str(next(numbers)), {'status': 'queued'}),
+            number=1000, repeat=repeats)) * 1000
+
+        dict_store.create_index('status')
+        start_time = time.perf_counter()
+        expected_keys = dict_store.find(status='failed')
+        build_time = (time.perf_counter() - start_time) * 1000
+
+        index_time = min(timeit.repeat(
+            lambda: dict_store.find(status='failed'),
+            number=1, repeat=repeats)) * 1000
+        index_write_time = min(timeit.repeat(
+            lambda: dict_store.upsert_record(
+                'job:' + str(next(numbers)), {'status': 'queued'}),
+            number=1000, repeat=repeats)) * 1000
+
+        assert len(expected_keys) == record_count // len(STATUSES)
+        dict_store.close()
+
+    print('{} records, {} found'.format(record_count, len(expected_keys)))
+    print('find: {:.3f} ms scanning, {:.3f} ms with the index, '
+          '{:.0f}x'.format(scan_time, index_time, scan_time / index_time))
+    print('building the index: {:.3f} ms'.format(build_time))
+    print('1000 writes: {:.3f} ms without the index, {:.3f} ms with it'
+          .format(plain_write_time, index_write_time))
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RECORD_COUNT,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        )
@@ -0,0 +1,58 @@
+"""
+measures the time taken to open a datastore
+against the number of records in its data file
+
+usage: python benchmarks/bench_load.py [record counts...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from dictstore import DictStore
+from dictstore.codec import LiteralCodec, FastLiteralCodec
+
+
+def create_data_file(file_name, record_count):
+    """writes a data file with the given number of records"""
+    with DictStore(file_name) as dict_store:
+        dict_store.set_many(
+            ('key:' + str(number), number * 1.5 if number % 2 else str(number))
+            for number in range(record_count)
+            )
+
+
+def time_open(file_name, codec):
+    """returns the seconds taken to load the data file"""
+    start_time = time.perf_counter()
+    dict_store = DictStore(file_name, codec=codec)
+    elapsed_time = time.perf_counter() - start_time
+    dict_store.close()
+    return elapsed_time
+
+
+def main(record_counts):
+    """prints the open time for each record count and codec"""
+    print('{:>10} {:>14} {:>14} {:>8}'.format(
+        'records', 'literal (s)', 'fast (s)', 'speedup'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for record_count in record_counts:
+            file_name = os.path.join(
+                directory, str(record_count) + '.dictstore')
+            create_data_file(file_name, record_count)
+
+            literal_time = time_open(file_name, LiteralCodec())
+            fast_time = time_open(file_name, FastLiteralCodec())
+
+            print('{:>10} {:>14.3f} {:>14.3f} {:>7.1f}x'.format(
+                record_count,
+                literal_time,
+                fast_time,
+                literal_time / fast_time
+                ))
+
+
+if __name__ == '__main__':
+    main([int(count) for count in sys.argv[1:]] or [1000, 10000, 100000])
@@ -0,0 +1,64 @@
+"""
+measures the time taken to open a datastore
+against the number of processes parsing its data file
+
+usage: python benchmarks/bench_parallel_load.py [record count] [workers...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from dictstore import DictStore
+
+DEFAULT_RECORD_COUNT = 500000
+DEFAULT_WORKERS = [1, 2, 4, 8]
+
+
+def create_data_file(file_name, record_count):
+    """writes a data file with the given number of records"""
+    with DictStore(file_name) as dict_store:
+        dict_store.set_many(
+            (('user', number),
+             {'name': 'user ' + str(number), 'scores': [number, 1.5, -2]})
+            for number in range(record_count)
+            )
+
+
+def time_open(file_name, workers):
+    """returns the seconds taken to load the data file"""
+    start_time = time.perf_counter()
+    dict_store = DictStore(file_name, load_workers=workers)
+    elapsed_time = time.perf_counter() - start_time
+    dict_store.close()
+    return elapsed_time
+
+
+def main(record_count, workers_list):
+    """prints the open time for each number of workers"""
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'parallel.dictstore')
+        create_data_file(file_name, record_count)
+
+        print('{} records, {:.1f} MB'.format(
+            record_count, os.path.getsize(file_name) / 1024 / 1024))
+        print('{:>10} {:>14} {:>8}'.format('workers', 'open (s)', 'speedup'))
+
+        base_time = None
+        for workers in workers_list:
+            elapsed_time = time_open(file_name, workers)
+            if base_time is None:
+                base_time = elapsed_time
+            print('{:>10} {:>14.3f} {:>7.1f}x'.format(
+                workers,
+                elapsed_time,
+                base_time / elapsed_time
+                ))
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RECORD_COUNT,
+        [int(workers) for workers in sys.argv[2:]] or DEFAULT_WORKERS
+        )
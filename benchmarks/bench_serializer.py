@@ -0,0 +1,67 @@
+"""
+measures the throughput of the serializer against the
+get_escaped_string function dictstore used before it,
+without and with the serialization cache
+
+usage: python benchmarks/bench_serializer.py [repeats]
+"""
+
+import sys
+import timeit
+
+from dictstore.serializer import Serializer
+
+
+def old_get_escaped_string(var):
+    """the function used before the serializer, kept for comparison"""
+    if isinstance(var, str):
+        return '\'' + var + '\''
+    return str(var)
+
+
+def workload(name):
+    """returns the keys and values written by a workload"""
+    if name == 'short strings':
+        return ['key:' + str(number % 1000) for number in range(100000)]
+    if name == 'long strings':
+        return ['value ' * 50 + str(number % 100) for number in range(20000)]
+    if name == 'tuple keys':
+        return [('user', str(number % 1000)) for number in range(100000)]
+    if name == 'numbers':
+        return [number * 1.5 for number in range(100000)]
+    return [
+        {'name': 'user ' + str(number), 'scores': [number, 1.5, -2]}
+        for number in range(20000)
+        ]
+
+
+WORKLOADS = ['short strings', 'long strings', 'tuple keys', 'numbers', 'dicts']
+
+
+def throughput(function, objects, repeats):
+    """returns the objects converted per second"""
+    elapsed_time = min(timeit.repeat(
+        lambda: list(map(function, objects)), number=1, repeat=repeats))
+    return len(objects) / elapsed_time
+
+
+def main(repeats):
+    """prints the throughput of every function for every workload"""
+    print('{:>14} {:>14} {:>14} {:>14}'.format(
+        'workload', 'old (k/s)', 'uncached (k/s)', 'cached (k/s)'))
+
+    for name in WORKLOADS:
+        objects = workload(name)
+        uncached = Serializer(cache_size=0)
+        cached = Serializer()
+
+        print('{:>14} {:>14.0f} {:>14.0f} {:>14.0f}'.format(
+            name,
+            throughput(old_get_escaped_string, objects, repeats) / 1000,
+            throughput(uncached.serialize, objects, repeats) / 1000,
+            throughput(cached.serialize, objects, repeats) / 1000
+            ))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
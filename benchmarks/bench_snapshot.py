@@ -0,0 +1,68 @@
+"""
+measures the time taken to open an append only datastore
+with and without a snapshot as the history of its data file grows
+
+usage: python benchmarks/bench_snapshot.py [overwrite rounds...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from dictstore import DictStore
+
+KEY_COUNT = 10000
+
+
+def create_data_file(file_name, rounds):
+    """
+    writes every key once per round so that the data file
+    holds rounds records for each key
+    """
+    with DictStore(file_name,
+                   append_only=True,
+                   compaction_ratio=None,
+                   snapshot=True) as dict_store:
+        for round_number in range(rounds):
+            dict_store.set_many(
+                ('key:' + str(number), round_number)
+                for number in range(KEY_COUNT)
+                )
+
+
+def time_open(file_name, snapshot):
+    """returns the seconds taken to load the data file"""
+    start_time = time.perf_counter()
+    dict_store = DictStore(file_name,
+                           append_only=True,
+                           compaction_ratio=None,
+                           snapshot=snapshot)
+    elapsed_time = time.perf_counter() - start_time
+    dict_store.close()
+    return elapsed_time
+
+
+def main(rounds_list):
+    """prints the open time for each history length"""
+    print('{:>10} {:>14} {:>14} {:>8}'.format(
+        'records', 'replay (s)', 'snapshot (s)', 'speedup'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for rounds in rounds_list:
+            file_name = os.path.join(directory, str(rounds) + '.dictstore')
+            create_data_file(file_name, rounds)
+
+            replay_time = time_open(file_name, False)
+            snapshot_time = time_open(file_name, True)
+
+            print('{:>10} {:>14.3f} {:>14.3f} {:>7.1f}x'.format(
+                rounds * KEY_COUNT,
+                replay_time,
+                snapshot_time,
+                replay_time / snapshot_time
+                ))
+
+
+if __name__ == '__main__':
+    main([int(rounds) for rounds in sys.argv[1:]] or [1, 5, 20])
@@ -0,0 +1,94 @@
+"""
+measures the time taken by prefix and range scans with the
+sorted key index against filtering all the keys, and the
+time of writes with and without the index
+
+usage: python benchmarks/bench_sorted_keys.py [key count] [repeats]
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+
+from dictstore import DictStore
+
+DEFAULT_KEY_COUNT = 200000
+
+
+def filter_prefix(dict_store, prefix):
+    """returns the keys starting with prefix by filtering all the keys"""
+    return sorted(
+        key for key in dict_store.keys()
+        if isinstance(key, str) and key.startswith(prefix)
+        )
+
+
+def filter_range(dict_store, lo, hi):
+    """returns the tuple keys from lo to hi by filtering all the keys"""
+    return sorted(
+        key for key in dict_store.keys()
+        if isinstance(key, tuple) and lo <= key < hi
+        )
+
+
+def main(key_count, repeats):
+    """prints the scan and write times with and without the index"""
+    with tempfile.TemporaryDirectory() as directory:
+        dict_store = DictStore(
+            os.path.join(directory, 'sorted.dictstore'),
+            append_only=True,
+            compaction_ratio=None,
+            sorted_keys=True
+            )
+        dict_store.set_many(
+            ('job:' + str(number), number) for number in range(key_count))
+        dict_store.set_many(
+            (('run', number), number) for number in range(key_count))
+
+        scans = [
+            ('prefix', lambda: list(dict_store.prefix('job:1234')),
+             lambda: filter_prefix(dict_store, 'job:1234')),
+            ('range', lambda: list(dict_store.range(('run', 1000),
+                                                    ('run', 1100))),
+             lambda: filter_range(dict_store, ('run', 1000), ('run', 1100))),
+            ]
+
+        print('{} keys'.format(len(dict_store)))
+        print('{:>8} {:>14} {:>14} {:>8}'.format(
+            'scan', 'filter (ms)', 'index (ms)', 'speedup'))
+        for name, indexed_scan, filtered_scan in scans:
+            assert indexed_scan() == filtered_scan()
+            filter_time = min(timeit.repeat(
+                filtered_scan, number=1, repeat=repeats)) * 1000
+            index_time = min(timeit.repeat(
+                indexed_scan, number=1, repeat=repeats)) * 1000
+            print('{:>8} {:>14.3f} {:>14.3f} {:>7.0f}x'.format(
+                name, filter_time, index_time, filter_time / index_time))
+
+        numbers = iter(range(key_count, key_count * 2))
+        index_write_time = min(timeit.repeat(
+            lambda: dict_store.upsert_record('job:' + str(next(numbers)), 0),
+            number=1000, repeat=repeats)) * 1000
+        dict_store.close()
+
+        plain_store = DictStore(
+            os.path.join(directory, 'plain.dictstore'),
+            append_only=True,
+            compaction_ratio=None
+            )
+        numbers = iter(range(key_count * 2))
+        plain_write_time = min(timeit.repeat(
+            lambda: plain_store.upsert_record('job:' + str(next(numbers)), 0),
+            number=1000, repeat=repeats)) * 1000
+        plain_store.close()
+
+        print('1000 writes: {:.3f} ms without the index, {:.3f} ms with it'
+              .format(plain_write_time, index_write_time))
+
+
+if __name__ == '__main__':
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_KEY_COUNT,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 5
+        )
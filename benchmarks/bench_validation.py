@@ -0,0 +1,91 @@
+"""
+measures the time taken to validate flat, wide and deep values
+with the recursive validator dictstore used before and the
+current one, and the time of writes with and without validation
+
+usage: python benchmarks/bench_validation.py [repeats]
+"""
+
+import os
+import sys
+import tempfile
+import timeit
+
+from dictstore import DictStore
+from dictstore.helpers import MAX_DEPTH, is_supported_value_type
+
+
+def recursive_is_supported_value_type(value):
+    """the recursive validator, kept for comparison"""
+    if isinstance(value, (str, bytes, int, float, bool)) or value is None:
+        return True
+    if isinstance(value, (tuple, list, set)):
+        for item in value:
+            if not recursive_is_supported_value_type(item):
+                return False
+        return True
+    if isinstance(value, dict):
+        for sub_key, sub_value in value.items():
+            if not recursive_is_supported_value_type(sub_key):
+                return False
+            if not recursive_is_supported_value_type(sub_value):
+                return False
+        return True
+    return False
+
+
+def deep_value(depth):
+    """returns lists nested depth levels deep"""
+    value = [1, 'a']
+    for _ in range(depth):
+        value = [value, 2.5]
+    return value
+
+
+VALUES = {
+    'flat': list(range(100000)),
+    'wide': {
+        'user:' + str(number): ['name', number, 1.5, None]
+        for number in range(10000)
+        },
+    'deep': deep_value(MAX_DEPTH - 1),
+    }
+
+
+def main(repeats):
+    """prints the validation and write times of every value"""
+    print('{:>6} {:>15} {:>15} {:>8} {:>13} {:>13}'.format(
+        'value', 'recursive (ms)', 'iterative (ms)', 'speedup',
+        'write (ms)', 'trusted (ms)'))
+
+    with tempfile.TemporaryDirectory() as directory:
+        dict_store = DictStore(
+            os.path.join(directory, 'validation.dictstore'),
+            append_only=True,
+            compaction_ratio=None
+            )
+
+        for name, value in VALUES.items():
+            recursive_time = min(timeit.repeat(
+                lambda: recursive_is_supported_value_type(value),
+                number=1, repeat=repeats)) * 1000
+            iterative_time = min(timeit.repeat(
+                lambda: is_supported_value_type(value),
+                number=1, repeat=repeats)) * 1000
+            write_time = min(timeit.repeat(
+                lambda: dict_store.upsert_record(name, value),
+                number=1, repeat=repeats)) * 1000
+            trusted_time = min(timeit.repeat(
+                lambda: dict_store.upsert_record(name, value, trusted=True),
+                number=1, repeat=repeats)) * 1000
+
+            print('{:>6} {:>15.3f} {:>15.3f} {:>7.1f}x {:>13.3f} {:>13.3f}'
+                  .format(name, recursive_time, iterative_time,
+                          recursive_time / iterative_time,
+                          write_time, trusted_time))
+
+        dict_store.close()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
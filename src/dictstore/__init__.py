@@ -1,4 +1,6 @@
 """__init__ module for dictstore package."""
 
 from .interface import *
-__all__ = ['DictStore']
+from .async_interface import AsyncDictStore
+from .sharding import ShardedDictStore
+__all__ = ['DictStore', 'AsyncDictStore', 'ShardedDictStore']
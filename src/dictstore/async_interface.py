@@ -0,0 +1,302 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+asyncio interface for dictstore.
+reads are served from memory and writes are
+persisted by a writer thread, off the event loop.
+"""
+
+import asyncio
+import queue
+import threading
+
+from typing import Any
+
+from dictstore.cache import MISSING
+from dictstore.interface import DictStore
+
+# operations handled by the writer thread
+_SET = 'set'
+_DELETE = 'delete'
+_SYNC = 'sync'
+_STOP = 'stop'
+
+
+class AsyncDictStore:
+    """
+    wraps a DictStore for asyncio applications.
+
+    reads return values from memory right away. the values of a
+    datastore that is neither lazy nor multiprocess are read from
+    its dict without the read lock, so reads do not wait for the
+    writer thread while it rewrites the data file. a read can see
+    a write shortly before the awaitable of the write completes.
+    reads of other datastores and scans take the read lock and
+    wait for the rewrites.
+
+    writes return awaitables that complete once the writer
+    thread has written them to the data file. the writes waiting
+    for the writer thread are written together as one transaction,
+    so a burst of writes costs a single append or rewrite.
+    """
+
+    def __init__(self,
+                 datastore_location='./default.dictstore',
+                 **kwargs) -> None:
+        """
+        opens the datastore with the given options of DictStore.
+        reads are made from the event loop while the writer thread
+        writes, so the datastore is opened in thread safe mode.
+                Exceptions:
+                    ValueError
+        """
+
+        kwargs.setdefault('thread_safe', True)
+        self.dict_store = DictStore(datastore_location, **kwargs)
+        if not self.dict_store.thread_safe:
+            raise ValueError('AsyncDictStore needs a datastore '
+                             'opened with thread_safe=True')
+
+        # every value is in a dict that can be read without locks
+        self.__lock_free_reads = not (
+            self.dict_store.lazy or self.dict_store.multiprocess)
+
+        self.__queue = queue.Queue()
+        self.__closed = False
+        self.__writer = threading.Thread(
+            target=self.__write_queued_operations,
+            name='dictstore-writer',
+            daemon=True
+            )
+        self.__writer.start()
+
+    # -----------------
+    # Read Operations
+    # -----------------
+    # Reads are served from the in memory dictionary.
+    # Reads of single keys of an eager datastore do not
+    # wait for the writer thread
+    # -----------------
+
+    def __lookup(self, key: Any) -> Any:
+        """returns the value of the key, or MISSING if it does not exist"""
+        if self.__lock_free_reads:
+            return self.dict_store.in_memory_dictionary.get(key, MISSING)
+        return self.dict_store.get(key, MISSING)
+
+    def get(self, key: Any) -> Any:
+        """
+        takes a key and returns the value if it exists.
+        returns None if the key does not exist.
+        """
+        value = self.__lookup(key)
+        return None if value is MISSING else value
+
+    def keys(self):
+        """returns a live view of the keys in the datastore"""
+        return self.dict_store.keys()
+
+    def values(self):
+        """returns a live view of the values in the datastore"""
+        return self.dict_store.values()
+
+    def items(self):
+        """returns a live view of the key value pairs in the datastore"""
+        return self.dict_store.items()
+
+    def range(self, lo: Any = None, hi: Any = None):
+        """returns an iterator over the keys from lo to hi, sorted"""
+        return self.dict_store.range(lo, hi)
+
+    def prefix(self, prefix: Any):
+        """returns an iterator over the keys starting with prefix, sorted"""
+        return self.dict_store.prefix(prefix)
+
+    def find(self, **fields) -> list:
+        """
+        returns the keys of the records whose value is a dict
+        holding all the given fields with the given values
+        """
+        return self.dict_store.find(**fields)
+
+    def create_index(self, field: Any) -> None:
+        """indexes the field of the dict values for find"""
+        self.dict_store.create_index(field)
+
+    def cache_info(self) -> Any:
+        """returns the counters of the values cached in lazy mode"""
+        return self.dict_store.cache_info()
+
+    def __getitem__(self, key):
+        """perform get operation with the given key"""
+        return self.get(key)
+
+    def __contains__(self, key: Any) -> bool:
+        """checks if the key is in the datastore"""
+        return self.__lookup(key) is not MISSING
+
+    def __iter__(self):
+        """iterates over the keys of the datastore"""
+        return iter(self.dict_store)
+
+    def __len__(self) -> int:
+        """returns the number of records in the database"""
+        return len(self.dict_store)
+
+    # -----------------
+    # Write Operations
+    # -----------------
+    # Writes are queued for the writer thread and complete
+    # once they are written to the data file
+    # -----------------
+
+    def __submit(self, operation, argument=None) -> asyncio.Future:
+        """
+        queues an operation for the writer thread
+                Exceptions:
+                    RuntimeError
+        """
+        if self.__closed:
+            raise RuntimeError('the datastore is closed')
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self.__queue.put((operation, argument, loop, future))
+        return future
+
+    async def set(self, key: Any, value: Any) -> None:
+        """upserts the key value pair"""
+        await self.__submit(_SET, [(key, value)])
+
+    async def update(self, mapping) -> None:
+        """
+        takes a mapping or an iterable of key value pairs
+        and upserts all of them
+        """
+        if hasattr(mapping, 'keys'):
+            records = [(key, mapping[key]) for key in mapping.keys()]
+        else:
+            records = list(mapping)
+        await self.__submit(_SET, records)
+
+    async def delete(self, key: Any) -> None:
+        """removes the record of the key if it exists"""
+        await self.__submit(_DELETE, [key])
+
+    async def delete_many(self, keys) -> None:
+        """removes the records of the keys that exist"""
+        await self.__submit(_DELETE, list(keys))
+
+    async def flush(self) -> None:
+        """
+        waits until all the writes made before it are
+        written to the disk using fsync
+        """
+        await self.__submit(_SYNC)
+
+    async def close(self) -> None:
+        """
+        waits for the queued writes, stops the writer thread
+        and closes the datastore
+        """
+        stopped = self.__submit(_STOP)
+        self.__closed = True
+        await stopped
+        self.dict_store.close()
+
+    async def __aenter__(self) -> 'AsyncDictStore':
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        await self.close()
+
+    # -----------------
+    # Writer Thread
+    # -----------------
+
+    @staticmethod
+    def __complete(loop, future, error=None) -> None:
+        """completes the future of an operation on its event loop"""
+
+        def set_outcome():
+            if future.cancelled():
+                return
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+        try:
+            loop.call_soon_threadsafe(set_outcome)
+        except RuntimeError:
+            # the event loop was closed before the write completed,
+            # nobody waits for the future and the writer keeps going
+            pass
+
+    def __write_queued_operations(self) -> None:
+        """
+        waits for operations and writes all the operations
+        queued at the time in a single transaction
+        """
+
+        while True:
+            operations = [self.__queue.get()]
+            while True:
+                try:
+                    operations.append(self.__queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if not self.__write_batch(operations):
+                return
+
+    def __write_batch(self, operations) -> bool:
+        """
+        writes a batch of operations and completes their futures.
+        returns False once the writer thread has to stop.
+        """
+
+        errors = {}
+
+        try:
+            with self.dict_store.transaction():
+                for index, (operation, argument, _, _) in enumerate(
+                        operations):
+                    try:
+                        if operation == _SET:
+                            self.dict_store.set_many(argument)
+                        elif operation == _DELETE:
+                            self.dict_store.delete_many(argument)
+                    except Exception as error:
+                        # an invalid write fails on its own
+                        errors[index] = error
+        except Exception as error:
+            # the transaction was not written, every write fails
+            for index, operation in enumerate(operations):
+                if operation[0] in (_SET, _DELETE):
+                    errors.setdefault(index, error)
+
+        keep_running = True
+        for index, (operation, _, loop, future) in enumerate(operations):
+            # the writes of the batch are all written by now
+            if operation in (_SYNC, _STOP):
+                try:
+                    self.dict_store.sync()
+                except Exception as error:
+                    errors[index] = error
+                if operation == _STOP:
+                    keep_running = False
+            self.__complete(loop, future, errors.get(index))
+
+        return keep_running
@@ -0,0 +1,259 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+caches of values read from the data file on demand.
+"""
+
+import collections
+import collections.abc
+import threading
+
+from typing import Any, Callable
+
+
+# returned by the cache when a key is not cached
+MISSING = object()
+
+# marks a key deleted before the delete is in the data file
+_DELETED = object()
+
+
+# counters of a cache, returned by LRUCache.info
+CacheInfo = collections.namedtuple(
+    'CacheInfo',
+    ['hits', 'misses', 'evictions', 'items', 'bytes']
+    )
+
+
+class LRUCache:
+    """
+    keeps the most recently used values up to max_items values
+    and max_bytes bytes, as given by the size of every value put.
+    max_items of None keeps every value, 0 keeps none.
+    max_bytes of None does not limit the size of the values.
+
+    it counts the values found and not found by get,
+    and the values evicted to make room for other values.
+    """
+
+    def __init__(self, max_items=1024, max_bytes=None) -> None:
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        # cached value and its size of every key
+        self.__values = collections.OrderedDict()
+        self.__bytes = 0
+        self.__lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Any) -> Any:
+        """returns the cached value of the key or MISSING"""
+        with self.__lock:
+            entry = self.__values.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISSING
+            self.hits += 1
+            self.__values.move_to_end(key)
+            return entry[0]
+
+    def peek(self, key: Any) -> Any:
+        """
+        returns the cached value of the key or MISSING
+        without counting it or marking it as used
+        """
+        with self.__lock:
+            entry = self.__values.get(key)
+            return MISSING if entry is None else entry[0]
+
+    def put(self, key: Any, value: Any, size=0) -> None:
+        """caches the value evicting the least recently used values"""
+        if self.max_items == 0:
+            return
+        with self.__lock:
+            previous_entry = self.__values.pop(key, None)
+            if previous_entry is not None:
+                self.__bytes -= previous_entry[1]
+
+            # a value larger than the cache is not cached
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+
+            self.__values[key] = (value, size)
+            self.__bytes += size
+            while (
+                (self.max_items is not None and
+                 len(self.__values) > self.max_items) or
+                (self.max_bytes is not None and
+                 self.__bytes > self.max_bytes)
+               ):
+                _, (_, evicted_size) = self.__values.popitem(last=False)
+                self.__bytes -= evicted_size
+                self.evictions += 1
+
+    def discard(self, key: Any) -> None:
+        """removes the cached value of the key if there is one"""
+        with self.__lock:
+            entry = self.__values.pop(key, None)
+            if entry is not None:
+                self.__bytes -= entry[1]
+
+    def clear(self) -> None:
+        """removes all the cached values"""
+        with self.__lock:
+            self.__values.clear()
+            self.__bytes = 0
+
+    def info(self) -> CacheInfo:
+        """returns the counters and the current size of the cache"""
+        with self.__lock:
+            return CacheInfo(
+                self.hits,
+                self.misses,
+                self.evictions,
+                len(self.__values),
+                self.__bytes
+                )
+
+    def __len__(self) -> int:
+        return len(self.__values)
+
+
+class LazyDictionary(collections.abc.MutableMapping):
+    """
+    a dictionary whose values stay in the data file until
+    they are read. It holds the location of every key in the
+    data file and a cache of the values read recently.
+
+    values set on the dictionary and deletes of the keys in the
+    data file are kept in memory until they are marked as persisted.
+    """
+
+    def __init__(self,
+                 locations: dict,
+                 read_value: Callable[[Any], Any],
+                 cache_size=1024,
+                 cache_bytes=None) -> None:
+        """
+            locations:
+                dictionary of keys to their location in the data file,
+                as a tuple of (offset, size).
+                it is owned and updated by the datastore.
+            read_value:
+                callable that reads the value at a location.
+            cache_size:
+                number of values read from the data file
+                that are kept in memory.
+            cache_bytes:
+                size of the records of the values kept in memory,
+                None does not limit it.
+        """
+        self.locations = locations
+        self.__read_value = read_value
+        self.cache = LRUCache(cache_size, cache_bytes)
+
+        # values and deletes that are not in the data file yet
+        self.__unpersisted = {}
+
+    def __getitem__(self, key: Any) -> Any:
+        value = self.__unpersisted.get(key, MISSING)
+        if value is _DELETED:
+            raise KeyError(key)
+        if value is not MISSING:
+            return value
+
+        location = self.locations[key]
+
+        value = self.cache.get(key)
+        if value is MISSING:
+            value = self.__read_value(location)
+            self.cache.put(key, value, location[1])
+        return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.cache.discard(key)
+        self.__unpersisted[key] = value
+
+    def __delitem__(self, key: Any) -> None:
+        if key not in self:
+            raise KeyError(key)
+        self.cache.discard(key)
+        if key in self.locations:
+            self.__unpersisted[key] = _DELETED
+        else:
+            del self.__unpersisted[key]
+
+    def __contains__(self, key: Any) -> bool:
+        value = self.__unpersisted.get(key, MISSING)
+        if value is not MISSING:
+            return value is not _DELETED
+        return key in self.locations
+
+    def __iter__(self):
+        for key in self.locations:
+            if self.__unpersisted.get(key) is not _DELETED:
+                yield key
+        for key, value in self.__unpersisted.items():
+            if key not in self.locations and value is not _DELETED:
+                yield key
+
+    def __len__(self) -> int:
+        length = len(self.locations)
+        for key, value in self.__unpersisted.items():
+            if key not in self.locations:
+                length += 1
+            elif value is _DELETED:
+                length -= 1
+        return length
+
+    def iter_items(self):
+        """
+        yields the keys and their values. values that are not
+        cached are read from the data file without being cached,
+        so that going through a large datastore does not evict
+        the values used recently.
+        """
+        for key in self:
+            value = self.__unpersisted.get(key, MISSING)
+            if value is MISSING:
+                value = self.cache.peek(key)
+            if value is MISSING:
+                value = self.__read_value(self.locations[key])
+            yield key, value
+
+    def persisted(self, key: Any, value: Any) -> None:
+        """
+        marks the value of the key as written to the data file.
+        its location must already be in locations.
+        """
+        self.__unpersisted.pop(key, None)
+        self.cache.put(key, value, self.locations[key][1])
+
+    def deleted(self, key: Any) -> None:
+        """
+        marks the delete of the key as written to the data file.
+        its location must already be removed from locations.
+        """
+        self.__unpersisted.pop(key, None)
+        self.cache.discard(key)
+
+    def all_persisted(self) -> None:
+        """marks every value and delete as written to the data file"""
+        for key, value in self.__unpersisted.items():
+            if value is not _DELETED:
+                self.cache.put(key, value, self.locations[key][1])
+        self.__unpersisted.clear()
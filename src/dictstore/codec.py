@@ -0,0 +1,135 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+codecs convert keys and values to and from
+the lines stored in the data file.
+
+A codec is any object with an encode method that returns
+the line for a key or value (without the newline) and
+a decode method that returns the key or value for a line.
+"""
+
+import ast
+import re
+
+from typing import Any
+
+from dictstore.exceptions import DataStoreFileCorrupted
+from dictstore.serializer import serialize
+
+
+class _EmptySets(ast.NodeTransformer):
+    """replaces the set() calls of a literal with empty sets"""
+
+    def visit_Call(self, node):
+        if (
+            isinstance(node.func, ast.Name) and
+            node.func.id == 'set' and
+            not node.args and
+            not node.keywords
+           ):
+            return ast.copy_location(ast.Set(elts=[]), node)
+        # any other call is rejected by literal_eval
+        return node
+
+
+def literal_eval(text: str) -> Any:
+    """
+    ast.literal_eval that reads set(), the literal of an empty set,
+    on every python version and not only from python 3.9
+    """
+    try:
+        return ast.literal_eval(text)
+    except ValueError:
+        if 'set()' not in text:
+            raise
+
+    tree = _EmptySets().visit(ast.parse(text, mode='eval'))
+    return ast.literal_eval(tree)
+
+
+class LiteralCodec:
+    """
+    stores keys and values as python literals
+    and reads them back using ast.literal_eval
+    """
+
+    def encode(self, obj: Any) -> str:
+        """returns the literal for the given key or value"""
+        return serialize(obj)
+
+    def decode(self, line: str) -> Any:
+        """
+        returns the key or value for the given literal
+                Exceptions:
+                    DataStoreFileCorrupted
+        """
+        try:
+            return literal_eval(line)
+        except (ValueError, SyntaxError, TypeError) as error:
+            raise DataStoreFileCorrupted() from error
+
+
+class FastLiteralCodec(LiteralCodec):
+    """
+    reads plain strings, integers, floats, booleans and None
+    without building an AST and falls back to
+    ast.literal_eval for everything else
+    """
+
+    CONSTANTS = {'None': None, 'True': True, 'False': False}
+
+    INTEGER = re.compile(r'-?(?:0|[1-9][0-9]*)')
+
+    FLOAT = re.compile(
+        r'-?(?:[0-9]+\.[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?'
+        r'|-?[0-9]+[eE][-+]?[0-9]+'
+        )
+
+    def decode(self, line: str) -> Any:
+        """
+        returns the key or value for the given literal
+                Exceptions:
+                    DataStoreFileCorrupted
+        """
+        text = line.rstrip('\n')
+
+        if not text:
+            return super().decode(text)
+
+        first_character = text[0]
+
+        # a quoted string without escapes
+        # or quotes inside it is its own value
+        if first_character in ('\'', '"'):
+            if (
+                len(text) > 1 and
+                text[-1] == first_character and
+                text.find(first_character, 1, -1) == -1 and
+                '\\' not in text
+               ):
+                return text[1:-1]
+            return super().decode(text)
+
+        if text in self.CONSTANTS:
+            return self.CONSTANTS[text]
+
+        if self.INTEGER.fullmatch(text):
+            return int(text)
+
+        if self.FLOAT.fullmatch(text):
+            return float(text)
+
+        return super().decode(text)
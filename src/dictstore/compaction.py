@@ -0,0 +1,124 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+compaction keeps the size of an append only data file bounded
+by rewriting it once enough of it is made of dead records.
+"""
+
+import threading
+
+from typing import Callable
+
+
+class Compactor:
+    """
+    tracks the live and dead bytes of a data file
+    and compacts it when the garbage ratio is crossed.
+    """
+
+    def __init__(self,
+                 compact: Callable[[], None],
+                 garbage_ratio=0.5,
+                 min_file_size=64 * 1024,
+                 background=False) -> None:
+        """
+        creates a compactor for a data file.
+
+            compact:
+                callable that rewrites the data file
+                with only the live records.
+            garbage_ratio:
+                fraction of dead bytes in the file that
+                triggers compaction. None disables it.
+            min_file_size:
+                files smaller than this are never compacted.
+            background:
+                when True, compaction runs on a background thread.
+        """
+
+        if garbage_ratio is not None and not 0 < garbage_ratio <= 1:
+            raise ValueError('garbage_ratio must be in the range (0, 1]')
+
+        self.compact = compact
+        self.garbage_ratio = garbage_ratio
+        self.min_file_size = min_file_size
+        self.background = background
+
+        self.live_bytes = 0
+        self.dead_bytes = 0
+
+        self.__thread = None
+
+    def add_live(self, size: int) -> None:
+        """records a new live record of the given size"""
+        self.live_bytes += size
+
+    def add_dead(self, size: int) -> None:
+        """records that a live record of the given size is now dead"""
+        self.live_bytes -= size
+        self.dead_bytes += size
+
+    def add_garbage(self, size: int) -> None:
+        """records a record that is dead as soon as it is written"""
+        self.dead_bytes += size
+
+    def reset(self, live_bytes: int) -> None:
+        """resets the counters after the data file is rewritten"""
+        self.live_bytes = live_bytes
+        self.dead_bytes = 0
+
+    def current_garbage_ratio(self) -> float:
+        """returns the fraction of the data file made of dead records"""
+        total_bytes = self.live_bytes + self.dead_bytes
+        if total_bytes == 0:
+            return 0.0
+        return self.dead_bytes / total_bytes
+
+    def should_compact(self) -> bool:
+        """checks if the data file has crossed the garbage ratio"""
+        if self.garbage_ratio is None:
+            return False
+        if self.live_bytes + self.dead_bytes < self.min_file_size:
+            return False
+        return self.current_garbage_ratio() >= self.garbage_ratio
+
+    def is_running(self) -> bool:
+        """checks if a background compaction is in progress"""
+        return self.__thread is not None and self.__thread.is_alive()
+
+    def maybe_compact(self) -> None:
+        """
+        compacts the data file if the garbage ratio is crossed,
+        either inline or on a background thread
+        """
+
+        if not self.should_compact() or self.is_running():
+            return
+
+        if not self.background:
+            self.compact()
+            return
+
+        self.__thread = threading.Thread(
+            target=self.compact,
+            name='dictstore-compaction',
+            daemon=True
+            )
+        self.__thread.start()
+
+    def wait(self) -> None:
+        """waits for a running background compaction to finish"""
+        if self.__thread is not None:
+            self.__thread.join()
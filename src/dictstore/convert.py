@@ -0,0 +1,101 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+converts data files between the text and binary formats.
+
+usage:
+    python -m dictstore.convert source.dictstore --to binary
+    python -m dictstore.convert source.dictstore target.dictstore --to text
+"""
+
+import argparse
+import shutil
+
+from pathlib import Path
+
+from dictstore.formats import FORMATS
+from dictstore.interface import DictStore
+
+
+def convert_file(source_path, target_path=None, file_format='binary') -> None:
+    """
+    writes the live records of the source data file to the
+    target data file in the given format. the source data file
+    is converted in place when no target data file is given.
+    the target data file must not be open, its datastore
+    would not see the records copied to it, and neither must
+    a source data file converted in place, as it is closed
+    once converted.
+            Exceptions:
+                ValueError
+    """
+
+    if file_format not in FORMATS:
+        raise ValueError('file_format must be one of ' + ', '.join(FORMATS))
+
+    source_path = Path(source_path).resolve().__str__()
+    if target_path is not None:
+        target_path = Path(target_path).resolve().__str__()
+
+    if target_path is None or target_path == source_path:
+        if DictStore.opened_instance(source_path) is not None:
+            raise ValueError(source_path + ' is open, close it '
+                             'before converting it in place')
+    else:
+        if DictStore.opened_instance(target_path) is not None:
+            raise ValueError(target_path + ' is open, close it '
+                             'before converting onto it')
+
+        # buffered appends of an open datastore are part of it
+        source_dict_store = DictStore.opened_instance(source_path)
+        if source_dict_store is not None:
+            source_dict_store.flush()
+        shutil.copyfile(source_path, target_path)
+        source_path = target_path
+
+    dict_store = DictStore(source_path)
+    dict_store.file_handler.change_format(file_format)
+    dict_store.compact()
+    dict_store.close()
+
+
+def main(args=None) -> None:
+    """command line entry point of the conversion tool"""
+
+    parser = argparse.ArgumentParser(
+        prog='python -m dictstore.convert',
+        description='converts a dictstore data file to another format'
+        )
+    parser.add_argument('source', help='data file to convert')
+    parser.add_argument(
+        'target',
+        nargs='?',
+        help='data file to write, the source is converted in place '
+             'when it is not given'
+        )
+    parser.add_argument(
+        '--to',
+        dest='file_format',
+        choices=sorted(FORMATS),
+        default='binary',
+        help='format of the converted data file (default: binary)'
+        )
+
+    arguments = parser.parse_args(args)
+    convert_file(arguments.source, arguments.target, arguments.file_format)
+
+
+if __name__ == '__main__':
+    main()
@@ -67,3 +67,30 @@ class UnsupportedValueType(Exception):
                         "dicts, sets, booleans, None and Ellipsis."
                         )
         super().__init__(self.message)
+
+
+class UnsupportedFileVersion(Exception):
+    """
+    Raised when the data file was written by a newer
+    version of dictstore with a format it cannot read
+    """
+
+    def __init__(self, version) -> None:
+        self.message = ("The data file uses version {} of the binary "
+                        "format which is not supported by this version "
+                        "of dictstore".format(version)
+                        )
+        super().__init__(self.message)
+
+
+class ReadOnlyDataStore(Exception):
+    """
+    Raised when a write is made to a datastore
+    opened in read only mode
+    """
+
+    def __init__(self) -> None:
+        self.message = ("The datastore is opened in read only mode "
+                        "and cannot be written to"
+                        )
+        super().__init__(self.message)
@@ -0,0 +1,143 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+indexes of the records whose value is a dict
+by the value of one of its fields.
+"""
+
+from typing import Any
+
+# field missing from the value of a record
+_MISSING = object()
+
+
+def field_value(value: Any, field: Any) -> Any:
+    """
+    returns the value of the field if the value is a dict
+    holding the field, _MISSING otherwise
+    """
+    if isinstance(value, dict):
+        return value.get(field, _MISSING)
+    return _MISSING
+
+
+def matches(value: Any, fields: dict) -> bool:
+    """checks if the value is a dict holding all the fields"""
+    for field, expected_value in fields.items():
+        actual_value = field_value(value, field)
+        if actual_value is _MISSING or actual_value != expected_value:
+            return False
+    return True
+
+
+class FieldIndex:
+    """
+    maps the values of a field to the keys of the records
+    holding the field with that value.
+
+    the index is built from all the records the first time it is
+    used, and kept up to date by set and discard once it is built.
+    field values that cannot be hashed, like lists, are compared
+    one by one when they are searched.
+    """
+
+    def __init__(self, field: Any) -> None:
+        self.field = field
+        self.built = False
+
+        # keys of the records with every hashable field value
+        self.__keys = {}
+        # field value of every indexed key
+        self.__values = {}
+        # keys whose field value cannot be hashed
+        self.__unhashable_keys = set()
+
+    def build(self, items) -> None:
+        """indexes the key value pairs of all the records"""
+        self.invalidate()
+        self.built = True
+        for key, value in items:
+            self.set(key, value)
+
+    def invalidate(self) -> None:
+        """forgets the records, the index is built again when it is used"""
+        self.built = False
+        self.__keys.clear()
+        self.__values.clear()
+        self.__unhashable_keys.clear()
+
+    def set(self, key: Any, value: Any) -> None:
+        """indexes the new value of the key"""
+
+        if not self.built:
+            return
+
+        new_field_value = field_value(value, self.field)
+        previous_field_value = self.__values.get(key, _MISSING)
+        if previous_field_value is not _MISSING:
+            # writes of the values already indexed change nothing
+            if previous_field_value is new_field_value:
+                return
+            self.__remove(key, previous_field_value)
+
+        if new_field_value is _MISSING:
+            return
+
+        self.__values[key] = new_field_value
+        try:
+            keys = self.__keys.get(new_field_value)
+        except TypeError:
+            self.__unhashable_keys.add(key)
+            return
+        if keys is None:
+            self.__keys[new_field_value] = {key}
+        else:
+            keys.add(key)
+
+    def discard(self, key: Any) -> None:
+        """removes the key from the index if it is indexed"""
+        if not self.built:
+            return
+
+        previous_field_value = self.__values.get(key, _MISSING)
+        if previous_field_value is not _MISSING:
+            self.__remove(key, previous_field_value)
+
+    def __remove(self, key: Any, previous_field_value: Any) -> None:
+        """removes the key indexed under its previous field value"""
+
+        del self.__values[key]
+        if key in self.__unhashable_keys:
+            self.__unhashable_keys.discard(key)
+            return
+
+        keys = self.__keys[previous_field_value]
+        keys.discard(key)
+        if not keys:
+            del self.__keys[previous_field_value]
+
+    def find(self, value: Any) -> set:
+        """returns the keys of the records whose field equals the value"""
+        try:
+            return set(self.__keys.get(value, ()))
+        except TypeError:
+            return {
+                key for key in self.__unhashable_keys
+                if self.__values[key] == value
+                }
+
+    def __len__(self) -> int:
+        """returns the number of records holding the field"""
+        return len(self.__values)
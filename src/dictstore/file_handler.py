@@ -17,20 +17,75 @@ file handler reads and writes datastore entries to and from the disk.
 file paths are case sensitive.
 """
 
-import os.path
-import datetime
+import contextlib
+import io
+import mmap
+import os
+import threading
+import time
+import zlib
 
 from pathlib import Path
+from typing import Any
 
-from dictstore.exceptions import InvalidFileExtension
+from dictstore.exceptions import (
+    DataStoreFileCorrupted,
+    InvalidFileExtension,
+    ReadOnlyDataStore
+)
+from dictstore import parallel
+from dictstore.formats import (
+    FORMATS,
+    PUT,
+    BEGIN,
+    COMMIT,
+    TRUNCATED,
+    TextFormat
+)
 
+# the text format markers were defined in this module before
+# the formats module existed and are still available from here
+from dictstore.formats import (  # noqa: F401
+    TOMBSTONE,
+    BEGIN_MARKER,
+    COMMIT_MARKER,
+    generate_file_header_string
+)
 
-def generate_file_header_string() -> str:
-    """Generates file header string for the data file"""
-    header = '// Python Dictstore File\n'
-    date_string = str(datetime.datetime.now())
-    header += '// Last Rewrite: ' + date_string + '\n'
-    return header
+# durability modes supported by the file handler
+#   none            - appends stay in the buffer until it fills up,
+#                     or the data file is flushed or closed.
+#                     the buffered appends are lost on a crash
+#   flush           - appends are handed to the operating system
+#                     after every write, the default
+#   fsync-per-write - appends are written to the disk after every write
+#   group-commit    - appends are handed to the operating system after
+#                     every write and written to the disk in groups,
+#                     once per group_commit_interval seconds or
+#                     group_commit_size bytes
+DURABILITY_MODES = ('none', 'flush', 'fsync-per-write', 'group-commit')
+
+# access modes supported by the file handler
+#   r  - the data file is only read, it must exist
+#   rw - the data file is read and written, it is created if missing
+ACCESS_MODES = ('r', 'rw')
+
+
+def _sync_directory(directory_path) -> None:
+    """
+    writes the entries of the directory, like a file it was
+    renamed to, to the disk using fsync.
+    directories cannot be opened on windows, so this does nothing there.
+            Exceptions:
+                OSError
+    """
+    if os.name != 'posix':
+        return
+    directory_descriptor = os.open(directory_path, os.O_RDONLY)
+    try:
+        os.fsync(directory_descriptor)
+    finally:
+        os.close(directory_descriptor)
 
 
 class FileHandler:
@@ -44,53 +99,449 @@ class FileHandler:
             return True
         return False
 
-    def __init__(self, file_path) -> None:
+    def __init__(self,
+                 file_path,
+                 buffer_size=io.DEFAULT_BUFFER_SIZE,
+                 durability='flush',
+                 group_commit_interval=0.05,
+                 group_commit_size=1024 * 1024,
+                 file_format='text',
+                 codec=None,
+                 mode='rw',
+                 memory_map=False) -> None:
         """
         creates a file handler for the datastore file.
+        appends go through a long lived file handle which
+        buffers up to buffer_size bytes before writing them.
+        durability must be one of DURABILITY_MODES.
+        file_format ('text' or 'binary') is used when the data file
+        is created, the format of an existing data file is detected.
+        codec is used by the text format.
+        mode must be one of ACCESS_MODES.
+        memory_map reads the data file through a memory mapping
+        shared with the other processes reading it.
                 Exceptions:
                     OSError
+                    ValueError
                     InvalidFileExtension
         """
 
+        if durability not in DURABILITY_MODES:
+            raise ValueError('durability must be one of '
+                             + ', '.join(DURABILITY_MODES))
+
+        if mode not in ACCESS_MODES:
+            raise ValueError('mode must be one of '
+                             + ', '.join(ACCESS_MODES))
+
+        if file_format not in FORMATS:
+            raise ValueError('file_format must be one of '
+                             + ', '.join(FORMATS))
+
         # store the given file path
         self.file_path = file_path
+        self.buffer_size = buffer_size
+        self.durability = durability
+        self.group_commit_interval = group_commit_interval
+        self.group_commit_size = group_commit_size
+        self.codec = codec
+        self.mode = mode
+        self.memory_map = memory_map
+
+        # set when the data file ends with a group of records
+        # that was interrupted before its commit marker
+        self.has_interrupted_group = False
+
+        # the append and read handles and the memory mapping
+        # are opened on first use
+        self.__append_file = None
+        self.__read_file = None
+        self.__mapping = None
+
+        # guards the append handle against the group commit timer
+        self.__lock = threading.RLock()
+
+        # bytes appended since the last fsync and the time of it
+        self.__unsynced_bytes = 0
+        self.__last_sync_time = time.monotonic()
+        self.__sync_timer = None
 
         # check if the filename is valid
         if not self.__has_valid_file_extension():
             raise InvalidFileExtension()
 
         # check if file exists at path
-        # and create a datastore file if it doesn't exist
-        if not os.path.exists(self.file_path):
+        # and create a datastore file if it doesn't exist or is empty
+        if mode == 'r':
+            if not os.path.exists(self.file_path):
+                raise FileNotFoundError(self.file_path)
+        elif (
+            not os.path.exists(self.file_path) or
+            os.path.getsize(self.file_path) == 0
+           ):
             Path(os.path.dirname(self.file_path)).mkdir(
                 parents=True,
                 exist_ok=True
                 )
-            with open(self.file_path, 'w', encoding='utf-8') as data_file:
-                data_file.write(generate_file_header_string())
-
-        # open the file and read its contents
-        with open(self.file_path, 'r', encoding='utf-8') as data_file:
-            self.file_contents = data_file.read()
-
-    def rewrite_to_file(self, lines) -> None:
-        """Writes the given lines to data file"""
-        with open(self.file_path, 'w', encoding='utf-8') as data_file:
-            data_file.write(generate_file_header_string())
-            data_file.writelines(lines)
-
-    def append_to_file(self, string: str) -> None:
-        """Appends the given string to data file"""
-        with open(self.file_path, 'a', encoding='utf-8') as data_file:
-            data_file.write(string)
-
-    def read_from_file(self) -> str:
-        """
-        Reads the contents of data file and
-        returns all the contents of file
-        without the first two lines
-        """
-        with open(self.file_path, 'r', encoding='utf-8') as data_file:
-            data_file.readline()
-            data_file.readline()
-            return data_file.readlines()
+            self.format = self.__create_format(file_format)
+            with open(self.file_path, 'wb') as data_file:
+                data_file.write(self.format.header())
+
+        # the first bytes of the file tell its format
+        with open(self.file_path, 'rb') as data_file:
+            self.format = self.__detect_format(data_file.read(64))
+
+    def __create_format(self, file_format):
+        """returns the format object for the given format name"""
+        if file_format == TextFormat.name:
+            return TextFormat(self.codec)
+        return FORMATS[file_format]()
+
+    def __detect_format(self, first_bytes):
+        """returns the format object of the data file"""
+        for file_format in FORMATS.values():
+            if file_format.is_format_of(first_bytes):
+                return self.__create_format(file_format.name)
+        raise DataStoreFileCorrupted()
+
+    def reopen(self) -> None:
+        """
+        closes the handles of data file and detects its format
+        again, after the data file was changed by another process
+        """
+        with self.__lock:
+            self.close()
+            with open(self.file_path, 'rb') as data_file:
+                self.format = self.__detect_format(data_file.read(64))
+
+    def change_format(self, file_format) -> None:
+        """
+        sets the format used by the next rewrite of the data file.
+        appends must not be made before the data file is rewritten.
+        """
+        if file_format not in FORMATS:
+            raise ValueError('file_format must be one of '
+                             + ', '.join(FORMATS))
+        self.format = self.__create_format(file_format)
+
+    def rewrite_to_file(self, records) -> int:
+        """
+        Writes the given encoded records to data file
+        and returns the offset of the first record.
+        the records are written to a temporary file first
+        which then replaces the data file atomically.
+        the temporary file is removed if the rewrite fails.
+        """
+        self.__check_writable()
+
+        with self.__lock:
+            # the append handle points to the file being replaced
+            self.close()
+
+            temp_file_path = self.file_path + '.tmp'
+            header = self.format.header()
+            try:
+                with open(temp_file_path, 'wb') as data_file:
+                    data_file.write(header)
+                    data_file.writelines(records)
+                    if self.durability in ('fsync-per-write',
+                                           'group-commit'):
+                        data_file.flush()
+                        os.fsync(data_file.fileno())
+                    else:
+                        # written to the disk by the next sync
+                        self.__unsynced_bytes = data_file.tell()
+                os.replace(temp_file_path, self.file_path)
+            except BaseException:
+                # the data file is left as it was
+                with contextlib.suppress(OSError):
+                    os.remove(temp_file_path)
+                raise
+
+            if self.durability in ('fsync-per-write', 'group-commit'):
+                # the rename is only durable once the directory is synced
+                _sync_directory(os.path.dirname(self.file_path) or '.')
+
+            # values may have been read from the replaced file
+            self.__close_readers()
+
+            # the records of an interrupted group are not rewritten
+            self.has_interrupted_group = False
+
+        return len(header)
+
+    def append_to_file(self, data) -> int:
+        """
+        Appends the given encoded records to data file,
+        makes them as durable as the durability mode requires
+        and returns the offset they were written at.
+        """
+        self.__check_writable()
+
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+
+        with self.__lock:
+            if self.__append_file is None:
+                self.__append_file = open(
+                    self.file_path,
+                    'ab',
+                    buffering=self.buffer_size
+                    )
+            offset = self.__append_file.tell()
+            self.__append_file.write(data)
+            self.__unsynced_bytes += len(data)
+
+            if self.durability == 'flush':
+                self.__append_file.flush()
+            elif self.durability == 'fsync-per-write':
+                self.sync()
+            elif self.durability == 'group-commit':
+                self.__group_commit()
+
+        return offset
+
+    def __check_writable(self) -> None:
+        """raises ReadOnlyDataStore if the data file is read only"""
+        if self.mode == 'r':
+            raise ReadOnlyDataStore()
+
+    def __map_file(self, length=0):
+        """
+        returns the memory mapping of the data file.
+        the file is mapped again when the mapping is
+        shorter than length bytes.
+        """
+        if self.__mapping is None or len(self.__mapping) < length:
+            # the appends may still be in the append buffer
+            self.flush()
+            if self.__mapping is not None:
+                self.__mapping.close()
+            with open(self.file_path, 'rb') as data_file:
+                self.__mapping = mmap.mmap(
+                    data_file.fileno(),
+                    0,
+                    access=mmap.ACCESS_READ
+                    )
+        return self.__mapping
+
+    def __close_readers(self) -> None:
+        """closes the read handle and the memory mapping"""
+        if self.__read_file is not None:
+            self.__read_file.close()
+            self.__read_file = None
+        if self.__mapping is not None:
+            self.__mapping.close()
+            self.__mapping = None
+
+    def read_record(self, offset: int, size: int) -> bytes:
+        """Reads the encoded record at the offset of data file"""
+        with self.__lock:
+            if self.memory_map:
+                return self.__map_file(offset + size)[offset:offset + size]
+
+            # the record may still be in the append buffer
+            if self.__append_file is not None:
+                self.__append_file.flush()
+            if self.__read_file is None:
+                self.__read_file = open(self.file_path, 'rb')
+            self.__read_file.seek(offset)
+            return self.__read_file.read(size)
+
+    def read_value(self, location) -> Any:
+        """
+        Reads the value of the put record at the location
+        of data file. location is a tuple of (offset, size).
+                Exceptions:
+                    DataStoreFileCorrupted
+        """
+        return self.format.decode_record_value(self.read_record(*location))
+
+    def __group_commit(self) -> None:
+        """
+        writes the appends to the disk once the group is full
+        or old enough and schedules a sync for the rest
+        """
+        self.__append_file.flush()
+
+        elapsed_time = time.monotonic() - self.__last_sync_time
+        if (
+            self.__unsynced_bytes >= self.group_commit_size or
+            elapsed_time >= self.group_commit_interval
+           ):
+            self.sync()
+            return
+
+        if self.__sync_timer is None:
+            self.__sync_timer = threading.Timer(
+                self.group_commit_interval - elapsed_time,
+                self.__sync_from_timer
+                )
+            self.__sync_timer.daemon = True
+            self.__sync_timer.start()
+
+    def __sync_from_timer(self) -> None:
+        """writes the pending group to the disk"""
+        with self.__lock:
+            self.__sync_timer = None
+            self.sync()
+
+    def __cancel_sync_timer(self) -> None:
+        """cancels the scheduled group commit"""
+        if self.__sync_timer is not None:
+            self.__sync_timer.cancel()
+            self.__sync_timer = None
+
+    def flush(self) -> None:
+        """Writes the buffered appends to the data file"""
+        with self.__lock:
+            if self.__append_file is not None:
+                self.__append_file.flush()
+
+    def sync(self) -> None:
+        """Writes the buffered appends to the disk using fsync"""
+        with self.__lock:
+            self.__cancel_sync_timer()
+            if self.__append_file is not None and self.__unsynced_bytes:
+                self.__append_file.flush()
+                os.fsync(self.__append_file.fileno())
+            elif self.__unsynced_bytes:
+                # the data file was rewritten and not appended to since
+                with open(self.file_path, 'rb') as data_file:
+                    os.fsync(data_file.fileno())
+            self.__unsynced_bytes = 0
+            self.__last_sync_time = time.monotonic()
+
+    def close(self) -> None:
+        """
+        Flushes the buffered appends and closes
+        the append and read handles and the memory mapping
+        """
+        with self.__lock:
+            if self.durability in ('fsync-per-write', 'group-commit'):
+                self.sync()
+            self.__cancel_sync_timer()
+            if self.__append_file is not None:
+                self.__append_file.close()
+                self.__append_file = None
+            self.__close_readers()
+            self.__unsynced_bytes = 0
+
+    def size(self) -> int:
+        """Returns the size of data file including the buffered appends"""
+        with self.__lock:
+            self.flush()
+            return os.path.getsize(self.file_path)
+
+    def fingerprint(self, position: int) -> tuple:
+        """
+        Returns a fingerprint of the first position bytes of data file.
+        the header and the bytes just before the position are used,
+        they change when the data file is rewritten.
+        """
+        head_size = min(position, 4096)
+        tail_size = min(position - head_size, 4096)
+        return (
+            zlib.crc32(self.read_record(0, head_size)),
+            zlib.crc32(self.read_record(position - tail_size, tail_size))
+            )
+
+    def read_records(self, offset=None, workers=None, decode_values=False):
+        """
+        Streams the records of data file and
+        yields the committed records in it.
+        when offset is given, only the records
+        after the offset are read.
+        when workers is more than 1 and there are at least
+        parallel.PARALLEL_LOAD_MIN_SIZE bytes to read, chunks of
+        the file are parsed by that many processes.
+        the values of put records are decoded when decode_values
+        is True and yielded as they were read otherwise.
+        the records of a group are held back until
+        the commit marker of the group is read,
+        no other part of the file is kept in memory.
+        has_interrupted_group is set once all the records
+        are read if the file ends with an uncommitted group.
+                Exceptions:
+                    DataStoreFileCorrupted
+        """
+        self.flush()
+
+        self.has_interrupted_group = False
+
+        if workers is not None and workers > 1:
+            size_to_read = os.path.getsize(self.file_path) - (offset or 0)
+            if size_to_read >= parallel.PARALLEL_LOAD_MIN_SIZE:
+                records = parallel.iter_records(
+                    self.file_path,
+                    self.format,
+                    offset,
+                    workers,
+                    decode_values
+                    )
+                yield from self.__committed_records(
+                    records,
+                    self.__decode_raw_value if decode_values else None
+                    )
+                return
+
+        decode_value = self.format.decode_value if decode_values else None
+
+        if self.memory_map:
+            with self.__lock:
+                data_file = self.__map_file()
+                data_file.seek(0)
+            records = self.format.iter_records(data_file, offset)
+            yield from self.__committed_records(records, decode_value)
+        else:
+            with open(self.file_path, 'rb') as data_file:
+                records = self.format.iter_records(data_file, offset)
+                yield from self.__committed_records(records, decode_value)
+
+    def __decode_raw_value(self, value) -> Any:
+        """decodes a value the workers could not decode"""
+        if isinstance(value, parallel.RawValue):
+            return self.format.decode_value(value)
+        return value
+
+    def __committed_records(self, records, decode_value=None):
+        """
+        yields the committed records of the given records of data file.
+        the values of the committed put records are passed
+        through decode_value when it is given.
+        """
+
+        group = None
+
+        for record in records:
+            operation = record[0]
+
+            if operation == BEGIN:
+                if group is not None:
+                    raise DataStoreFileCorrupted()
+                group = [record]
+            elif operation == COMMIT:
+                if group is None:
+                    raise DataStoreFileCorrupted()
+                for group_record in group:
+                    yield self.__decoded(group_record, decode_value)
+                yield record
+                group = None
+            elif operation == TRUNCATED:
+                if group is None:
+                    raise DataStoreFileCorrupted()
+                break
+            elif group is not None:
+                group.append(record)
+            else:
+                yield self.__decoded(record, decode_value)
+
+        if group is not None:
+            self.has_interrupted_group = True
+
+    @staticmethod
+    def __decoded(record, decode_value):
+        """returns the record with its value decoded"""
+        if decode_value is None or record[0] != PUT:
+            return record
+        return record[:4] + (decode_value(record[4]),)
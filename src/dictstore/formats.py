@@ -0,0 +1,595 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+formats define how records are laid out in the data file.
+
+Every format reads the data file as a sequence of records.
+A record is a tuple of (operation, offset, size, key, raw value)
+where offset and size are in bytes and the raw value
+is decoded with the decode_value method of the format.
+
+Supported Formats:
+    - text   : a readable file with a python literal per line
+    - binary : length prefixed, type tagged records with a CRC
+"""
+
+import datetime
+import struct
+import time
+import zlib
+
+from typing import Any
+
+from dictstore.codec import FastLiteralCodec
+from dictstore.exceptions import DataStoreFileCorrupted, UnsupportedFileVersion
+
+
+# record operations
+PUT = 1
+DELETE = 2
+BEGIN = 3
+COMMIT = 4
+
+# a record cut short at the end of the data file
+TRUNCATED = 5
+
+
+# size of the blocks read while a data file is split into chunks
+SPLIT_BLOCK_SIZE = 1024 * 1024
+
+
+# -----------------
+# Text Format
+# -----------------
+# key \n
+# value \n
+# -----------------
+
+# value line written in place of a value when a key is deleted
+# in append only mode. It can never be parsed as a python literal.
+TOMBSTONE = '// deleted'
+
+# lines written around the records of a transaction.
+# a group of records is replayed only if its commit marker is present.
+BEGIN_MARKER = '// begin'
+COMMIT_MARKER = '// commit'
+
+
+def generate_file_header_string() -> str:
+    """Generates file header string for the data file"""
+    header = '// Python Dictstore File\n'
+    date_string = str(datetime.datetime.now())
+    header += '// Last Rewrite: ' + date_string + '\n'
+    return header
+
+
+class TextFormat:
+    """
+    stores every record as a key line followed by a value line.
+    keys and values are converted to lines by the codec.
+    """
+
+    name = 'text'
+
+    TOMBSTONE_LINE = TOMBSTONE.encode('utf-8')
+
+    MARKERS = {
+        TOMBSTONE_LINE: DELETE,
+        BEGIN_MARKER.encode('utf-8'): BEGIN,
+        COMMIT_MARKER.encode('utf-8'): COMMIT,
+    }
+
+    def __init__(self, codec=None) -> None:
+        self.codec = codec if codec is not None else FastLiteralCodec()
+
+    @staticmethod
+    def is_format_of(first_bytes: bytes) -> bool:
+        """checks if the data file starts like a text data file"""
+        return first_bytes.startswith(b'//')
+
+    def header(self) -> bytes:
+        """returns the header written at the start of the data file"""
+        return generate_file_header_string().encode('utf-8')
+
+    def encode_put(self, key: Any, value: Any) -> bytes:
+        """returns the record that sets the key to the value"""
+        return (
+            self.codec.encode(key) + '\n' +
+            self.codec.encode(value) + '\n'
+            ).encode('utf-8')
+
+    def encode_delete(self, key: Any) -> bytes:
+        """returns the tombstone record of the key"""
+        return (self.codec.encode(key) + '\n' + TOMBSTONE + '\n').encode(
+            'utf-8')
+
+    def encode_begin(self) -> bytes:
+        """returns the marker written before the records of a group"""
+        return (BEGIN_MARKER + '\n').encode('utf-8')
+
+    def encode_commit(self) -> bytes:
+        """returns the marker written after the records of a group"""
+        return (COMMIT_MARKER + '\n').encode('utf-8')
+
+    def decode_value(self, raw_value: bytes) -> Any:
+        """returns the value of a raw value read from the data file"""
+        return self.codec.decode(raw_value.decode('utf-8'))
+
+    def decode_record_value(self, record: bytes) -> Any:
+        """returns the value of a put record read from the data file"""
+        key_end = record.find(b'\n')
+        if key_end == -1:
+            raise DataStoreFileCorrupted()
+        return self.decode_value(record[key_end + 1:])
+
+    @staticmethod
+    def first_record_offset(data_file) -> int:
+        """
+        returns the offset of the first record of a data file
+        opened in binary mode and positioned at its start
+        """
+        return len(data_file.readline()) + len(data_file.readline())
+
+    def __count_record_lines(self, block: bytes) -> int:
+        """
+        returns the number of key and value lines in a block
+        of whole lines, the marker lines are not counted
+        """
+        lines = block.count(b'\n')
+        block = b'\n' + block
+        for marker, operation in self.MARKERS.items():
+            if operation != DELETE:
+                lines -= block.count(b'\n' + marker + b'\n')
+        return lines
+
+    def split(self, data_file, start: int, end: int, chunk_count: int) -> list:
+        """
+        returns the offsets of the records that split the records
+        between start and end of a data file opened in binary mode
+        into chunk_count chunks of about the same size.
+        the first offset is start.
+        the file is read in blocks without decoding the records.
+        """
+
+        boundaries = [start]
+        chunk_size = max((end - start) // chunk_count, 1)
+        target = start + chunk_size
+
+        data_file.seek(start)
+        position = start
+
+        # set while the last line read is a key line
+        in_record = False
+
+        while len(boundaries) < chunk_count and position < end:
+            block = data_file.read(
+                max(min(SPLIT_BLOCK_SIZE, target - position), 1))
+            if not block.endswith(b'\n'):
+                # the block ends with whole lines
+                block += data_file.readline()
+                if not block.endswith(b'\n'):
+                    break
+            position += len(block)
+            if self.__count_record_lines(block) % 2:
+                in_record = not in_record
+
+            if position >= target:
+                if in_record:
+                    # the value line belongs to the same chunk
+                    position += len(data_file.readline())
+                    in_record = False
+                if position >= end:
+                    break
+                boundaries.append(position)
+                target = position + chunk_size
+
+        return boundaries
+
+    def iter_records(self, data_file, offset=None):
+        """
+        yields the records of a data file opened in binary mode
+        or memory mapped, and positioned at its start.
+        when offset is given, the records are read from the
+        offset which must be at the start of a record.
+        """
+
+        if offset is None:
+            offset = self.first_record_offset(data_file)
+        else:
+            data_file.seek(offset)
+
+        key_line = None
+        key_offset = 0
+
+        # memory mappings can only be read line by line with readline
+        for line in iter(data_file.readline, b''):
+            if key_line is None:
+                operation = self.MARKERS.get(line.rstrip(b'\n'))
+                if operation is not None:
+                    if operation == DELETE:
+                        raise DataStoreFileCorrupted()
+                    yield (operation, offset, len(line), None, None)
+                else:
+                    key_line = line
+                    key_offset = offset
+            else:
+                key = self.codec.decode(key_line.decode('utf-8'))
+                size = len(key_line) + len(line)
+                if line.rstrip(b'\n') == self.TOMBSTONE_LINE:
+                    yield (DELETE, key_offset, size, key, None)
+                else:
+                    yield (PUT, key_offset, size, key, line)
+                key_line = None
+
+            offset += len(line)
+
+        # a key without a value
+        if key_line is not None:
+            yield (TRUNCATED, key_offset, len(key_line), None, None)
+
+
+# -----------------
+# Binary Format
+# -----------------
+# header:
+#   magic, version (uint16), time of last rewrite (float64)
+# record:
+#   operation (uint8), key length (uint32), value length (uint32),
+#   key, value, CRC32 of all the previous fields (uint32)
+# key and value:
+#   type tag (1 byte) followed by the data of the type.
+#   lengths are stored as variable length unsigned integers.
+# -----------------
+
+BINARY_MAGIC = b'\x00DICTSTORE'
+BINARY_VERSION = 1
+
+_HEADER = struct.Struct('<Hd')
+_RECORD_HEADER = struct.Struct('<BII')
+_CRC = struct.Struct('<I')
+_INT8 = struct.Struct('<b')
+_INT32 = struct.Struct('<i')
+_INT64 = struct.Struct('<q')
+_FLOAT64 = struct.Struct('<d')
+
+# type tags of the encoded keys and values
+_NONE = ord('N')
+_TRUE = ord('T')
+_FALSE = ord('F')
+_INT8_TAG = ord('c')
+_INT32_TAG = ord('j')
+_INT64_TAG = ord('i')
+_BIG_INT_TAG = ord('I')
+_FLOAT_TAG = ord('d')
+_STR_TAG = ord('s')
+_BYTES_TAG = ord('b')
+_TUPLE_TAG = ord('t')
+_LIST_TAG = ord('l')
+_DICT_TAG = ord('D')
+_SET_TAG = ord('S')
+
+
+def _encode_length(length: int) -> bytes:
+    """returns the length as a variable length unsigned integer"""
+    if length < 0x80:
+        return bytes((length,))
+    data = bytearray()
+    while length >= 0x80:
+        data.append((length & 0x7F) | 0x80)
+        length >>= 7
+    data.append(length)
+    return bytes(data)
+
+
+def _decode_length(data, position: int):
+    """returns the length at the position and the position after it"""
+    byte = data[position]
+    if byte < 0x80:
+        return byte, position + 1
+    length = 0
+    shift = 0
+    while byte >= 0x80:
+        length |= (byte & 0x7F) << shift
+        shift += 7
+        position += 1
+        byte = data[position]
+    return length | (byte << shift), position + 1
+
+
+def _encode_object(obj: Any, parts: list) -> None:
+    """appends the type tagged encoding of the object to parts"""
+
+    # bool is checked before int as it is a subclass of int
+    if obj is None:
+        parts.append(b'N')
+    elif obj is True:
+        parts.append(b'T')
+    elif obj is False:
+        parts.append(b'F')
+    elif isinstance(obj, int):
+        if -0x80 <= obj < 0x80:
+            parts.append(b'c' + _INT8.pack(obj))
+        elif -0x80000000 <= obj < 0x80000000:
+            parts.append(b'j' + _INT32.pack(obj))
+        elif -0x8000000000000000 <= obj < 0x8000000000000000:
+            parts.append(b'i' + _INT64.pack(obj))
+        else:
+            data = obj.to_bytes(
+                (obj.bit_length() + 8) // 8, 'little', signed=True)
+            parts.append(b'I' + _encode_length(len(data)))
+            parts.append(data)
+    elif isinstance(obj, float):
+        parts.append(b'd' + _FLOAT64.pack(obj))
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8', 'surrogatepass')
+        parts.append(b's' + _encode_length(len(data)))
+        parts.append(data)
+    elif isinstance(obj, bytes):
+        parts.append(b'b' + _encode_length(len(obj)))
+        parts.append(obj)
+    elif isinstance(obj, dict):
+        parts.append(b'D' + _encode_length(len(obj)))
+        for sub_key, sub_value in obj.items():
+            _encode_object(sub_key, parts)
+            _encode_object(sub_value, parts)
+    elif isinstance(obj, (tuple, list, set)):
+        if isinstance(obj, tuple):
+            tag = b't'
+        elif isinstance(obj, list):
+            tag = b'l'
+        else:
+            tag = b'S'
+        parts.append(tag + _encode_length(len(obj)))
+        for item in obj:
+            _encode_object(item, parts)
+    else:
+        raise TypeError('cannot encode ' + type(obj).__name__)
+
+
+def encode_object(obj: Any) -> bytes:
+    """returns the type tagged encoding of a key or value"""
+    parts = []
+    _encode_object(obj, parts)
+    return b''.join(parts)
+
+
+def _decode_object(data, position: int):
+    """returns the object at the position and the position after it"""
+
+    tag = data[position]
+    position += 1
+
+    if tag == _STR_TAG:
+        length, position = _decode_length(data, position)
+        end = position + length
+        return str(data[position:end], 'utf-8', 'surrogatepass'), end
+    if tag == _INT8_TAG:
+        return _INT8.unpack_from(data, position)[0], position + 1
+    if tag == _INT32_TAG:
+        return _INT32.unpack_from(data, position)[0], position + 4
+    if tag == _INT64_TAG:
+        return _INT64.unpack_from(data, position)[0], position + 8
+    if tag == _FLOAT_TAG:
+        return _FLOAT64.unpack_from(data, position)[0], position + 8
+    if tag == _NONE:
+        return None, position
+    if tag == _TRUE:
+        return True, position
+    if tag == _FALSE:
+        return False, position
+
+    length, position = _decode_length(data, position)
+
+    if tag == _BYTES_TAG:
+        end = position + length
+        return bytes(data[position:end]), end
+    if tag == _BIG_INT_TAG:
+        end = position + length
+        return int.from_bytes(
+            data[position:end], 'little', signed=True), end
+    if tag == _DICT_TAG:
+        obj = {}
+        for _ in range(length):
+            sub_key, position = _decode_object(data, position)
+            obj[sub_key], position = _decode_object(data, position)
+        return obj, position
+    if tag in (_TUPLE_TAG, _LIST_TAG, _SET_TAG):
+        items = []
+        for _ in range(length):
+            item, position = _decode_object(data, position)
+            items.append(item)
+        if tag == _TUPLE_TAG:
+            return tuple(items), position
+        if tag == _SET_TAG:
+            return set(items), position
+        return items, position
+
+    raise DataStoreFileCorrupted()
+
+
+def decode_object(data) -> Any:
+    """returns the key or value of a type tagged encoding"""
+    try:
+        obj, position = _decode_object(data, 0)
+    except (struct.error, IndexError, UnicodeDecodeError) as error:
+        raise DataStoreFileCorrupted() from error
+    if position != len(data):
+        raise DataStoreFileCorrupted()
+    return obj
+
+
+class BinaryFormat:
+    """
+    stores every record as a length prefixed key and value,
+    each tagged with its type, followed by a CRC of the record
+    """
+
+    name = 'binary'
+
+    @staticmethod
+    def is_format_of(first_bytes: bytes) -> bool:
+        """checks if the data file starts like a binary data file"""
+        return first_bytes.startswith(BINARY_MAGIC)
+
+    def header(self) -> bytes:
+        """returns the header written at the start of the data file"""
+        return BINARY_MAGIC + _HEADER.pack(BINARY_VERSION, time.time())
+
+    @staticmethod
+    def __encode_record(operation: int, key=b'', value=b'') -> bytes:
+        """frames the encoded key and value of a record"""
+        record = _RECORD_HEADER.pack(operation, len(key), len(value))
+        record += key + value
+        return record + _CRC.pack(zlib.crc32(record))
+
+    def encode_put(self, key: Any, value: Any) -> bytes:
+        """returns the record that sets the key to the value"""
+        return self.__encode_record(
+            PUT, encode_object(key), encode_object(value))
+
+    def encode_delete(self, key: Any) -> bytes:
+        """returns the tombstone record of the key"""
+        return self.__encode_record(DELETE, encode_object(key))
+
+    def encode_begin(self) -> bytes:
+        """returns the marker written before the records of a group"""
+        return self.__encode_record(BEGIN)
+
+    def encode_commit(self) -> bytes:
+        """returns the marker written after the records of a group"""
+        return self.__encode_record(COMMIT)
+
+    def decode_value(self, raw_value: bytes) -> Any:
+        """returns the value of a raw value read from the data file"""
+        return decode_object(raw_value)
+
+    def decode_record_value(self, record: bytes) -> Any:
+        """returns the value of a put record read from the data file"""
+        if len(record) < _RECORD_HEADER.size + _CRC.size:
+            raise DataStoreFileCorrupted()
+        operation, key_length, value_length = _RECORD_HEADER.unpack_from(
+            record)
+        crc = _CRC.unpack_from(record, len(record) - _CRC.size)[0]
+        if operation != PUT or crc != zlib.crc32(record[:-_CRC.size]):
+            raise DataStoreFileCorrupted()
+        value_start = _RECORD_HEADER.size + key_length
+        return decode_object(record[value_start:value_start + value_length])
+
+    @staticmethod
+    def first_record_offset(data_file) -> int:
+        """
+        returns the offset of the first record of a data file
+        opened in binary mode and positioned at its start
+                Exceptions:
+                    DataStoreFileCorrupted
+                    UnsupportedFileVersion
+        """
+        header = data_file.read(len(BINARY_MAGIC) + _HEADER.size)
+        if len(header) != len(BINARY_MAGIC) + _HEADER.size:
+            raise DataStoreFileCorrupted()
+        version, _ = _HEADER.unpack_from(header, len(BINARY_MAGIC))
+        if version > BINARY_VERSION:
+            raise UnsupportedFileVersion(version)
+        return len(header)
+
+    @staticmethod
+    def split(data_file, start: int, end: int, chunk_count: int) -> list:
+        """
+        returns the offsets of the records that split the records
+        between start and end of a data file opened in binary mode
+        into chunk_count chunks of about the same size.
+        the first offset is start.
+        only the record headers are read to find the offsets.
+        """
+
+        boundaries = [start]
+        chunk_size = max((end - start) // chunk_count, 1)
+        target = start + chunk_size
+        position = start
+
+        while len(boundaries) < chunk_count:
+            data_file.seek(position)
+            record_header = data_file.read(_RECORD_HEADER.size)
+            if len(record_header) < _RECORD_HEADER.size:
+                break
+            _, key_length, value_length = _RECORD_HEADER.unpack(
+                record_header)
+            position += (_RECORD_HEADER.size + key_length +
+                         value_length + _CRC.size)
+
+            if position >= end:
+                break
+            if position >= target:
+                boundaries.append(position)
+                target = position + chunk_size
+
+        return boundaries
+
+    def iter_records(self, data_file, offset=None):
+        """
+        yields the records of a data file opened in binary mode
+        or memory mapped, and positioned at its start.
+        when offset is given, the records are read from the
+        offset which must be at the start of a record.
+        """
+
+        header_size = self.first_record_offset(data_file)
+
+        if offset is None:
+            offset = header_size
+        else:
+            data_file.seek(offset)
+
+        while True:
+            record_header = data_file.read(_RECORD_HEADER.size)
+            if not record_header:
+                return
+
+            if len(record_header) < _RECORD_HEADER.size:
+                yield (TRUNCATED, offset, len(record_header), None, None)
+                return
+
+            operation, key_length, value_length = _RECORD_HEADER.unpack(
+                record_header)
+            body_length = key_length + value_length + _CRC.size
+            body = data_file.read(body_length)
+            size = _RECORD_HEADER.size + len(body)
+
+            if len(body) < body_length:
+                yield (TRUNCATED, offset, size, None, None)
+                return
+
+            crc = zlib.crc32(body[:-_CRC.size], zlib.crc32(record_header))
+            if (
+                crc != _CRC.unpack_from(body, body_length - _CRC.size)[0] or
+                not PUT <= operation <= COMMIT
+               ):
+                raise DataStoreFileCorrupted()
+
+            key = None
+            value = None
+            if operation in (PUT, DELETE):
+                key = decode_object(body[:key_length])
+            if operation == PUT:
+                value = body[key_length:key_length + value_length]
+
+            yield (operation, offset, size, key, value)
+            offset += size
+
+
+FORMATS = {
+    TextFormat.name: TextFormat,
+    BinaryFormat.name: BinaryFormat,
+}
@@ -17,8 +17,12 @@ Helper functions for dictstore
 """
 
 
+import math
+
 from typing import Any
 
+from dictstore import serializer
+
 
 def is_supported_key_type(key):
     """
@@ -26,29 +30,155 @@ def is_supported_key_type(key):
 
     Supported Types:
         - int
-        - float
+        - float, other than nan and infinity
         - str
-        - tuple
+        - tuple of supported keys, strings, bytes and booleans
         - NoneType
     """
 
+    if isinstance(key, tuple):
+        return _is_supported_tuple_key(key)
+
     if (
-        isinstance(key, (int, float, str, tuple, )) or
+        isinstance(key, (int, str, )) or
         key is None
        ):
         return True
 
-    return False
+    return isinstance(key, float) and math.isfinite(key)
+
+
+# kinds of supported value types
+_PRIMITIVE = 'primitive'
+_CONTAINER = 'container'
+
+_PRIMITIVE_TYPES = (str, bytes, int, float, bool, type(None))
+_CONTAINER_TYPES = (tuple, list, dict, set)
+
+_PRIMITIVE_TYPE_SET = frozenset(_PRIMITIVE_TYPES)
+
+# deepest nesting of containers that is supported.
+# the parser of python 3.6 to 3.8 cannot read the literals of
+# containers nested much deeper from a text data file
+MAX_DEPTH = 90
+
+# kind of every value type checked so far, None if it is not supported.
+# subclasses of the supported types are supported as well
+_VALUE_KINDS = {value_type: _PRIMITIVE for value_type in _PRIMITIVE_TYPES}
+_VALUE_KINDS.update(
+    (value_type, _CONTAINER) for value_type in _CONTAINER_TYPES)
+
+
+def _value_kind(value_type):
+    """returns the kind of the value type, None if it is not supported"""
+    try:
+        return _VALUE_KINDS[value_type]
+    except KeyError:
+        pass
+
+    if issubclass(value_type, _PRIMITIVE_TYPES):
+        kind = _PRIMITIVE
+    elif issubclass(value_type, _CONTAINER_TYPES):
+        kind = _CONTAINER
+    else:
+        kind = None
+    _VALUE_KINDS[value_type] = kind
+    return kind
+
+
+def _is_finite(value) -> bool:
+    """checks if the value is not a float or a float other than nan or inf"""
+    return not isinstance(value, float) or math.isfinite(value)
+
+
+def _is_supported_tuple_key(key) -> bool:
+    """
+    checks if the items of a tuple key, and of the tuples nested
+    in it, are primitives without recursion. lists, dicts and sets
+    cannot be hashed, so they are not supported in keys.
+    """
+    stack = [(key, 1)]
+    while stack:
+        items, depth = stack.pop()
+        for item in items:
+            kind = _VALUE_KINDS.get(type(item)) or _value_kind(type(item))
+            if kind == _PRIMITIVE:
+                if not _is_finite(item):
+                    return False
+            elif isinstance(item, tuple) and depth < MAX_DEPTH:
+                stack.append((item, depth + 1))
+            else:
+                return False
+
+    # subclasses of the supported types may not be hashable
+    try:
+        hash(key)
+    except TypeError:
+        return False
+    return True
+
+
+def _has_primitive_items(container) -> bool:
+    """
+    checks if all the items of a container, and the keys
+    of a dict, are primitives without a loop in python
+    """
+    if isinstance(container, dict):
+        item_types = set(map(type, container.keys()))
+        item_types.update(map(type, container.values()))
+    else:
+        item_types = set(map(type, container))
+    if not (
+        item_types <= _PRIMITIVE_TYPE_SET or all(
+            _value_kind(item_type) == _PRIMITIVE for item_type in item_types)
+       ):
+        return False
+
+    if not any(issubclass(item_type, float) for item_type in item_types):
+        return True
+    if isinstance(container, dict):
+        return (
+            all(map(_is_finite, container.keys())) and
+            all(map(_is_finite, container.values()))
+            )
+    return all(map(_is_finite, container))
+
+
+def _push_items(items, stack, depth) -> bool:
+    """
+    checks the types of the items of a container nested depth
+    levels deep and pushes the items that are containers of other
+    containers to the stack.
+    returns False if an item is not supported.
+    """
+    for item in items:
+        kind = _VALUE_KINDS.get(type(item)) or _value_kind(type(item))
+        if kind is None:
+            return False
+        if kind == _PRIMITIVE:
+            if not _is_finite(item):
+                return False
+            continue
+        if kind == _CONTAINER:
+            # the item is nested one level deeper than its container
+            if depth >= MAX_DEPTH:
+                return False
+            if not _has_primitive_items(item):
+                stack.append((item, False))
+    return True
 
 
 def is_supported_value_type(value):
     """
     checks if the given value type is supported.
+    nested values are checked without recursion. containers
+    nested more than MAX_DEPTH levels deep and values that
+    contain themselves are not supported.
 
     Supported Types:
         - strings
         - bytes
-        - numbers
+        - numbers, other than nan and infinity
         - tuples
         - lists
         - dicts
@@ -57,43 +187,48 @@ def is_supported_value_type(value):
         - None
     """
 
-    if (
-        isinstance(value, (str, bytes, int, float, bool)) or
-        value is None
-       ):
-        return True
-    if isinstance(value, tuple):
-        for sub_value in value:
-            if not is_supported_value_type(sub_value):
-                return False
-        return True
-    if isinstance(value, list):
-        for sub_value in value:
-            if not is_supported_value_type(sub_value):
-                return False
-        return True
-    if isinstance(value, dict):
-        for sub_key, sub_value in value.items():
-            if not is_supported_value_type(sub_key):
-                return False
-            if not is_supported_value_type(sub_value):
-                return False
+    kind = _value_kind(type(value))
+    if kind != _CONTAINER:
+        return kind == _PRIMITIVE and _is_finite(value)
+
+    # containers of primitives are the most common values
+    if _has_primitive_items(value):
         return True
-    if isinstance(value, set):
-        for sub_value in value:
-            if not is_supported_value_type(sub_value):
+
+    # ids of the containers on the path from the value
+    # to the container being checked
+    path = set()
+
+    # containers to check and containers to leave
+    stack = [(value, False)]
+
+    while stack:
+        container, leaving = stack.pop()
+        if leaving:
+            path.remove(id(container))
+            continue
+
+        if id(container) in path:
+            return False
+        path.add(id(container))
+        stack.append((container, True))
+
+        depth = len(path)
+        if isinstance(container, dict):
+            if not (
+                _push_items(container.keys(), stack, depth) and
+                _push_items(container.values(), stack, depth)
+               ):
                 return False
-        return True
+        elif not _push_items(container, stack, depth):
+            return False
 
-    return False
+    return True
 
 
 def get_escaped_string(var: Any) -> str:
     """
-    checks if the given key or value is a string and adds
-    quotes around the key if it is.
+    returns the python literal of the given key or value.
+    kept for compatibility, see serializer.serialize.
     """
-    if isinstance(var, str):
-        return '\'' + var + '\''
-
-    return str(var)
+    return serializer.serialize(var)
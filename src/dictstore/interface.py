@@ -21,139 +21,1179 @@ similar to a python dictionary.
 
 from typing import Any, DefaultDict
 from pathlib import Path
-import ast
+import abc
+import atexit
+import collections.abc
+import contextlib
+import heapq
+import inspect
+import io
+import itertools
+import threading
+import time
+import weakref
 import dictstore.helpers as helpers
 
-from dictstore.exceptions import DataStoreFileCorrupted, UnsupportedValueType
+from dictstore.cache import LazyDictionary, MISSING
+from dictstore.compaction import Compactor
+from dictstore.exceptions import ReadOnlyDataStore, UnsupportedValueType
+from dictstore.field_index import FieldIndex, matches
 from dictstore.file_handler import FileHandler
+from dictstore.formats import PUT, DELETE
+from dictstore.locks import FileLock, ReadWriteLock, no_lock
+from dictstore.snapshot import SnapshotFile
+from dictstore.sorted_keys import SortedKeys, sort_key
+from dictstore.transaction import Transaction, DELETED
+from dictstore.views import ItemsView, ValuesView
 
+# default of pop when no default is given
+_NO_DEFAULT = object()
 
-class DictStoreSingleton(type):
+# datastores whose buffered appends are written
+# when the interpreter exits
+_open_stores = weakref.WeakSet()
+
+
+@atexit.register
+def _close_open_stores() -> None:
+    """closes the datastores that are still open at exit"""
+    for dict_store in list(_open_stores):
+        dict_store.close()
+
+
+class DictStoreSingleton(abc.ABCMeta):
     """
-    metaclass to implement singleton behavior for DictStore class
+    metaclass to implement singleton behavior for DictStore class.
+    it extends ABCMeta as DictStore is a MutableMapping.
+
+    opening a data file that is already open returns the open
+    instance. the options given then must be the ones the
+    instance was opened with, options left out are not checked.
     """
     _instances = DefaultDict(None)
 
-    def __call__(cls, datastore_location='./default.dictstore') -> Any:
-        if datastore_location in cls._instances:
-            return cls._instances[datastore_location]
+    # options every open instance was opened with, defaults included
+    _options = {}
 
-        instance = super(DictStoreSingleton, cls).__call__(datastore_location)
-        cls._instances[datastore_location] = instance
-        return instance
+    # makes threads opening the same data file share one instance
+    _lock = threading.RLock()
 
+    def __call__(cls,
+                 datastore_location='./default.dictstore',
+                 **kwargs) -> Any:
+        """
+        returns the instance opened for the data file,
+        opens it if it is not open yet
+                Exceptions:
+                    ValueError
+        """
+        resolved_location = Path(datastore_location).resolve().__str__()
+        with cls._lock:
+            if resolved_location in cls._instances:
+                cls.__check_options(resolved_location, kwargs)
+                return cls._instances[resolved_location]
+
+            instance = super(DictStoreSingleton, cls).__call__(
+                datastore_location,
+                **kwargs
+                )
+            options = inspect.signature(cls.__init__).bind(
+                instance, datastore_location, **kwargs)
+            options.apply_defaults()
+            cls._instances[resolved_location] = instance
+            cls._options[resolved_location] = options.arguments
+            return instance
+
+    def __check_options(cls, resolved_location, kwargs) -> None:
+        """
+        raises ValueError if an option differs from the
+        option the open instance was opened with
+                Exceptions:
+                    TypeError
+                    ValueError
+        """
+        options = cls._options[resolved_location]
+        for name, value in kwargs.items():
+            if name not in options:
+                raise TypeError(
+                    'unexpected keyword argument {!r}'.format(name))
+            if options[name] != value:
+                message = ('{} is already open with {}={!r}, '
+                           'close it to open it with {}={!r}'
+                           ).format(resolved_location, name, options[name],
+                                    name, value)
+                raise ValueError(message)
 
-class DictStore(metaclass=DictStoreSingleton):
+    def opened_instance(cls, datastore_location) -> Any:
+        """returns the instance opened for the data file, if any"""
+        resolved_location = Path(datastore_location).resolve().__str__()
+        return cls._instances.get(resolved_location)
+
+    def release(cls, datastore_location) -> None:
+        """forgets the instance opened for the given data file"""
+        with cls._lock:
+            cls._instances.pop(datastore_location, None)
+            cls._options.pop(datastore_location, None)
+
+
+class DictStore(collections.abc.MutableMapping,
+                metaclass=DictStoreSingleton):
     """
     A class that initializes the datastore into the memory
     and provides functions to manipulate it.
+
+    DictStore is a MutableMapping. unlike a dictionary,
+    reading a missing key with [] returns None.
+
+    as there is one instance for every data file, instances are
+    compared and hashed by identity and not by their contents,
+    which would read the whole datastore.
+    compare dict(store) to compare the contents.
     """
 
-    def __init__(self, datastore_location='./default.dictstore') -> None:
+    __eq__ = object.__eq__
+    __ne__ = object.__ne__
+    __hash__ = object.__hash__
+
+    def __init__(self,
+                 datastore_location='./default.dictstore',
+                 append_only=False,
+                 compaction_ratio=0.5,
+                 min_compaction_size=64 * 1024,
+                 background_compaction=False,
+                 buffer_size=io.DEFAULT_BUFFER_SIZE,
+                 durability='flush',
+                 group_commit_interval=0.05,
+                 group_commit_size=1024 * 1024,
+                 codec=None,
+                 file_format='text',
+                 lazy=False,
+                 cache_size=1024,
+                 max_items=None,
+                 max_memory=None,
+                 mode='rw',
+                 mmap=False,
+                 snapshot=False,
+                 thread_safe=False,
+                 multiprocess=False,
+                 write_behind=False,
+                 flush_interval=1.0,
+                 flush_threshold=1000,
+                 load_workers=None,
+                 sorted_keys=False,
+                 indexes=()) -> None:
         """
         Initializes the in memory dictionary and
         copies all the records from the database file to memory
+
+            append_only:
+                when True, updates and deletes are appended to the
+                data file (deletes as tombstones) instead of
+                rewriting the whole file.
+            compaction_ratio:
+                fraction of dead bytes in the data file that
+                triggers compaction. None disables compaction.
+            min_compaction_size:
+                data files smaller than this (in bytes)
+                are never compacted.
+            background_compaction:
+                when True, compaction runs on a background thread.
+            buffer_size:
+                number of bytes of appends buffered in memory
+                before they are written to the data file.
+                buffered appends are written on flush, close
+                and when the interpreter exits.
+            durability:
+                one of 'none', 'flush', 'fsync-per-write' and
+                'group-commit'. see file_handler.DURABILITY_MODES.
+                defaults to 'flush'. with 'none' the acknowledged
+                writes still in the buffer are lost on a crash.
+            group_commit_interval:
+                seconds after which a group of appends is
+                written to the disk in 'group-commit' mode.
+            group_commit_size:
+                bytes after which a group of appends is
+                written to the disk in 'group-commit' mode.
+            codec:
+                converts keys and values to and from the lines of
+                a text data file. defaults to codec.FastLiteralCodec.
+            file_format:
+                'text' or 'binary', the format of the data file
+                when it is created. the format of an existing
+                data file is detected when it is loaded.
+            lazy:
+                when True, only the location of every key in the
+                data file is loaded. values are read from the
+                data file the first time they are accessed.
+            cache_size:
+                number of values read from the data file that
+                are kept in memory in lazy mode.
+                None keeps every value read, 0 keeps none.
+            max_items:
+                when given, the datastore is lazy and keeps at most
+                max_items values in memory, evicting the least
+                recently used ones. it takes the place of cache_size.
+            max_memory:
+                when given, the datastore is lazy and keeps values
+                in memory up to max_memory bytes of their records
+                in the data file, evicting the least recently used
+                ones. the number of values is only limited by
+                max_items. the keys and their locations stay in memory.
+            mode:
+                'rw' to read and write the datastore or 'r' to only
+                read it. a read only data file must already exist.
+            mmap:
+                when True, the data file is memory mapped and
+                values are decoded from the mapping when they are
+                accessed, as in lazy mode. processes mapping the
+                same data file share its pages in memory.
+            snapshot:
+                when True, a snapshot of the loaded datastore is
+                written next to the data file when it is closed or
+                checkpoint is called. the data file is loaded from
+                the snapshot and only the records appended after it
+                are replayed.
+            thread_safe:
+                when True, reads hold a read lock so that they run
+                in parallel with each other but never while a write,
+                a transaction or a compaction is in progress.
+                writes are always made one at a time.
+                write_behind and background_compaction turn it on,
+                as they write from threads of their own.
+            multiprocess:
+                when True, the processes sharing the data file hold
+                an advisory lock on it while they write and replay
+                the records written by the other processes before
+                every read or write. needs fcntl.
+            write_behind:
+                when True, writes are applied to the in memory
+                dictionary and the keys they change are written to
+                the data file later, together, once flush_interval
+                seconds pass or flush_threshold keys are changed,
+                and on flush, sync, checkpoint and close.
+                repeated writes of a key are written once.
+                cannot be combined with multiprocess.
+            load_workers:
+                number of processes parsing the data file when it
+                is loaded. data files with less than
+                parallel.PARALLEL_LOAD_MIN_SIZE bytes to replay,
+                and every data file when it is None, are parsed by
+                the loading process. custom codecs must be picklable.
+            sorted_keys:
+                when True, the keys are also kept in sorted order
+                so that range and prefix find the keys they return
+                without going through all the keys.
+            indexes:
+                fields of the dict values indexed for find.
+                an index is built the first time find uses it
+                and kept up to date by the writes made after that.
         """
 
-        # create an in memory dictionary to store the value
-        # and set default value to None
-        self.in_memory_dictionary = {}
+        if write_behind and multiprocess:
+            raise ValueError('write_behind cannot be combined '
+                             'with multiprocess')
+
+        self.append_only = append_only
+        self.lazy = (
+            lazy or mmap or max_items is not None or max_memory is not None
+            )
+        if max_items is not None:
+            cache_size = max_items
+        elif max_memory is not None:
+            # only the memory taken by the values is limited
+            cache_size = None
+        self.read_only = mode == 'r'
+        # the timer of write behind mode and background compaction
+        # write from threads of their own, so reads have to keep
+        # away from their writes
+        self.thread_safe = (
+            thread_safe or write_behind or background_compaction)
+        self.multiprocess = multiprocess
+        self.write_behind = write_behind
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self.load_workers = load_workers
+
+        # latest change of every key that is not in the data file
+        # yet in write behind mode, either a value or DELETED
+        self.__dirty = {}
+        self.__last_flush_time = time.monotonic()
+        self.__flush_timer = None
+
+        # serializes writes to the data file with compaction
+        # and, in thread safe mode, keeps reads away from writes
+        self.__lock = ReadWriteLock()
+        if self.thread_safe:
+            self.__read_lock = self.__lock.read
+        else:
+            self.__read_lock = no_lock
+
+        # location of the live record of every key in the data file
+        # as a tuple of (offset, size)
+        self.__index = {}
+
+        # transaction in progress, if any
+        self.__transaction = None
+
+        # keys in sorted order, built once the data file is loaded
+        self.__sorted_keys = None
+
+        # FieldIndex of every indexed field of the dict values
+        self.__field_indexes = {field: FieldIndex(field) for field in indexes}
+
+        # size of the data file covered by the snapshot file
+        self.__snapshot_position = None
 
-        self.in_memory_dictionary.setdefault(None)
+        # set once the data file is loaded, a datastore
+        # that is not loaded is never checkpointed
+        self.__loaded = False
+
+        self.__compactor = Compactor(
+            self.compact,
+            garbage_ratio=compaction_ratio,
+            min_file_size=min_compaction_size,
+            background=background_compaction
+            )
 
         # check if the datafile is already opened and return
         # the object already opened else continue creating a new object
 
         self.datastore_location = Path(datastore_location).resolve().__str__()
 
-        self.file_handler = FileHandler(self.datastore_location)
+        # lock shared with the other processes using the data file
+        # and the generation and size of the data file last seen
+        self.__process_lock = None
+        self.__generation = 0
+        self.__data_file_size = 0
+        if multiprocess:
+            self.__process_lock = FileLock(self.datastore_location + '.lock')
+
+        # the data file is created and loaded by one process at a time
+        if multiprocess:
+            loading_lock = self.__process_lock.exclusive()
+        else:
+            loading_lock = no_lock()
+
+        try:
+            with loading_lock:
+                self.file_handler = FileHandler(
+                    self.datastore_location,
+                    buffer_size=buffer_size,
+                    durability=durability,
+                    group_commit_interval=group_commit_interval,
+                    group_commit_size=group_commit_size,
+                    file_format=file_format,
+                    codec=codec,
+                    mode=mode,
+                    memory_map=mmap
+                    )
+
+                # create an in memory dictionary to store the value.
+                # in lazy mode the values are read through the index
+                if self.lazy:
+                    self.in_memory_dictionary = LazyDictionary(
+                        self.__index,
+                        self.file_handler.read_value,
+                        cache_size=cache_size,
+                        cache_bytes=max_memory
+                        )
+                else:
+                    self.in_memory_dictionary = {}
+
+                self.__snapshot_file = None
+                snapshot_position = None
+                try:
+                    if snapshot:
+                        self.__snapshot_file = SnapshotFile(
+                            self.datastore_location)
+                        snapshot_position = self.__load_snapshot()
+
+                    # only the records after the snapshot are replayed
+                    self.__replay(self.file_handler.read_records(
+                        snapshot_position,
+                        workers=load_workers,
+                        decode_values=not self.lazy
+                        ))
+                    self.__drop_interrupted_group()
+                except BaseException:
+                    self.file_handler.close()
+                    raise
+
+                if sorted_keys:
+                    self.__sorted_keys = SortedKeys(self.in_memory_dictionary)
+
+                if multiprocess:
+                    self.__generation = self.__process_lock.generation()
+                    self.__data_file_size = self.file_handler.size()
+        except BaseException:
+            if self.__process_lock is not None:
+                self.__process_lock.close()
+            raise
+
+        # make sure buffered appends reach the data file.
+        # a datastore that failed to load is not closed at exit,
+        # its checkpoint would cover the records it could not read
+        self.__loaded = True
+        _open_stores.add(self)
+
+    def __replay(self, records) -> None:
+        """
+        replays the records of the data file in order
+        so that the last record for a key wins
+        and tombstones remove the key.
+        the values are decoded unless the datastore is lazy.
+        the field indexes are built again when they are used next.
+        """
+
+        for field_index in self.__field_indexes.values():
+            field_index.invalidate()
+
+        for operation, offset, size, key, value in records:
+            if operation == PUT:
+                if self.lazy:
+                    self.in_memory_dictionary.cache.discard(key)
+                else:
+                    self.in_memory_dictionary[key] = value
+                if (
+                    self.__sorted_keys is not None and
+                    key not in self.__index
+                   ):
+                    self.__sorted_keys.add(key)
+                self.__track_record(key, (offset, size))
+            elif operation == DELETE:
+                self.__track_tombstone(key, size)
+            else:
+                self.__compactor.add_garbage(size)
+
+    def __drop_interrupted_group(self) -> None:
+        """
+        a trailing group without a commit marker was interrupted
+        while it was written, drop it from the data file.
+        it is skipped by every load of a read only data file
+        """
+
+        if self.file_handler.has_interrupted_group and not self.read_only:
+            self.__rewrite_data_file()
+
+    # -----------------
+    # Multiple Processes
+    # -----------------
+    # In multiprocess mode writes hold a lock on the data file and
+    # every process replays the records written by the others
+    # before it reads or writes.
+    # A rewrite advances the generation of the data file
+    # and makes the other processes load it again.
+    # -----------------
+
+    @contextlib.contextmanager
+    def __writing(self):
+        """
+        holds the write lock for the with block.
+        in multiprocess mode the data file is also locked and the
+        changes made by the other processes are replayed first.
+        """
+
+        with self.__lock.write():
+            process_lock = self.__process_lock
+            if process_lock is None or process_lock.is_held():
+                yield
+                return
+
+            with process_lock.exclusive():
+                self.__replay_foreign_changes()
+                self.__drop_interrupted_group()
+                try:
+                    yield
+                finally:
+                    # the other processes see the appends
+                    # as soon as the lock is released
+                    self.file_handler.flush()
+                    self.__generation = process_lock.generation()
+                    self.__data_file_size = self.file_handler.size()
+
+    def __has_foreign_changes(self) -> bool:
+        """checks if another process changed the data file"""
+        return (
+            self.__process_lock.generation() != self.__generation or
+            self.file_handler.size() != self.__data_file_size
+            )
+
+    def __replay_foreign_changes(self) -> None:
+        """
+        replays the records appended by the other processes or
+        loads the data file again if another process rewrote it.
+        the data file must be locked. an interrupted group
+        is left in the data file for the next write to drop.
+        """
+
+        if not self.__has_foreign_changes():
+            return
+
+        # the handles may point to the replaced data file
+        # or past the position of the new records
+        self.file_handler.reopen()
+
+        if (
+            self.__process_lock.generation() == self.__generation and
+            self.file_handler.size() > self.__data_file_size
+           ):
+            self.__replay(self.file_handler.read_records(
+                self.__data_file_size,
+                decode_values=not self.lazy
+                ))
+        else:
+            # the sorted keys are built again once the data file
+            # is loaded instead of adding the keys one at a time
+            sorted_keys = self.__sorted_keys
+            self.__sorted_keys = None
+
+            self.__index.clear()
+            if self.lazy:
+                self.in_memory_dictionary.cache.clear()
+            else:
+                self.in_memory_dictionary.clear()
+            self.__compactor.reset(0)
+            self.__snapshot_position = None
+            self.__replay(self.file_handler.read_records(
+                workers=self.load_workers,
+                decode_values=not self.lazy
+                ))
+
+            if sorted_keys is not None:
+                self.__sorted_keys = SortedKeys(self.in_memory_dictionary)
+
+        self.__generation = self.__process_lock.generation()
+        self.__data_file_size = self.file_handler.size()
+
+    def __catch_up(self) -> None:
+        """
+        replays the changes made by the other processes
+        before a read in multiprocess mode
+        """
+
+        if self.__process_lock is None or not self.__has_foreign_changes():
+            return
+
+        with self.__lock.write(), self.__process_lock.shared():
+            self.__replay_foreign_changes()
+
+    def __load_snapshot(self) -> Any:
+        """
+        loads the snapshot of the data file, if it is still valid,
+        and returns the position in the data file it covers
+        """
+
+        snapshot = self.__snapshot_file.load()
+        if snapshot is None:
+            return None
+
+        try:
+            position = snapshot['position']
+            if (
+                snapshot['format'] != self.file_handler.format.name or
+                position > self.file_handler.size() or
+                snapshot['fingerprint'] !=
+                self.file_handler.fingerprint(position)
+               ):
+                return None
+
+            index = snapshot['index']
+            values = snapshot['values']
+            if not self.lazy and values is None:
+                # the snapshot was written in lazy mode
+                values = {
+                    key: self.file_handler.read_value(location)
+                    for key, location in index.items()
+                    }
+            live_bytes = snapshot['live_bytes']
+            dead_bytes = snapshot['dead_bytes']
+        except (KeyError, TypeError, AttributeError):
+            return None
+
+        self.__index.update(index)
+        if not self.lazy:
+            self.in_memory_dictionary.update(values)
+        self.__compactor.live_bytes = live_bytes
+        self.__compactor.dead_bytes = dead_bytes
+
+        self.__snapshot_position = position
+        return position
+
+    def checkpoint(self) -> None:
+        """
+        writes a snapshot of the datastore next to the data file.
+        the next load of the data file starts from the snapshot
+        and replays only the records appended after it.
+        """
+
+        self.__check_writable()
+        if not self.__loaded:
+            return
 
-        # fetch the file contents and parse accordingly
-        # parse key and value as JSON objects
+        with self.__writing():
+            self.__write_dirty_records()
 
-        data = self.file_handler.read_from_file()
+            position = self.file_handler.size()
+            if position == self.__snapshot_position:
+                return
 
-        # check if the number of lines are even
+            if self.__snapshot_file is None:
+                self.__snapshot_file = SnapshotFile(self.datastore_location)
 
-        if len(data) % 2 != 0:
-            raise DataStoreFileCorrupted()
+            snapshot = {
+                'position': position,
+                'fingerprint': self.file_handler.fingerprint(position),
+                'format': self.file_handler.format.name,
+                'index': self.__index,
+                'values': None if self.lazy else self.in_memory_dictionary,
+                'live_bytes': self.__compactor.live_bytes,
+                'dead_bytes': self.__compactor.dead_bytes,
+                }
 
-        for line_number_of_key in range(0, len(data), 2):
-            key = data[line_number_of_key]
-            key_parsed = ast.literal_eval(key)
-            value = data[line_number_of_key + 1]
-            value_parsed = ast.literal_eval(value)
-            self.in_memory_dictionary[key_parsed] = value_parsed
+            try:
+                self.__snapshot_file.save(snapshot)
+            except ValueError:
+                # values decoded by a custom codec may not be
+                # supported by the snapshot, they are read
+                # from the data file when it is loaded
+                snapshot['values'] = None
+                self.__snapshot_file.save(snapshot)
+
+            self.__snapshot_position = position
+
+    def __track_record(self, key, location) -> None:
+        """
+        marks the previous record of the key as dead
+        and the new record at the location as live
+        """
+
+        previous_location = self.__index.get(key)
+        if previous_location is not None:
+            self.__compactor.add_dead(previous_location[1])
+
+        self.__index[key] = location
+        self.__compactor.add_live(location[1])
+
+    def __track_tombstone(self, key, record_size) -> None:
+        """
+        removes the key from memory and marks the previous
+        record of the key and the tombstone itself as dead
+        """
+
+        previous_location = self.__index.pop(key, None)
+        if previous_location is not None:
+            self.__compactor.add_dead(previous_location[1])
+
+        if self.lazy:
+            self.in_memory_dictionary.deleted(key)
+        else:
+            self.in_memory_dictionary.pop(key, None)
+        self.__keys_removed([key])
+
+        self.__compactor.add_garbage(record_size)
+
+    def __keys_set(self, records) -> None:
+        """
+        adds the key value pairs set in memory to the sorted keys
+        and the field indexes. records must be iterable twice.
+        """
+        if self.__sorted_keys is not None:
+            self.__sorted_keys.update(key for key, _ in records)
+        for field_index in self.__field_indexes.values():
+            for key, value in records:
+                field_index.set(key, value)
+
+    def __keys_removed(self, keys) -> None:
+        """
+        removes the keys deleted from memory from the sorted keys
+        and the field indexes. keys must be iterable twice.
+        """
+        if self.__sorted_keys is not None:
+            self.__sorted_keys.difference_update(keys)
+        for field_index in self.__field_indexes.values():
+            for key in keys:
+                field_index.discard(key)
 
     def __rewrite_data_file(self) -> None:
         """
-        converts in memory dictionary to string
-        asks file handler to write the resulting string
+        encodes the in memory dictionary as records
+        asks file handler to write the resulting records
         to the data file.
         """
 
-        # convert each record into the desired format
-        # Format:
-        # key \n
-        # json(value) \n
+        data_file_format = self.file_handler.format
+        record_sizes = {}
+
+        # records are encoded while they are written, in lazy mode
+        # values are read from the data file being replaced
+        def encode_records():
+            for key, value in self.__committed_items():
+                data_record_cache = data_file_format.encode_put(key, value)
+                record_sizes[key] = len(data_record_cache)
+                yield data_record_cache
+
+        offset = self.file_handler.rewrite_to_file(encode_records())
+
+        self.__index.clear()
+        for key, record_size in record_sizes.items():
+            self.__index[key] = (offset, record_size)
+            offset += record_size
+
+        if self.lazy:
+            self.in_memory_dictionary.all_persisted()
+
+        self.__compactor.reset(sum(record_sizes.values()))
+        self.__snapshot_position = None
+
+        # every change is in the rewritten data file
+        self.__dirty.clear()
+
+        if self.__process_lock is not None:
+            self.__generation = self.__process_lock.advance_generation()
+
+    def __add_records_to_data_file(self,
+                                   records=(),
+                                   deleted_keys=(),
+                                   framed=False) -> None:
+        """
+        encodes the given records and a tombstone for each of
+        the deleted keys, asks file handler to append them
+        to the end of data file with a single write.
+        framed records are written between a begin
+        and a commit marker.
+        the in memory dictionary is updated once
+        the records are appended.
+        """
+
+        data_file_format = self.file_handler.format
+        data_records_cache = []
+        put_records = []
+        tombstone_sizes = []
+
+        if framed:
+            data_records_cache.append(data_file_format.encode_begin())
+
+        for key, value in records:
+            data_record_cache = data_file_format.encode_put(key, value)
+            data_records_cache.append(data_record_cache)
+            put_records.append((key, value, len(data_record_cache)))
 
-        data_file_cache = []
+        for key in deleted_keys:
+            data_record_cache = data_file_format.encode_delete(key)
+            data_records_cache.append(data_record_cache)
+            tombstone_sizes.append((key, len(data_record_cache)))
 
-        for key, value in self.in_memory_dictionary.items():
-            print(key, '|', value)
-            data_file_cache.append(helpers.get_escaped_string(key) + '\n')
-            data_file_cache.append(helpers.get_escaped_string(value) + '\n')
+        if framed:
+            data_records_cache.append(data_file_format.encode_commit())
 
-        self.file_handler.rewrite_to_file(data_file_cache)
+        offset = self.file_handler.append_to_file(
+            b''.join(data_records_cache))
 
-    def __add_record_to_data_file(self, key, value) -> None:
+        if framed:
+            offset += len(data_records_cache[0])
+
+        # put records are written first, one after the other
+        for key, value, record_size in put_records:
+            self.__track_record(key, (offset, record_size))
+            offset += record_size
+            if self.lazy:
+                self.in_memory_dictionary.persisted(key, value)
+            else:
+                self.in_memory_dictionary[key] = value
+        if self.__sorted_keys is not None or self.__field_indexes:
+            self.__keys_set(
+                [(key, value) for key, value, _ in put_records])
+
+        for key, record_size in tombstone_sizes:
+            self.__track_tombstone(key, record_size)
+
+        if framed:
+            self.__compactor.add_garbage(
+                len(data_records_cache[0]) + len(data_records_cache[-1])
+                )
+
+    # -----------------
+    # Compaction
+    # -----------------
+    # In append only mode overwritten and deleted records stay in
+    # the data file until it is compacted
+    # -----------------
+
+    def compact(self) -> None:
         """
-        converts the given record to string
-        asks file handler to append the resulting string
-        to the end of data file
+        rewrites the data file with only the live records.
+        the new file is written to a temporary file and renamed
+        over the data file, so readers never see a partial file.
         """
 
-        data_record_cache = helpers.get_escaped_string(key) + '\n'
-        data_record_cache += helpers.get_escaped_string(value) + '\n'
+        self.__check_writable()
+
+        with self.__writing():
+            self.__rewrite_data_file()
 
-        self.file_handler.append_to_file(data_record_cache)
+    def garbage_ratio(self) -> float:
+        """returns the fraction of the data file made of dead records"""
+        return self.__compactor.current_garbage_ratio()
+
+    # -----------------
+    # File Handle
+    # -----------------
+    # Appends are buffered by the file handler
+    # until they are flushed or the datastore is closed
+    # -----------------
+
+    def flush(self) -> None:
+        """
+        writes the buffered appends, and in write behind mode
+        the pending writes, to the data file
+        """
+        with self.__lock.write():
+            self.__write_dirty_records()
+            self.file_handler.flush()
+
+    def sync(self) -> None:
+        """
+        writes the buffered appends, and in write behind mode
+        the pending writes, to the disk using fsync
+        """
+        with self.__lock.write():
+            self.__write_dirty_records()
+            self.file_handler.sync()
+
+    def close(self) -> None:
+        """
+        waits for a running compaction, writes the buffered appends
+        and closes the data file. The next DictStore call for the
+        same data file loads it again from the disk.
+        """
+
+        self.__compactor.wait()
+
+        with self.__lock.write():
+            self.__write_dirty_records()
+            if self.__snapshot_file is not None and not self.read_only:
+                self.checkpoint()
+            self.file_handler.close()
+            if self.__process_lock is not None:
+                self.__process_lock.close()
+
+        DictStore.release(self.datastore_location)
+        _open_stores.discard(self)
+
+    def __enter__(self) -> 'DictStore':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
 
     # -----------------
     # Read Operations
     # -----------------
     # All read operation are performed on the in memory dictionary
+    # after it caught up with the changes of the other processes
     # -----------------
 
-    def keys(self) -> list:
-        """returns a list of all the keys in the datastore"""
-        return list(self.in_memory_dictionary.keys())
+    def __transaction_changes(self) -> Any:
+        """
+        returns the changes of the transaction in progress
+        if it is run by the current thread, None otherwise
+        """
+        transaction = self.__transaction
+        if (
+            transaction is not None and
+            transaction.is_owned_by_current_thread()
+           ):
+            return transaction.changes
+        return None
+
+    def __lookup(self, key: Any) -> Any:
+        """
+        returns the value of the key, as changed by the transaction
+        of the current thread, or MISSING if the key does not exist
+        """
+        changes = self.__transaction_changes()
+        if changes is not None and key in changes:
+            value = changes[key]
+            return MISSING if value is DELETED else value
+        return self.in_memory_dictionary.get(key, MISSING)
+
+    def __committed_items(self):
+        """
+        returns an iterable of the key value pairs in memory.
+        in lazy mode the values are streamed from the data file
+        """
+        if self.lazy:
+            return self.in_memory_dictionary.iter_items()
+        return self.in_memory_dictionary.items()
+
+    def cache_info(self) -> Any:
+        """
+        returns the hits, misses and evictions of the values cached
+        in lazy mode, and the number and size of the values cached.
+        returns None when every value is kept in memory.
+        """
+        if not self.lazy:
+            return None
+        return self.in_memory_dictionary.cache.info()
+
+    def keys(self) -> collections.abc.KeysView:
+        """returns a live view of the keys in the datastore"""
+        return collections.abc.KeysView(self)
+
+    def values(self) -> ValuesView:
+        """returns a live view of the values in the datastore"""
+        return ValuesView(self, self.__iter_items)
+
+    def items(self) -> ItemsView:
+        """returns a live view of the key value pairs in the datastore"""
+        return ItemsView(self, self.__iter_items)
+
+    def __iter__(self):
+        """
+        iterates over the keys of the datastore.
+        the keys are streamed from memory and, as with a dictionary,
+        the datastore must not change while they are iterated over.
+        in thread safe mode the keys are copied under the read lock.
+        """
+
+        self.__catch_up()
+        with self.__read_lock():
+            changes = self.__transaction_changes()
+            keys = self.in_memory_dictionary.keys()
+            if self.thread_safe:
+                keys = list(keys)
+
+        if not changes:
+            yield from keys
+            return
+
+        added_keys = [
+            key for key, value in changes.items()
+            if value is not DELETED and key not in self.in_memory_dictionary
+            ]
+        for key in keys:
+            if changes.get(key) is not DELETED:
+                yield key
+        yield from added_keys
+
+    def __iter_items(self):
+        """
+        iterates over the key value pairs of the datastore.
+        in thread safe mode the keys are copied and every value
+        is read under the read lock.
+        """
+
+        self.__catch_up()
+
+        if self.thread_safe or self.__transaction_changes():
+            for key in self:
+                with self.__read_lock():
+                    value = self.__lookup(key)
+                if value is not MISSING:
+                    yield key, value
+            return
+
+        yield from self.__committed_items()
 
-    def values(self) -> list:
-        """returns a list of all the values in the datastore"""
-        return list(self.in_memory_dictionary.values())
+    def __contains__(self, key: Any) -> bool:
+        """
+        checks if the key is in the datastore,
+        even when its value is None
+        """
+        self.__catch_up()
+        with self.__read_lock():
+            changes = self.__transaction_changes()
+            if changes is not None and key in changes:
+                return changes[key] is not DELETED
+            return key in self.in_memory_dictionary
 
-    def get(self, key: Any) -> Any:
+    def get(self, key: Any, default=None) -> Any:
         """
         takes a key and returns the value if it exists.
-        returns None if the key does not exist.
+        returns default if the key does not exist.
+        inside a transaction, the changes buffered by
+        the transaction are visible to the thread running it.
+        """
+
+        self.__catch_up()
+        with self.__read_lock():
+            value = self.__lookup(key)
+        return default if value is MISSING else value
+
+    def range(self, lo: Any = None, hi: Any = None):
+        """
+        returns an iterator over the keys from lo, included,
+        to hi, excluded, in the order of sorted_keys.sort_key.
+        a bound of None leaves that side of the range open.
+        """
+        return self.__sorted_scan(
+            lambda sorted_keys: sorted_keys.range(lo, hi))
+
+    def prefix(self, prefix: Any):
+        """
+        returns an iterator over the string keys starting with a
+        string prefix, or the tuple keys starting with the items
+        of a tuple prefix, in the order of sorted_keys.sort_key
+                Exceptions:
+                    TypeError
+        """
+        return self.__sorted_scan(
+            lambda sorted_keys: sorted_keys.prefix(prefix))
+
+    def __sorted_scan(self, query):
+        """
+        runs a query of SortedKeys on the keys of the datastore,
+        as changed by the transaction of the current thread.
+        without sorted_keys the keys are sorted for every query.
+        """
+
+        self.__catch_up()
+        with self.__read_lock():
+            changes = self.__transaction_changes()
+            sorted_keys = self.__sorted_keys
+            if sorted_keys is None:
+                sorted_keys = SortedKeys(self.in_memory_dictionary)
+            keys = query(sorted_keys)
+
+        if not changes:
+            return keys
+
+        added_keys = SortedKeys(
+            key for key, value in changes.items()
+            if value is not DELETED and key not in self.in_memory_dictionary
+            )
+        return heapq.merge(
+            (key for key in keys if changes.get(key) is not DELETED),
+            query(added_keys),
+            key=sort_key
+            )
+
+    # -----------------
+    # Field Indexes
+    # -----------------
+    # An index maps the values of a field of the dict values to the
+    # keys holding them. It is built the first time find uses it
+    # and updated by the writes that change the keys in memory
+    # -----------------
+
+    def create_index(self, field: Any) -> None:
         """
+        indexes the field of the dict values for find.
+        the index is built the first time find uses it.
+        """
+        with self.__lock.write():
+            if field not in self.__field_indexes:
+                self.__field_indexes[field] = FieldIndex(field)
+
+    def drop_index(self, field: Any) -> None:
+        """removes the index of the field, if there is one"""
+        with self.__lock.write():
+            self.__field_indexes.pop(field, None)
+
+    def indexed_fields(self) -> list:
+        """returns the fields indexed for find"""
+        return list(self.__field_indexes)
 
-        return self.in_memory_dictionary.get(key)
+    def __build_field_indexes(self, fields) -> None:
+        """builds the indexes of the fields that are not built yet"""
+
+        field_indexes = [
+            self.__field_indexes[field] for field in fields
+            if field in self.__field_indexes
+            ]
+        if all(field_index.built for field_index in field_indexes):
+            return
+
+        with self.__lock.write():
+            for field_index in field_indexes:
+                if not field_index.built:
+                    field_index.build(self.__committed_items())
+
+    def find(self, **fields) -> list:
+        """
+        returns the keys of the records whose value is a dict
+        holding all the given fields with the given values.
+        indexed fields are looked up in their index and the
+        other fields are compared with the values of the records
+        found, or of every record when no field is indexed.
+        inside a transaction, the changes buffered by
+        the transaction are visible to the thread running it.
+                Exceptions:
+                    TypeError, when no field is given
+        """
+
+        if not fields:
+            raise TypeError('find needs at least one field')
+
+        self.__catch_up()
+        self.__build_field_indexes(fields)
+
+        with self.__read_lock():
+            changes = self.__transaction_changes()
+
+            candidates = None
+            unindexed_fields = {}
+            for field, value in fields.items():
+                field_index = self.__field_indexes.get(field)
+                if field_index is None:
+                    unindexed_fields[field] = value
+                elif candidates is None:
+                    candidates = field_index.find(value)
+                else:
+                    candidates &= field_index.find(value)
+
+            if candidates is None:
+                keys = [
+                    key for key, value in self.__committed_items()
+                    if matches(value, fields)
+                    ]
+            elif unindexed_fields:
+                keys = [
+                    key for key in candidates
+                    if matches(self.in_memory_dictionary[key],
+                               unindexed_fields)
+                    ]
+            else:
+                keys = list(candidates)
+
+        if not changes:
+            return keys
+
+        keys = [key for key in keys if key not in changes]
+        keys.extend(
+            key for key, value in changes.items()
+            if value is not DELETED and matches(value, fields)
+            )
+        return keys
 
     # -----------------
     # Write Operations
     # -----------------
     # All write operations are performed with a write through approach
     #
-    # Write operations are first performed on the in memory dictionary
-    # and updated on the data file
+    # Appended records are written to the data file first
+    # and then applied to the in memory dictionary.
+    # When the data file is rewritten, the in memory dictionary
+    # is updated first and written to the data file
+    #
+    # In append only mode every write is appended to the data file
+    # and the file is replayed in order when it is loaded
+    #
+    # Whether a key exists is checked with the index of the data file
+    # or the keys in memory and never with its value, so keys whose
+    # value is None are overwritten and removed as any other key
     # -----------------
 
-    def upsert_record(self, key: Any, value: Any) -> None:
+    def __check_writable(self) -> None:
+        """raises ReadOnlyDataStore if the datastore is read only"""
+        if self.read_only:
+            raise ReadOnlyDataStore()
+
+    @staticmethod
+    def __validate_record(key: Any, value: Any) -> None:
         """
-        takes a key value pair
-        and updates the value if it already exists
-        creates a new record otherwise
+        raises KeyError or UnsupportedValueType if the key or value
+        of the record cannot be stored in the datastore
         """
 
         if not helpers.is_supported_key_type(key):
@@ -165,19 +1205,43 @@ class DictStore(metaclass=DictStoreSingleton):
         if not helpers.is_supported_value_type(value):
             raise UnsupportedValueType()
 
+    def upsert_record(self, key: Any, value: Any, trusted=False) -> None:
+        """
+        takes a key value pair
+        and updates the value if it already exists
+        creates a new record otherwise.
+        the key and value are not validated when trusted is True.
+        """
+
+        self.__check_writable()
+        if not trusted:
+            self.__validate_record(key, value)
+
         # if there is no record with the given key
+        # or the datastore is append only
         # update the in memory dictionary and
         # add record to the data file
-        if self.get(key) is None:
-            self.in_memory_dictionary[key] = value
-            self.__add_record_to_data_file(key, value)
+        with self.__writing():
+            if self.__transaction is not None:
+                self.__transaction.set(key, value)
+                return
 
-        # if a record exists with the given key
-        # add new key-value pair to in memory dictionary
-        # and rewrite the data file
-        else:
-            self.in_memory_dictionary[key] = value
-            self.__rewrite_data_file()
+            if self.write_behind:
+                self.__defer_write(records={key: value})
+                return
+
+            # the key is hashed before anything is written, so that
+            # a trusted key that cannot be hashed fails on its own
+            if key not in self.__index or self.append_only:
+                self.__add_records_to_data_file(records=[(key, value)])
+
+            # if a record exists with the given key
+            # add new key-value pair to in memory dictionary
+            # and rewrite the data file
+            else:
+                self.__rewrite_with_changes(records={key: value})
+
+            self.__compactor.maybe_compact()
 
     def remove(self, key):
         """
@@ -185,16 +1249,408 @@ class DictStore(metaclass=DictStoreSingleton):
         and removes the record if it exists
         """
 
+        self.__check_writable()
+
         # if a record exists with the given key
         # remove it from the in memory dictionary
-        # and rewrite the data file
-        if self.get(key) is not None:
+        # and append a tombstone or rewrite the data file
+        with self.__writing():
+            if self.__transaction is not None:
+                self.__transaction.delete(key)
+                return
+
+            if key in self.in_memory_dictionary:
+                if self.write_behind:
+                    self.__defer_write(deleted_keys=[key])
+                    return
+                if self.append_only:
+                    self.__add_records_to_data_file(deleted_keys=[key])
+                else:
+                    self.__rewrite_with_changes(deleted_keys=[key])
+
+            self.__compactor.maybe_compact()
+
+    def __rewrite_with_changes(self, records=None, deleted_keys=()) -> None:
+        """
+        applies the records and the deletes of existing keys to the
+        in memory dictionary and rewrites the data file.
+        the in memory dictionary is left as it was if the rewrite
+        fails, for instance when a record cannot be encoded.
+        """
+
+        records = records or {}
+        previous_records = {
+            key: self.in_memory_dictionary[key]
+            for key in itertools.chain(records, deleted_keys)
+            if key in self.in_memory_dictionary
+            }
+
+        for key in deleted_keys:
             del self.in_memory_dictionary[key]
+        self.in_memory_dictionary.update(records)
+        self.__keys_removed(deleted_keys)
+        self.__keys_set(records.items())
+
+        try:
             self.__rewrite_data_file()
+        except BaseException:
+            for key in records:
+                if key in self.in_memory_dictionary:
+                    del self.in_memory_dictionary[key]
+            self.in_memory_dictionary.update(previous_records)
+            self.__keys_removed([
+                key for key in records if key not in previous_records])
+            self.__keys_set(previous_records.items())
+            raise
+
+    # -----------------
+    # Batch Write Operations
+    # -----------------
+    # A batch is validated before any of its records are written
+    # and written to the data file with a single append or rewrite
+    # -----------------
+
+    def set_many(self, records, trusted=False) -> None:
+        """
+        takes an iterable of key value pairs
+        and upserts all of them.
+        when a key repeats, the last value wins.
+        the keys and values are not validated when trusted is True.
+        """
+
+        self.__check_writable()
+
+        # collapse repeated keys keeping the order of first insertion
+        records = dict(records)
+
+        if not trusted:
+            for key, value in records.items():
+                self.__validate_record(key, value)
+
+        if not records:
+            return
+
+        with self.__writing():
+            if self.__transaction is not None:
+                for key, value in records.items():
+                    self.__transaction.set(key, value)
+                return
+
+            if self.write_behind:
+                self.__defer_write(records=records)
+                return
+
+            # a single existing record means the data file
+            # has to be rewritten unless the datastore is append only
+            rewrite_required = not self.append_only and any(
+                key in self.__index for key in records
+                )
+
+            if rewrite_required:
+                self.__rewrite_with_changes(records=records)
+            else:
+                self.__add_records_to_data_file(records=records.items())
+
+            self.__compactor.maybe_compact()
+
+    def update(self, mapping=(), trusted=False, **kwargs) -> None:
+        """
+        takes a mapping or an iterable of key value pairs,
+        and keyword arguments, and upserts all of them
+        """
+
+        if hasattr(mapping, 'keys'):
+            records = ((key, mapping[key]) for key in mapping.keys())
+        else:
+            records = mapping
+
+        if kwargs:
+            records = itertools.chain(records, kwargs.items())
+
+        self.set_many(records, trusted=trusted)
+
+    def delete_many(self, keys) -> None:
+        """
+        takes an iterable of keys
+        and removes the records that exist
+        """
+
+        self.__check_writable()
+
+        with self.__writing():
+            if self.__transaction is not None:
+                for key in keys:
+                    self.__transaction.delete(key)
+                return
+
+            keys = [
+                key for key in dict.fromkeys(keys)
+                if key in self.in_memory_dictionary
+                ]
+
+            if not keys:
+                return
+
+            if self.write_behind:
+                self.__defer_write(deleted_keys=keys)
+                return
+
+            if self.append_only:
+                self.__add_records_to_data_file(deleted_keys=keys)
+            else:
+                self.__rewrite_with_changes(deleted_keys=keys)
+
+            self.__compactor.maybe_compact()
+
+    # -----------------
+    # Transactions
+    # -----------------
+    # Writes made inside a transaction are buffered in memory
+    # and committed to the data file as a single group of records
+    # when the transaction ends without an exception
+    # -----------------
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        starts a transaction.
+        all the writes made inside the with block become visible
+        and are persisted together when the block ends.
+        none of them are applied if the block raises an exception.
+        other threads wait for the transaction before writing.
+        a transaction started inside another one joins it.
+        """
+
+        self.__check_writable()
+
+        with self.__writing():
+            if self.__transaction is not None:
+                yield self
+                return
+
+            transaction = Transaction()
+            self.__transaction = transaction
+            try:
+                yield self
+            finally:
+                self.__transaction = None
+
+            self.__commit_transaction(transaction)
+
+    def __commit_transaction(self, transaction) -> None:
+        """
+        applies the changes buffered by the transaction
+        to the in memory dictionary and the data file
+        """
+
+        records = {
+            key: value for key, value in transaction.changes.items()
+            if value is not DELETED
+            }
+        deleted_keys = [
+            key for key, value in transaction.changes.items()
+            if value is DELETED and key in self.in_memory_dictionary
+            ]
+
+        if not records and not deleted_keys:
+            return
+
+        # the changes are written to the data file together
+        # as the dirty records are written in a single group
+        if self.write_behind:
+            self.__defer_write(records=records, deleted_keys=deleted_keys)
+            return
+
+        rewrite_required = not self.append_only and (
+            bool(deleted_keys) or
+            any(key in self.__index for key in records)
+            )
+
+        if not rewrite_required:
+            self.__add_records_to_data_file(
+                records=records.items(),
+                deleted_keys=deleted_keys,
+                framed=True
+                )
+            self.__compactor.maybe_compact()
+            return
+
+        self.__rewrite_with_changes(records, deleted_keys)
+        self.__compactor.maybe_compact()
+
+    # -----------------
+    # Write Behind
+    # -----------------
+    # In write behind mode writes are applied to the in memory
+    # dictionary and the keys they change are marked dirty.
+    # The latest change of every dirty key is written to the
+    # data file as a single group of records, or a single rewrite
+    # -----------------
+
+    def pending_write_count(self) -> int:
+        """returns the number of changed keys not in the data file yet"""
+        return len(self.__dirty)
+
+    def time_since_last_flush(self) -> float:
+        """
+        returns the seconds since the pending writes
+        were last written to the data file
+        """
+        return time.monotonic() - self.__last_flush_time
+
+    def __defer_write(self, records=None, deleted_keys=()) -> None:
+        """
+        applies the records and deletes of existing keys
+        to the in memory dictionary and marks the keys dirty
+        """
+
+        for key in deleted_keys:
+            del self.in_memory_dictionary[key]
+            self.__dirty[key] = DELETED
+        self.__keys_removed(deleted_keys)
+
+        if records:
+            self.in_memory_dictionary.update(records)
+            self.__dirty.update(records)
+            self.__keys_set(records.items())
+
+        if len(self.__dirty) >= self.flush_threshold:
+            self.__write_dirty_records()
+        elif self.__flush_timer is None:
+            self.__flush_timer = threading.Timer(
+                self.flush_interval,
+                self.__flush_from_timer
+                )
+            self.__flush_timer.daemon = True
+            self.__flush_timer.start()
+
+    def __flush_from_timer(self) -> None:
+        """writes the pending writes once the flush interval passed"""
+        with self.__lock.write():
+            self.__flush_timer = None
+            self.__write_dirty_records()
+
+    def __write_dirty_records(self) -> None:
+        """
+        writes the latest change of every dirty key to the
+        data file with a single append or rewrite
+        """
+
+        if self.__flush_timer is not None:
+            self.__flush_timer.cancel()
+            self.__flush_timer = None
+
+        self.__last_flush_time = time.monotonic()
+
+        if not self.__dirty:
+            return
+
+        records = [
+            (key, value) for key, value in self.__dirty.items()
+            if value is not DELETED
+            ]
+        # keys that were added and deleted before
+        # they were written need no tombstone
+        deleted_keys = [
+            key for key, value in self.__dirty.items()
+            if value is DELETED and key in self.__index
+            ]
+
+        rewrite_required = not self.append_only and (
+            bool(deleted_keys) or
+            any(key in self.__index for key, _ in records)
+            )
+
+        if rewrite_required:
+            self.__rewrite_data_file()
+        else:
+            if records or deleted_keys:
+                self.__add_records_to_data_file(
+                    records=records,
+                    deleted_keys=deleted_keys,
+                    framed=len(records) + len(deleted_keys) > 1
+                    )
+            self.__dirty.clear()
+
+        self.__compactor.maybe_compact()
+
+    # -----------------
+    # Mapping Operations
+    # -----------------
+    # Read and write operations of MutableMapping that are
+    # made while holding the write lock, so that no other write
+    # is made between their read and their write
+    # -----------------
+
+    def pop(self, key: Any, default=_NO_DEFAULT) -> Any:
+        """
+        removes the key and returns its value.
+        returns default if the key does not exist
+                Exceptions:
+                    KeyError, when no default is given
+        """
+
+        self.__check_writable()
+
+        with self.__writing():
+            value = self.__lookup(key)
+            if value is MISSING:
+                if default is _NO_DEFAULT:
+                    raise KeyError(key)
+                return default
+            self.remove(key)
+            return value
+
+    def popitem(self) -> tuple:
+        """
+        removes a key and returns the key and its value
+                Exceptions:
+                    KeyError, when the datastore is empty
+        """
+
+        self.__check_writable()
+
+        with self.__writing():
+            for key in self:
+                return key, self.pop(key)
+            raise KeyError('popitem(): datastore is empty')
+
+    def setdefault(self, key: Any, default=None) -> Any:
+        """
+        returns the value of the key if it exists,
+        sets it to default and returns default otherwise
+        """
+
+        self.__check_writable()
+
+        with self.__writing():
+            value = self.__lookup(key)
+            if value is not MISSING:
+                return value
+            self.upsert_record(key, default)
+            return default
+
+    def clear(self) -> None:
+        """removes every key with a single write"""
+        self.__check_writable()
+
+        with self.__writing():
+            self.delete_many(list(self))
 
     def __len__(self) -> int:
         """returns the number of records in the database"""
-        return self.in_memory_dictionary.__len__()
+        self.__catch_up()
+        with self.__read_lock():
+            length = len(self.in_memory_dictionary)
+            changes = self.__transaction_changes()
+            if changes:
+                for key, value in changes.items():
+                    if key in self.in_memory_dictionary:
+                        if value is DELETED:
+                            length -= 1
+                    elif value is not DELETED:
+                        length += 1
+            return length
 
     def __delitem__(self, key):
         """delete key value pair from the datastore"""
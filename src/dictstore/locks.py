@@ -0,0 +1,212 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+locks coordinate the threads and processes
+reading and writing a datastore.
+"""
+
+import contextlib
+import os
+import threading
+
+
+@contextlib.contextmanager
+def no_lock():
+    """stands in for a lock when locking is turned off"""
+    yield
+
+
+class ReadWriteLock:
+    """
+    lets many threads read at the same time while
+    writes are made by one thread at a time.
+
+    the writing thread can acquire the lock again for
+    reading or writing. waiting writers are preferred over
+    new readers so that a steady stream of reads
+    does not keep the writers waiting.
+    """
+
+    def __init__(self) -> None:
+        self.__condition = threading.Condition(threading.Lock())
+
+        # number of times every reading thread acquired the lock
+        self.__readers = {}
+
+        self.__writer = None
+        self.__write_count = 0
+        self.__waiting_writers = 0
+
+    def acquire_read(self) -> None:
+        """waits until no thread is writing and acquires a read lock"""
+        thread_id = threading.get_ident()
+        with self.__condition:
+            # a thread already holding the lock does not wait,
+            # it would wait for itself
+            if thread_id not in self.__readers and thread_id != self.__writer:
+                while self.__writer is not None or self.__waiting_writers:
+                    self.__condition.wait()
+            self.__readers[thread_id] = self.__readers.get(thread_id, 0) + 1
+
+    def release_read(self) -> None:
+        """releases a read lock held by the calling thread"""
+        thread_id = threading.get_ident()
+        with self.__condition:
+            count = self.__readers[thread_id] - 1
+            if count:
+                self.__readers[thread_id] = count
+                return
+            del self.__readers[thread_id]
+            if not self.__readers:
+                self.__condition.notify_all()
+
+    def acquire_write(self) -> None:
+        """
+        waits until no other thread is reading or writing
+        and acquires the write lock
+                Exceptions:
+                    RuntimeError
+        """
+        thread_id = threading.get_ident()
+        with self.__condition:
+            if self.__writer == thread_id:
+                self.__write_count += 1
+                return
+
+            if thread_id in self.__readers:
+                raise RuntimeError('a read lock cannot be upgraded '
+                                   'to a write lock')
+
+            self.__waiting_writers += 1
+            try:
+                while self.__writer is not None or self.__readers:
+                    self.__condition.wait()
+            finally:
+                self.__waiting_writers -= 1
+
+            self.__writer = thread_id
+            self.__write_count = 1
+
+    def release_write(self) -> None:
+        """releases the write lock held by the calling thread"""
+        with self.__condition:
+            self.__write_count -= 1
+            if not self.__write_count:
+                self.__writer = None
+                self.__condition.notify_all()
+
+    @contextlib.contextmanager
+    def read(self):
+        """holds a read lock for the with block"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextlib.contextmanager
+    def write(self):
+        """holds the write lock for the with block"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
+
+
+class FileLock:
+    """
+    advisory lock shared by the processes using a data file.
+
+    the lock file also holds the generation of the data file
+    which is advanced every time the data file is rewritten,
+    so that the other processes know they have to load it again.
+    the lock can be acquired again by the process holding it.
+    """
+
+    def __init__(self, file_path) -> None:
+        """
+        opens the lock file, creating it if it does not exist
+                Exceptions:
+                    OSError
+                    NotImplementedError
+        """
+
+        # fcntl is only available on unix like platforms, it is
+        # imported once a process lock is asked for
+        try:
+            import fcntl
+        except ImportError:
+            raise NotImplementedError(
+                'multiprocess mode needs the file locks of fcntl, '
+                'which are not available on this platform'
+                ) from None
+        self.__fcntl = fcntl
+
+        self.file_path = file_path
+        self.__file_descriptor = os.open(
+            file_path,
+            os.O_RDWR | os.O_CREAT,
+            0o644
+            )
+
+        # number of times the lock is held by this process
+        self.__count = 0
+
+    @contextlib.contextmanager
+    def __hold(self, operation):
+        """holds the lock with the given flock operation"""
+        if not self.__count:
+            self.__fcntl.flock(self.__file_descriptor, operation)
+        self.__count += 1
+        try:
+            yield
+        finally:
+            self.__count -= 1
+            if not self.__count:
+                self.__fcntl.flock(self.__file_descriptor,
+                                   self.__fcntl.LOCK_UN)
+
+    def shared(self):
+        """holds the lock shared with other readers for the with block"""
+        return self.__hold(self.__fcntl.LOCK_SH)
+
+    def exclusive(self):
+        """holds the lock on its own for the with block"""
+        return self.__hold(self.__fcntl.LOCK_EX)
+
+    def is_held(self) -> bool:
+        """checks if this process holds the lock"""
+        return self.__count > 0
+
+    def generation(self) -> int:
+        """returns the generation of the data file"""
+        data = os.pread(self.__file_descriptor, 8, 0)
+        if len(data) < 8:
+            return 0
+        return int.from_bytes(data, 'little')
+
+    def advance_generation(self) -> int:
+        """
+        advances the generation of the data file after it was
+        rewritten and returns it. the lock must be held on its own.
+        """
+        generation = self.generation() + 1
+        os.pwrite(self.__file_descriptor, generation.to_bytes(8, 'little'), 0)
+        return generation
+
+    def close(self) -> None:
+        """closes the lock file, releasing the lock"""
+        os.close(self.__file_descriptor)
@@ -0,0 +1,105 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+parallel loading parses the records of a large data file
+in several processes, one chunk of the file per task.
+"""
+
+import concurrent.futures
+import os
+
+from dictstore.exceptions import DataStoreFileCorrupted
+from dictstore.formats import PUT
+
+# data files with fewer bytes of records to read
+# are parsed in the loading process
+PARALLEL_LOAD_MIN_SIZE = 4 * 1024 * 1024
+
+# number of chunks the data file is split into for every worker,
+# smaller chunks keep the workers busy until the end
+CHUNKS_PER_WORKER = 4
+
+
+class RawValue(bytes):
+    """
+    a value a worker could not decode, it is decoded again
+    by the loading process if its record is committed
+    """
+
+
+def parse_chunk(file_path, data_format, start, end, decode_values):
+    """
+    returns the records of the data file that start between
+    start and end, with the values of put records decoded
+    when decode_values is True.
+    returns None if the chunk is corrupted, the exceptions
+    of dictstore cannot be sent back from the worker processes.
+    """
+
+    def decoded(record):
+        try:
+            value = data_format.decode_value(record[4])
+        except DataStoreFileCorrupted:
+            # the record may belong to an interrupted group
+            value = RawValue(record[4])
+        return record[:4] + (value,)
+
+    records = []
+    try:
+        with open(file_path, 'rb') as data_file:
+            for record in data_format.iter_records(data_file, start):
+                if record[1] >= end:
+                    break
+                if decode_values and record[0] == PUT:
+                    record = decoded(record)
+                records.append(record)
+    except DataStoreFileCorrupted:
+        return None
+    return records
+
+
+def iter_records(file_path, data_format, offset, workers, decode_values):
+    """
+    yields the records of the data file after the offset in the order
+    they were written, parsing chunks of the file in workers processes.
+    offset is the start of a record or None for the first record.
+            Exceptions:
+                DataStoreFileCorrupted
+                UnsupportedFileVersion
+    """
+
+    with open(file_path, 'rb') as data_file:
+        first_record_offset = data_format.first_record_offset(data_file)
+        start = first_record_offset if offset is None else offset
+        end = os.fstat(data_file.fileno()).st_size
+        boundaries = data_format.split(
+            data_file, start, end, workers * CHUNKS_PER_WORKER)
+
+    ends = boundaries[1:] + [end]
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        # map returns the chunks in the order of the data file
+        chunks = executor.map(
+            parse_chunk,
+            [file_path] * len(boundaries),
+            [data_format] * len(boundaries),
+            boundaries,
+            ends,
+            [decode_values] * len(boundaries)
+            )
+        for records in chunks:
+            if records is None:
+                raise DataStoreFileCorrupted()
+            yield from records
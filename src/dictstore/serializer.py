@@ -0,0 +1,252 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+serializer converts keys and values to python literals
+that ast.literal_eval reads back as the same key or value.
+
+repr is used wherever it already returns such a literal,
+which is the case for the exact built in types other than
+floats that are not finite. subclasses of the built in types
+are written as their base type.
+"""
+
+import math
+
+from typing import Any
+
+# types whose repr is always a literal of the same value
+_REPR_TYPES = frozenset((str, bytes, int, bool, type(None)))
+
+# containers whose repr is a literal when the repr of their items are
+_CONTAINER_TYPES = (list, tuple, set, dict)
+
+_FLOAT_REPR_TYPES = _REPR_TYPES | {float}
+
+# types whose repr is a literal when their items are literals
+_NESTED_REPR_TYPES = _REPR_TYPES | {float} | frozenset(_CONTAINER_TYPES)
+
+# types of the values kept in the serialization cache.
+# values of these types are immutable and compare equal
+# only to values with the same literal
+_CACHED_TYPES = frozenset((str, bytes, tuple))
+
+# literals of the floats that have no literal of their own.
+# 1e999 overflows to infinity when it is read
+_INFINITY = '1e999'
+_NEGATIVE_INFINITY = '-1e999'
+
+
+def _float_literal(value: float) -> str:
+    """
+    returns the literal of a float
+            Exceptions:
+                ValueError
+    """
+    if math.isfinite(value):
+        return repr(float(value))
+    if math.isnan(value):
+        raise ValueError('nan cannot be written as a python literal')
+    return _INFINITY if value > 0 else _NEGATIVE_INFINITY
+
+
+# results of _repr_safety
+_UNSAFE = 0
+_SAFE = 1
+_SAFE_IF_FINITE = 2
+
+
+def _repr_safety(items) -> int:
+    """
+    checks if the repr of every item is its literal.
+    returns _SAFE_IF_FINITE when some of the items are floats
+    which have a literal unless they are infinite or nan.
+    the types of the items are checked without a loop in python
+    unless some of them are containers
+    """
+
+    item_types = set(map(type, items))
+    if item_types <= _REPR_TYPES:
+        return _SAFE
+    if item_types <= _FLOAT_REPR_TYPES:
+        return _SAFE_IF_FINITE
+    if not item_types <= _NESTED_REPR_TYPES:
+        return _UNSAFE
+
+    safety = _SAFE if float not in item_types else _SAFE_IF_FINITE
+    for item in items:
+        item_type = type(item)
+        if item_type is dict:
+            item_safety = _dict_repr_safety(item)
+        elif item_type in _CONTAINER_TYPES:
+            item_safety = _repr_safety(item)
+        else:
+            continue
+        if item_safety == _UNSAFE:
+            return _UNSAFE
+        safety = max(safety, item_safety)
+    return safety
+
+
+def _dict_repr_safety(obj) -> int:
+    """checks if the repr of every key and value of a dict is its literal"""
+    key_safety = _repr_safety(obj.keys())
+    if key_safety == _UNSAFE:
+        return _UNSAFE
+    value_safety = _repr_safety(obj.values())
+    if value_safety == _UNSAFE:
+        return _UNSAFE
+    return max(key_safety, value_safety)
+
+
+def _repr_literal(obj, safety) -> Any:
+    """
+    returns the repr of a container whose items have the given
+    safety if it is a literal, None otherwise
+    """
+    if safety == _UNSAFE:
+        return None
+    literal = repr(obj)
+    # the repr of infinite and nan floats contains inf or nan,
+    # strings containing them are written item by item
+    if safety == _SAFE_IF_FINITE and ('inf' in literal or 'nan' in literal):
+        return None
+    return literal
+
+
+class Serializer:
+    """
+    converts keys and values to python literals.
+
+    the literals of the strings, bytes and tuples of strings
+    written last are kept in a cache of up to cache_size entries,
+    so that keys and values written repeatedly are converted once.
+    only literals of up to max_literal_size characters are cached,
+    larger values are neither kept alive by the cache nor likely
+    to be written again. the cache is emptied when it is full.
+    """
+
+    def __init__(self, cache_size=4096, max_literal_size=256) -> None:
+        self.cache_size = cache_size
+        self.max_literal_size = max_literal_size
+        self.__cache = {}
+
+    def serialize(self, obj: Any) -> str:
+        """
+        returns the python literal of the key or value
+                Exceptions:
+                    ValueError
+                    TypeError
+        """
+
+        obj_type = type(obj)
+
+        # a tuple of other values may be equal to a tuple
+        # with a different literal, like (1,) and (True,)
+        if (
+            obj_type in _CACHED_TYPES and
+            self.cache_size and
+            (all(type(item) is str for item in obj)
+             if obj_type is tuple else
+             len(obj) <= self.max_literal_size)
+           ):
+            try:
+                return self.__cache[obj]
+            except KeyError:
+                pass
+
+            literal = self.__serialize(obj)
+            if len(literal) > self.max_literal_size:
+                return literal
+            if len(self.__cache) >= self.cache_size:
+                self.__cache.clear()
+            self.__cache[obj] = literal
+            return literal
+
+        return self.__serialize(obj)
+
+    def __serialize(self, obj: Any) -> str:
+        """returns the python literal of the key or value"""
+
+        obj_type = type(obj)
+
+        if obj_type in _REPR_TYPES:
+            return repr(obj)
+
+        if obj_type is float:
+            return _float_literal(obj)
+
+        if obj_type in _CONTAINER_TYPES:
+            if obj_type is dict:
+                safety = _dict_repr_safety(obj)
+            else:
+                safety = _repr_safety(obj)
+            literal = _repr_literal(obj, safety)
+            if literal is not None:
+                return literal
+            return self.__serialize_container(obj)
+
+        # subclasses are written as the built in type they extend
+        if isinstance(obj, bool):
+            return repr(bool(obj))
+        if isinstance(obj, int):
+            return repr(int(obj))
+        if isinstance(obj, float):
+            return _float_literal(obj)
+        if isinstance(obj, str):
+            return repr(str(obj))
+        if isinstance(obj, bytes):
+            return repr(bytes(obj))
+        for container_type in _CONTAINER_TYPES:
+            if isinstance(obj, container_type):
+                return self.__serialize_container(obj, container_type)
+
+        raise TypeError('cannot serialize ' + obj_type.__name__)
+
+    def __serialize_container(self, obj, container_type=None) -> str:
+        """returns the literal of a container built from its items"""
+
+        container_type = container_type or type(obj)
+        serialize = self.__serialize
+
+        if container_type is dict:
+            return '{' + ', '.join(
+                serialize(key) + ': ' + serialize(value)
+                for key, value in obj.items()
+                ) + '}'
+
+        items = ', '.join(map(serialize, obj))
+        if container_type is list:
+            return '[' + items + ']'
+        if container_type is tuple:
+            return '(' + items + (',)' if len(obj) == 1 else ')')
+        return '{' + items + '}' if obj else 'set()'
+
+    def clear_cache(self) -> None:
+        """removes all the literals from the cache"""
+        self.__cache.clear()
+
+
+# serializer shared by the codecs
+_default_serializer = Serializer()
+
+
+def serialize(obj: Any) -> str:
+    """
+    returns the python literal of the key or value
+            Exceptions:
+                ValueError
+                TypeError
+    """
+    return _default_serializer.serialize(obj)
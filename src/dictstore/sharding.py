@@ -0,0 +1,402 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+sharded datastores partition their keys across
+several data files kept in a directory.
+"""
+
+import concurrent.futures
+import heapq
+import os
+import re
+import threading
+import zlib
+
+from pathlib import Path
+from typing import Any
+
+from dictstore.cache import CacheInfo
+from dictstore.interface import DictStore
+from dictstore.sorted_keys import sort_key
+
+# name of the data file of every shard
+SHARD_FILE_NAME = 'shard-{:04d}-of-{:04d}.dictstore'
+SHARD_FILE_PATTERN = re.compile(r'shard-(\d{4})-of-(\d{4})\.dictstore')
+
+
+def _canonical_key(key: Any) -> str:
+    """
+    returns a string for the key that is the same in every process.
+    keys that are equal in a dictionary, like 1, 1.0 and True,
+    have the same string.
+    """
+
+    if isinstance(key, tuple):
+        return '(' + ','.join(_canonical_key(item) for item in key) + ')'
+    if isinstance(key, bool):
+        return repr(int(key))
+    if isinstance(key, float) and key.is_integer():
+        return repr(int(key))
+    return repr(key)
+
+
+def shard_index(key: Any, shard_count: int) -> int:
+    """returns the shard of the key, stable across processes"""
+    return zlib.crc32(_canonical_key(key).encode('utf-8')) % shard_count
+
+
+class ShardedDictStore:
+    """
+    partitions the keys across shard_count DictStore data files.
+
+    a shard is loaded the first time one of its keys is used,
+    and every shard is compacted on its own, so a large datastore
+    is never loaded or rewritten as a whole.
+    """
+
+    def __init__(self,
+                 directory='./default.dictstore.d',
+                 shard_count=None,
+                 preload=False,
+                 workers=None,
+                 **kwargs) -> None:
+        """
+        opens the sharded datastore kept in the directory.
+
+            shard_count:
+                number of shards of a new datastore, 16 by default.
+                an existing datastore keeps the number of shards
+                it was created with.
+            preload:
+                when True, all the shards are loaded right away.
+            workers:
+                number of threads loading the shards when preload
+                is True. the shards are loaded one after the other
+                when it is None.
+            kwargs:
+                options passed to the DictStore of every shard.
+                Exceptions:
+                    ValueError
+        """
+
+        self.directory = Path(directory).resolve().__str__()
+        Path(self.directory).mkdir(parents=True, exist_ok=True)
+
+        existing_shard_count = self.__detect_shard_count()
+        if existing_shard_count is None:
+            self.shard_count = 16 if shard_count is None else shard_count
+        elif shard_count in (None, existing_shard_count):
+            self.shard_count = existing_shard_count
+        else:
+            raise ValueError('the datastore has {} shards'.format(
+                existing_shard_count))
+
+        if self.shard_count < 1:
+            raise ValueError('shard_count must be at least 1')
+
+        self.__options = kwargs
+        self.__shards = [None] * self.shard_count
+        self.__lock = threading.Lock()
+
+        if preload:
+            self.load_all(workers)
+
+    def __detect_shard_count(self) -> Any:
+        """returns the number of shards in the directory, if any"""
+        shard_counts = set()
+        for file_name in os.listdir(self.directory):
+            match = SHARD_FILE_PATTERN.fullmatch(file_name)
+            if match:
+                shard_counts.add(int(match.group(2)))
+
+        if len(shard_counts) > 1:
+            raise ValueError('the directory has shards of '
+                             'more than one datastore')
+        return shard_counts.pop() if shard_counts else None
+
+    # -----------------
+    # Shards
+    # -----------------
+
+    def shard_path(self, index: int) -> str:
+        """returns the path of the data file of the shard"""
+        return os.path.join(
+            self.directory,
+            SHARD_FILE_NAME.format(index, self.shard_count)
+            )
+
+    def shard(self, index: int) -> DictStore:
+        """returns the shard, loading it the first time"""
+        shard = self.__shards[index]
+        if shard is None:
+            with self.__lock:
+                shard = self.__shards[index]
+                if shard is None:
+                    shard = DictStore(self.shard_path(index),
+                                      **self.__options)
+                    self.__shards[index] = shard
+        return shard
+
+    def shard_for(self, key: Any) -> DictStore:
+        """returns the shard holding the key"""
+        return self.shard(shard_index(key, self.shard_count))
+
+    def loaded_shards(self) -> list:
+        """returns the indexes of the shards loaded so far"""
+        return [
+            index for index, shard in enumerate(self.__shards)
+            if shard is not None
+            ]
+
+    def load_all(self, workers=None) -> None:
+        """loads all the shards, in parallel when workers is given"""
+        if workers is None:
+            for index in range(self.shard_count):
+                self.shard(index)
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+            list(executor.map(self.shard, range(self.shard_count)))
+
+    def __group_by_shard(self, keys) -> dict:
+        """returns the given keys grouped by the index of their shard"""
+        groups = {}
+        for key in keys:
+            groups.setdefault(shard_index(key, self.shard_count), []).append(
+                key)
+        return groups
+
+    # -----------------
+    # Read Operations
+    # -----------------
+
+    def get(self, key: Any) -> Any:
+        """
+        takes a key and returns the value if it exists.
+        returns None if the key does not exist.
+        """
+        return self.shard_for(key).get(key)
+
+    def keys(self) -> list:
+        """returns a list of all the keys in the datastore"""
+        keys = []
+        for index in range(self.shard_count):
+            keys.extend(self.shard(index).keys())
+        return keys
+
+    def items(self):
+        """yields the key value pairs of the shards one shard at a time"""
+        for index in range(self.shard_count):
+            yield from self.shard(index).items()
+
+    def __iter__(self):
+        """iterates over the keys of the shards one shard at a time"""
+        for index in range(self.shard_count):
+            yield from self.shard(index)
+
+    def __contains__(self, key: Any) -> bool:
+        """checks if the key is in the datastore"""
+        return key in self.shard_for(key)
+
+    def values(self) -> list:
+        """returns a list of all the values in the datastore"""
+        values = []
+        for index in range(self.shard_count):
+            values.extend(self.shard(index).values())
+        return values
+
+    def range(self, lo: Any = None, hi: Any = None):
+        """
+        returns an iterator over the keys from lo, included,
+        to hi, excluded, merged in sorted order from every shard
+        """
+        return heapq.merge(
+            *[self.shard(index).range(lo, hi)
+              for index in range(self.shard_count)],
+            key=sort_key
+            )
+
+    def prefix(self, prefix: Any):
+        """
+        returns an iterator over the keys starting with the prefix,
+        merged in sorted order from every shard
+                Exceptions:
+                    TypeError
+        """
+        return heapq.merge(
+            *[self.shard(index).prefix(prefix)
+              for index in range(self.shard_count)],
+            key=sort_key
+            )
+
+    def find(self, **fields) -> list:
+        """
+        returns the keys of the records whose value is a dict
+        holding all the given fields with the given values,
+        found in every shard
+                Exceptions:
+                    TypeError, when no field is given
+        """
+        keys = []
+        for index in range(self.shard_count):
+            keys.extend(self.shard(index).find(**fields))
+        return keys
+
+    # -----------------
+    # Field Indexes
+    # -----------------
+
+    def create_index(self, field: Any) -> None:
+        """
+        indexes the field of the dict values in every shard,
+        including the shards loaded later
+        """
+        with self.__lock:
+            indexes = list(self.__options.get('indexes', ()))
+            if field not in indexes:
+                indexes.append(field)
+            self.__options['indexes'] = indexes
+        for index in self.loaded_shards():
+            self.shard(index).create_index(field)
+
+    def drop_index(self, field: Any) -> None:
+        """removes the index of the field from every shard"""
+        with self.__lock:
+            self.__options['indexes'] = [
+                indexed_field
+                for indexed_field in self.__options.get('indexes', ())
+                if indexed_field != field
+                ]
+        for index in self.loaded_shards():
+            self.shard(index).drop_index(field)
+
+    # -----------------
+    # Write Operations
+    # -----------------
+
+    def upsert_record(self, key: Any, value: Any, trusted=False) -> None:
+        """
+        takes a key value pair
+        and updates the value if it already exists
+        creates a new record otherwise.
+        the key and value are not validated when trusted is True.
+        """
+        self.shard_for(key).upsert_record(key, value, trusted=trusted)
+
+    def remove(self, key) -> None:
+        """
+        takes a key
+        and removes the record if it exists
+        """
+        self.shard_for(key).remove(key)
+
+    def set_many(self, records, trusted=False) -> None:
+        """
+        takes an iterable of key value pairs and upserts all of them
+        with a single write to every shard they belong to.
+        the keys and values are not validated when trusted is True.
+        """
+        records = dict(records)
+        for index, keys in self.__group_by_shard(records).items():
+            self.shard(index).set_many(
+                ((key, records[key]) for key in keys),
+                trusted=trusted
+                )
+
+    def update(self, mapping, trusted=False) -> None:
+        """
+        takes a mapping or an iterable of key value pairs
+        and upserts all of them
+        """
+        if hasattr(mapping, 'keys'):
+            self.set_many(
+                ((key, mapping[key]) for key in mapping.keys()),
+                trusted=trusted
+                )
+        else:
+            self.set_many(mapping, trusted=trusted)
+
+    def delete_many(self, keys) -> None:
+        """
+        takes an iterable of keys and removes the records that exist
+        with a single write to every shard they belong to
+        """
+        for index, shard_keys in self.__group_by_shard(keys).items():
+            self.shard(index).delete_many(shard_keys)
+
+    # -----------------
+    # Data Files
+    # -----------------
+
+    def compact(self) -> None:
+        """compacts the loaded shards one at a time"""
+        for index in self.loaded_shards():
+            self.shard(index).compact()
+
+    def flush(self) -> None:
+        """writes the buffered appends of the loaded shards"""
+        for index in self.loaded_shards():
+            self.shard(index).flush()
+
+    def sync(self) -> None:
+        """writes the buffered appends of the loaded shards to the disk"""
+        for index in self.loaded_shards():
+            self.shard(index).sync()
+
+    def close(self) -> None:
+        """closes the loaded shards"""
+        with self.__lock:
+            for index, shard in enumerate(self.__shards):
+                if shard is not None:
+                    shard.close()
+                    self.__shards[index] = None
+
+    def __enter__(self) -> 'ShardedDictStore':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def cache_info(self) -> Any:
+        """
+        returns the sum of the cache counters of the loaded shards.
+        returns None when every value is kept in memory.
+        """
+        infos = [
+            self.shard(index).cache_info()
+            for index in self.loaded_shards()
+            ]
+        infos = [info for info in infos if info is not None]
+        if not infos:
+            return None
+        return CacheInfo(*map(sum, zip(*infos)))
+
+    def __len__(self) -> int:
+        """returns the number of records in the database"""
+        return sum(
+            len(self.shard(index)) for index in range(self.shard_count)
+            )
+
+    def __delitem__(self, key):
+        """delete key value pair from the datastore"""
+        self.remove(key)
+
+    def __getitem__(self, key):
+        """perform get operation with the given key"""
+        return self.get(key)
+
+    def __setitem__(self, key, value):
+        """perform upsert operation with the given key and value"""
+        self.upsert_record(key, value)
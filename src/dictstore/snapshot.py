@@ -0,0 +1,71 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+snapshots hold the loaded state of a data file up to a position
+in it, so that only the records after the position are replayed
+when the data file is loaded again.
+"""
+
+import marshal
+import os
+
+# version of the snapshot layout, snapshots of
+# other versions are ignored
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotFile:
+    """
+    reads and writes the snapshot kept next to a data file.
+
+    a snapshot is a dictionary with
+        position:    bytes of the data file covered by the snapshot
+        fingerprint: fingerprint of the covered bytes of the data file
+        format:      name of the format of the data file
+        index:       location of the live record of every key
+        values:      value of every key, None if it was not loaded
+        live_bytes:  live bytes of the covered part of the data file
+        dead_bytes:  dead bytes of the covered part of the data file
+    """
+
+    def __init__(self, data_file_path) -> None:
+        self.file_path = data_file_path + '.snapshot'
+
+    def load(self):
+        """
+        returns the snapshot or None if there is
+        no snapshot or it cannot be read
+        """
+
+        try:
+            with open(self.file_path, 'rb') as snapshot_file:
+                version, snapshot = marshal.load(snapshot_file)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+
+        if version != SNAPSHOT_VERSION or not isinstance(snapshot, dict):
+            return None
+        return snapshot
+
+    def save(self, snapshot: dict) -> None:
+        """
+        writes the snapshot to a temporary file
+        which then replaces the snapshot file atomically
+        """
+
+        temp_file_path = self.file_path + '.tmp'
+        with open(temp_file_path, 'wb') as snapshot_file:
+            marshal.dump((SNAPSHOT_VERSION, snapshot), snapshot_file)
+        os.replace(temp_file_path, self.file_path)
@@ -0,0 +1,325 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+sorted index of the keys of a datastore,
+used for range and prefix scans.
+
+keys of different types cannot be compared with each other,
+so they are sorted by their sort_key. None comes first, then
+numbers, nan, strings, tuples and keys of any other type.
+numbers, strings and tuples are sorted as python sorts them.
+"""
+
+import bisect
+import operator
+
+from typing import Any
+
+# order of the kinds of keys
+_NONE_RANK = 0
+_NUMBER_RANK = 1
+_NAN_RANK = 2
+_STRING_RANK = 3
+_TUPLE_RANK = 4
+_OTHER_RANK = 5
+
+# number of keys in the blocks of a rebuilt index.
+# a block is split in two once it holds twice as many keys
+_BLOCK_SIZE = 512
+
+# batches of keys larger than this fraction of the index
+# are merged by sorting the index again
+_REBUILD_FRACTION = 0.125
+
+
+def sort_key(key: Any) -> tuple:
+    """returns a value that orders keys of any type"""
+
+    key_type = type(key)
+    if key_type is str:
+        return (_STRING_RANK, key)
+    if key_type is int:
+        return (_NUMBER_RANK, key)
+    if key_type is tuple:
+        return (_TUPLE_RANK, tuple(map(sort_key, key)))
+    if key is None:
+        return (_NONE_RANK,)
+
+    # bools, floats and subclasses of the key types
+    if isinstance(key, (int, float)):
+        # nan is not ordered with any number
+        if key != key:
+            return (_NAN_RANK,)
+        return (_NUMBER_RANK, key)
+    if isinstance(key, str):
+        return (_STRING_RANK, str(key))
+    if isinstance(key, tuple):
+        return (_TUPLE_RANK, tuple(map(sort_key, key)))
+    return (_OTHER_RANK, key_type.__name__, repr(key))
+
+
+class SortedKeys:
+    """
+    keeps keys sorted by their sort_key in blocks of up to
+    2 * _BLOCK_SIZE keys, with the last sort key of every block,
+    so that a key is found with bisect and inserted or removed
+    by moving the keys of a single block.
+
+    range and prefix find their first key in logarithmic time
+    and return a copy of the keys they match, so the index can
+    change while the keys are iterated over.
+    """
+
+    def __init__(self, keys=()) -> None:
+        self.__blocks = []
+        # sort keys of the keys of every block, at the same position
+        self.__block_sort_keys = []
+        # last sort key of every block
+        self.__maxes = []
+        self.__length = 0
+        self.update(keys)
+
+    def __len__(self) -> int:
+        return self.__length
+
+    def __iter__(self):
+        return iter([key for block in self.__blocks for key in block])
+
+    def __locate(self, key_sort_key: tuple, right=False) -> tuple:
+        """
+        returns the block and position of the first key whose
+        sort key is not less than, or greater than when right
+        is True, the given sort key
+        """
+
+        search = bisect.bisect_right if right else bisect.bisect_left
+        block_index = search(self.__maxes, key_sort_key)
+        if block_index == len(self.__blocks):
+            return block_index, 0
+        return (
+            block_index,
+            search(self.__block_sort_keys[block_index], key_sort_key)
+            )
+
+    def __find(self, key: Any, key_sort_key: tuple) -> Any:
+        """returns the block and position of the key, None if it is absent"""
+
+        block_index, position = self.__locate(key_sort_key)
+        # only keys like nan share their sort key with other keys
+        while block_index < len(self.__blocks):
+            block_sort_keys = self.__block_sort_keys[block_index]
+            if position == len(block_sort_keys):
+                block_index += 1
+                position = 0
+                continue
+            if block_sort_keys[position] != key_sort_key:
+                return None
+            indexed_key = self.__blocks[block_index][position]
+            if indexed_key is key or indexed_key == key:
+                return block_index, position
+            position += 1
+        return None
+
+    def __contains__(self, key: Any) -> bool:
+        return self.__find(key, sort_key(key)) is not None
+
+    def __keys_between(self, start: tuple, stop: tuple) -> list:
+        """returns a copy of the keys from the start to the stop position"""
+
+        start_block, start_position = start
+        stop_block, stop_position = stop
+        if start_block == stop_block:
+            if start_block == len(self.__blocks):
+                return []
+            return self.__blocks[start_block][start_position:stop_position]
+
+        keys = self.__blocks[start_block][start_position:]
+        for block in self.__blocks[start_block + 1:stop_block]:
+            keys.extend(block)
+        if stop_block < len(self.__blocks):
+            keys.extend(self.__blocks[stop_block][:stop_position])
+        return keys
+
+    def add(self, key: Any) -> None:
+        """adds the key if it is not indexed yet"""
+
+        key_sort_key = sort_key(key)
+        if self.__find(key, key_sort_key) is not None:
+            return
+
+        if not self.__blocks:
+            self.__blocks.append([key])
+            self.__block_sort_keys.append([key_sort_key])
+            self.__maxes.append(key_sort_key)
+            self.__length = 1
+            return
+
+        block_index, position = self.__locate(key_sort_key, right=True)
+        if block_index == len(self.__blocks):
+            block_index -= 1
+            position = len(self.__blocks[block_index])
+
+        block = self.__blocks[block_index]
+        block_sort_keys = self.__block_sort_keys[block_index]
+        block.insert(position, key)
+        block_sort_keys.insert(position, key_sort_key)
+        self.__maxes[block_index] = block_sort_keys[-1]
+        self.__length += 1
+
+        if len(block) > 2 * _BLOCK_SIZE:
+            self.__blocks[block_index + 1:block_index + 1] = [
+                block[_BLOCK_SIZE:]]
+            self.__block_sort_keys[block_index + 1:block_index + 1] = [
+                block_sort_keys[_BLOCK_SIZE:]]
+            del block[_BLOCK_SIZE:]
+            del block_sort_keys[_BLOCK_SIZE:]
+            self.__maxes.insert(block_index, block_sort_keys[-1])
+
+    def discard(self, key: Any) -> None:
+        """removes the key if it is indexed"""
+
+        location = self.__find(key, sort_key(key))
+        if location is None:
+            return
+
+        block_index, position = location
+        block_sort_keys = self.__block_sort_keys[block_index]
+        del self.__blocks[block_index][position]
+        del block_sort_keys[position]
+        self.__length -= 1
+
+        if block_sort_keys:
+            self.__maxes[block_index] = block_sort_keys[-1]
+        else:
+            del self.__blocks[block_index]
+            del self.__block_sort_keys[block_index]
+            del self.__maxes[block_index]
+
+    def update(self, keys) -> None:
+        """
+        adds the keys that are not indexed yet.
+        a large batch is merged by sorting all the keys again
+        instead of inserting them one at a time.
+        """
+
+        keys = list(keys)
+        if len(keys) <= self.__length * _REBUILD_FRACTION:
+            for key in keys:
+                self.add(key)
+            return
+
+        # equal keys, like 1 and 1.0, are indexed once
+        unique_keys = dict.fromkeys(self)
+        unique_keys.update(dict.fromkeys(keys))
+
+        entries = sorted(
+            ((sort_key(key), key) for key in unique_keys),
+            key=operator.itemgetter(0)
+            )
+        self.clear()
+        for start in range(0, len(entries), _BLOCK_SIZE):
+            block_entries = entries[start:start + _BLOCK_SIZE]
+            self.__blocks.append([entry[1] for entry in block_entries])
+            self.__block_sort_keys.append(
+                [entry[0] for entry in block_entries])
+            self.__maxes.append(block_entries[-1][0])
+        self.__length = len(entries)
+
+    def difference_update(self, keys) -> None:
+        """removes the keys that are indexed"""
+        for key in keys:
+            self.discard(key)
+
+    def clear(self) -> None:
+        """removes all the keys"""
+        self.__blocks = []
+        self.__block_sort_keys = []
+        self.__maxes = []
+        self.__length = 0
+
+    def range(self, lo: Any = None, hi: Any = None):
+        """
+        returns an iterator over the keys from lo, included,
+        to hi, excluded, in sorted order.
+        a bound of None leaves that side of the range open.
+        """
+
+        start = (0, 0)
+        stop = (len(self.__blocks), 0)
+        if lo is not None:
+            start = self.__locate(sort_key(lo))
+        if hi is not None:
+            stop = self.__locate(sort_key(hi))
+        if stop < start:
+            return iter(())
+        return iter(self.__keys_between(start, stop))
+
+    def prefix(self, prefix: Any):
+        """
+        returns an iterator over the keys starting with the prefix,
+        in sorted order. a string prefix matches the string keys
+        starting with it and a tuple prefix the tuple keys whose
+        first items are equal to its items.
+                Exceptions:
+                    TypeError
+        """
+
+        prefix_sort_key = sort_key(prefix)
+        rank = prefix_sort_key[0]
+        value = prefix_sort_key[1] if len(prefix_sort_key) > 1 else None
+
+        if rank == _STRING_RANK:
+            def matches(key_sort_key):
+                return (
+                    key_sort_key[0] == _STRING_RANK and
+                    key_sort_key[1].startswith(value)
+                    )
+        elif rank == _TUPLE_RANK:
+            length = len(value)
+
+            def matches(key_sort_key):
+                return (
+                    key_sort_key[0] == _TUPLE_RANK and
+                    key_sort_key[1][:length] == value
+                    )
+        else:
+            raise TypeError('prefix must be a str or a tuple')
+
+        # the keys starting with the prefix sort right after it and
+        # next to each other. the first key after them is in the
+        # first block whose last key does not start with the prefix
+        start = self.__locate(prefix_sort_key)
+        low = start[0]
+        high = len(self.__blocks)
+        while low < high:
+            middle = (low + high) // 2
+            if matches(self.__maxes[middle]):
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(self.__blocks):
+            return iter(self.__keys_between(start, (low, 0)))
+
+        block_sort_keys = self.__block_sort_keys[low]
+        stop_block = low
+        low = start[1] if stop_block == start[0] else 0
+        high = len(block_sort_keys)
+        while low < high:
+            middle = (low + high) // 2
+            if matches(block_sort_keys[middle]):
+                low = middle + 1
+            else:
+                high = middle
+        return iter(self.__keys_between(start, (stop_block, low)))
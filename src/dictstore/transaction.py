@@ -0,0 +1,50 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+transactions buffer writes in memory until they are committed
+to the datastore as a single group of records.
+"""
+
+import threading
+
+from typing import Any
+
+
+# marks a key deleted inside a transaction
+DELETED = object()
+
+
+class Transaction:
+    """
+    buffers the writes made by the thread that owns the transaction
+    """
+
+    def __init__(self) -> None:
+        self.owner = threading.get_ident()
+
+        # latest change of every key, either a value or DELETED
+        self.changes = {}
+
+    def is_owned_by_current_thread(self) -> bool:
+        """checks if the transaction was started by the calling thread"""
+        return self.owner == threading.get_ident()
+
+    def set(self, key: Any, value: Any) -> None:
+        """buffers an upsert of the given key"""
+        self.changes[key] = value
+
+    def delete(self, key: Any) -> None:
+        """buffers a delete of the given key"""
+        self.changes[key] = DELETED
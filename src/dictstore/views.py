@@ -0,0 +1,61 @@
+# Copyright 2021 Sai Sampath Kumar Balivada
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+views of the values and items of a datastore.
+like the views of a dictionary they are not copies,
+they reflect the datastore as it is when they are used.
+"""
+
+import collections.abc
+
+from typing import Any, Callable
+
+
+class ValuesView(collections.abc.ValuesView):
+    """
+    live view of the values of a datastore.
+    the values are streamed from the items of the datastore
+    instead of being looked up key by key.
+    """
+
+    def __init__(self, mapping, iter_items: Callable) -> None:
+        super().__init__(mapping)
+        self.__iter_items = iter_items
+
+    def __iter__(self):
+        for _, value in self.__iter_items():
+            yield value
+
+
+class ItemsView(collections.abc.ItemsView):
+    """
+    live view of the key value pairs of a datastore.
+    the items are streamed from the datastore.
+    """
+
+    def __init__(self, mapping, iter_items: Callable) -> None:
+        super().__init__(mapping)
+        self.__iter_items = iter_items
+
+    def __iter__(self):
+        return self.__iter_items()
+
+    def __contains__(self, item: Any) -> bool:
+        key, value = item
+        # reading a missing key returns None instead of raising
+        if key not in self._mapping:
+            return False
+        stored_value = self._mapping[key]
+        return stored_value is value or stored_value == value
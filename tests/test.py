@@ -16,25 +16,89 @@
 tests module for dictstore
 """
 
+import ast
+import asyncio
+import collections.abc
+import importlib.util
+import multiprocessing
+import random
+import shutil
+import threading
+import time
+import tracemalloc
 import unittest
+import unittest.mock
 import os
-from dictstore import file_handler
+from dictstore import (
+    file_handler,
+    formats,
+    helpers,
+    interface,
+    parallel,
+    serializer,
+    sharding,
+    sorted_keys
+)
+from dictstore.async_interface import AsyncDictStore
+from dictstore.cache import MISSING
+from dictstore.codec import LiteralCodec, FastLiteralCodec, literal_eval
+from dictstore.convert import convert_file
 from dictstore.exceptions import (
     InvalidFileExtension,
     DataStoreFileCorrupted,
+    ReadOnlyDataStore,
     UnsupportedValueType
 )
 from dictstore.interface import DictStore
+from dictstore.locks import ReadWriteLock
+from dictstore.sharding import ShardedDictStore
 
 
 def clean_temp_files(file_name):
     """
-    remove data file if already exists
+    remove data file if already exists, along with the lock,
+    snapshot and temporary files next to it. the datastore
+    opened for it is closed first. a directory of shards is
+    removed with all its data files.
+    """
+    if os.path.isdir(file_name):
+        for shard_file_name in os.listdir(file_name):
+            clean_temp_files(os.path.join(file_name, shard_file_name))
+        shutil.rmtree(file_name, ignore_errors=True)
+        return
+
+    dict_store = DictStore.opened_instance(file_name)
+    if dict_store is not None:
+        dict_store.close()
+
+    for suffix in ('', '.lock', '.snapshot', '.tmp'):
+        try:
+            os.remove(file_name + suffix)
+        except OSError:
+            pass
+
+
+def reopen_data_store(file_name, **kwargs):
+    """
+    closes the instance opened for the data file
+    and loads it again from the disk
+    """
+    if os.path.exists(file_name):
+        DictStore(file_name).close()
+    return DictStore(file_name, **kwargs)
+
+
+def increment_counters(file_name, worker_number):
     """
-    try:
-        os.remove(file_name)
-    except OSError:
-        pass
+    increments the shared counter of the data file
+    from a worker process
+    """
+    dict_store = DictStore(file_name, multiprocess=True, append_only=True)
+    for number in range(25):
+        with dict_store.transaction():
+            dict_store['counter'] = dict_store['counter'] + 1
+        dict_store[(worker_number, number)] = number
+    dict_store.close()
 
 
 class Test:
@@ -433,6 +497,895 @@ class TestDictStoreValues(unittest.TestCase):
             dict_store['Hi'] = test_value
 
 
+class TestMappingProtocol(unittest.TestCase):
+    """
+    checks if DictStore behaves as a MutableMapping
+    with live views of its keys, values and items
+    """
+
+    def test_views_are_live(self):
+        """
+        checks if the views reflect the writes
+        made after they were created
+        """
+
+        data_file_name = 'tests/test_data/test_views_are_live.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertIsInstance(dict_store, collections.abc.MutableMapping)
+        self.assertEqual(len(dict_store), 0)
+        self.assertEqual(list(dict_store), [])
+
+        keys = dict_store.keys()
+        values = dict_store.values()
+        items = dict_store.items()
+
+        dict_store.update({'a': 1, 'b': None}, c=[3])
+        del dict_store['a']
+
+        self.assertEqual(list(keys), ['b', 'c'])
+        self.assertEqual(list(values), [None, [3]])
+        self.assertEqual(list(items), [('b', None), ('c', [3])])
+        self.assertEqual(len(keys), 2)
+        self.assertEqual(keys & {'c', 'd'}, {'c'})
+        self.assertIn(('b', None), items)
+        self.assertNotIn(('a', None), items)
+        self.assertIn([3], values)
+        self.assertEqual(dict(dict_store), {'b': None, 'c': [3]})
+
+        # datastores are compared by identity, not by contents
+        self.assertNotEqual(dict_store, {'b': None, 'c': [3]})
+        self.assertEqual(dict_store, DictStore(data_file_name))
+        self.assertIn(dict_store, {dict_store})
+
+        # a key whose value is None is in the datastore
+        self.assertIn('b', dict_store)
+        self.assertNotIn('a', dict_store)
+        self.assertNotIn(None, dict_store)
+        self.assertEqual(dict_store.get('a', 'default'), 'default')
+        self.assertIsNone(dict_store.get('b', 'default'))
+        dict_store.close()
+
+    def test_mapping_writes(self):
+        """
+        checks if pop, popitem, setdefault and clear
+        write their changes to the data file
+        """
+
+        data_file_name = 'tests/test_data/test_mapping_writes.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        for append_only in (False, True):
+            dict_store = reopen_data_store(data_file_name,
+                                           append_only=append_only)
+            dict_store.clear()
+            dict_store.update({1: 'a', 2: 'b', 3: 'c'})
+
+            self.assertEqual(dict_store.pop(1), 'a')
+            self.assertEqual(dict_store.pop(1, 'missing'), 'missing')
+            with self.assertRaises(KeyError):
+                dict_store.pop(1)
+
+            self.assertEqual(dict_store.setdefault(2, 'x'), 'b')
+            self.assertEqual(dict_store.setdefault(4, 'd'), 'd')
+            self.assertEqual(dict_store.popitem(), (2, 'b'))
+
+            dict_store = reopen_data_store(data_file_name,
+                                           append_only=append_only)
+            self.assertEqual(dict(dict_store.items()), {3: 'c', 4: 'd'})
+
+            dict_store.clear()
+            with self.assertRaises(KeyError):
+                dict_store.popitem()
+
+            dict_store = reopen_data_store(data_file_name)
+            self.assertEqual(len(dict_store), 0)
+            dict_store.close()
+
+    def test_views_inside_transaction(self):
+        """
+        checks if the thread running a transaction
+        sees its changes through the mapping protocol
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_views_inside_transaction.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name)
+        dict_store.update({1: 'a', 2: 'b'})
+
+        with dict_store.transaction():
+            dict_store[3] = None
+            del dict_store[1]
+
+            self.assertIn(3, dict_store)
+            self.assertNotIn(1, dict_store)
+            self.assertEqual(len(dict_store), 2)
+            self.assertEqual(dict(dict_store.items()), {2: 'b', 3: None})
+
+        self.assertEqual(list(dict_store), [2, 3])
+        dict_store.close()
+
+    def test_lazy_iteration_keeps_cache(self):
+        """
+        checks if iterating over the values of a lazy datastore
+        streams them without evicting the cached values
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_lazy_iteration_keeps_cache.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with reopen_data_store(data_file_name) as dict_store:
+            dict_store.set_many((key, [key]) for key in range(100))
+
+        dict_store = reopen_data_store(data_file_name,
+                                       lazy=True,
+                                       cache_size=2)
+        self.assertEqual(dict_store[7], [7])
+
+        self.assertEqual(sum(value[0] for value in dict_store.values()),
+                         sum(range(100)))
+        self.assertEqual(len(dict_store.in_memory_dictionary.cache), 1)
+        self.assertIn(50, dict_store)
+        self.assertEqual(len(dict_store.items()), 100)
+        dict_store.close()
+
+
+class TestExitHook(unittest.TestCase):
+    """
+    checks if the datastores left open are closed at exit
+    without touching the datastores already closed
+    """
+
+    def test_open_stores_are_tracked_by_identity(self):
+        """
+        checks if closing a datastore forgets only that datastore,
+        even when other datastores hold the same contents
+        """
+
+        data_file_names = [
+            'tests/test_data/test_open_stores_are_tracked_{}.dictstore'
+            .format(number)
+            for number in range(3)
+            ]
+
+        dict_stores = []
+        for data_file_name in data_file_names:
+            clean_temp_files(data_file_name)
+            self.addCleanup(clean_temp_files, data_file_name)
+            dict_store = reopen_data_store(data_file_name)
+            dict_store['a'] = 1
+            dict_stores.append(dict_store)
+
+        dict_stores[0].close()
+        dict_stores[1].close()
+        self.assertNotIn(dict_stores[0], interface._open_stores)
+        self.assertIn(dict_stores[2], interface._open_stores)
+
+        # the exit hook closes only the datastore left open
+        interface._close_open_stores()
+        self.assertNotIn(dict_stores[2], interface._open_stores)
+        self.assertIsNone(DictStore.opened_instance(data_file_names[2]))
+
+        for data_file_name in data_file_names:
+            dict_store = reopen_data_store(data_file_name)
+            self.assertEqual(dict(dict_store), {'a': 1})
+            dict_store.close()
+
+
+class TestExistenceTracking(unittest.TestCase):
+    """
+    checks if keys whose value is None are written
+    and removed as any other key
+    """
+
+    def test_none_values_are_overwritten_in_place(self):
+        """
+        checks if overwriting keys whose value is None rewrites
+        the data file instead of appending duplicate records
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_none_values_are_overwritten_in_place'
+                          '.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name)
+        dict_store.set_many((key, None) for key in range(20))
+        dict_store.flush()
+        live_size = os.path.getsize(data_file_name)
+
+        for _ in range(10):
+            for key in range(20):
+                dict_store[key] = None
+            dict_store.set_many((key, None) for key in range(20))
+
+        dict_store.flush()
+        self.assertEqual(os.path.getsize(data_file_name), live_size)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict(dict_store), dict.fromkeys(range(20)))
+        dict_store.close()
+
+    def test_none_values_are_removed(self):
+        """
+        checks if keys whose value is None are removed
+        by every kind of write
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_none_values_are_removed.dictstore'
+                          )
+
+        options = [
+            {},
+            {'append_only': True},
+            {'write_behind': True},
+            {'lazy': True},
+            ]
+
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        for option in options:
+            clean_temp_files(data_file_name)
+
+            dict_store = reopen_data_store(data_file_name, **option)
+            dict_store.set_many((key, None) for key in range(6))
+            dict_store[6] = 'six'
+
+            del dict_store[0]
+            dict_store.delete_many([1, 2])
+            with dict_store.transaction():
+                del dict_store[3]
+            self.assertIsNone(dict_store.pop(4))
+
+            self.assertEqual(dict(dict_store), {5: None, 6: 'six'}, option)
+
+            dict_store = reopen_data_store(data_file_name, **option)
+            self.assertEqual(dict(dict_store), {5: None, 6: 'six'}, option)
+            dict_store.close()
+
+    def test_file_growth_is_bounded(self):
+        """
+        checks if the data file stays proportional to the live
+        records under an overwrite heavy workload in append only mode
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_file_growth_is_bounded.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name,
+                                       append_only=True,
+                                       compaction_ratio=0.5,
+                                       min_compaction_size=0)
+
+        sizes = []
+        for round_number in range(50):
+            for key in range(20):
+                dict_store[key] = None if key % 2 else round_number
+            del dict_store[round_number % 20]
+            dict_store.flush()
+            sizes.append(os.path.getsize(data_file_name))
+
+        dict_store.compact()
+        live_size = os.path.getsize(data_file_name)
+
+        # compaction keeps at most as many dead bytes as live bytes,
+        # plus the records written since the last compaction
+        self.assertLess(max(sizes), 3 * live_size)
+        dict_store.close()
+
+
+def expected_range(keys, lo=None, hi=None):
+    """returns the keys from lo to hi sorted by going through all of them"""
+    sort_key = sorted_keys.sort_key
+    return sorted(
+        (key for key in keys
+         if (lo is None or sort_key(key) >= sort_key(lo)) and
+         (hi is None or sort_key(key) < sort_key(hi))),
+        key=sort_key
+        )
+
+
+def expected_prefix(keys, prefix):
+    """returns the keys starting with prefix by going through all of them"""
+    if isinstance(prefix, str):
+        matches = [
+            key for key in keys
+            if isinstance(key, str) and key.startswith(prefix)
+            ]
+    else:
+        matches = [
+            key for key in keys
+            if isinstance(key, tuple) and key[:len(prefix)] == prefix
+            ]
+    return sorted(matches, key=sorted_keys.sort_key)
+
+
+class TestSortedKeys(unittest.TestCase):
+    """
+    checks if range and prefix return the keys
+    they match in sorted order
+    """
+
+    def test_keys_of_every_type_are_ordered(self):
+        """checks the order of keys of different types"""
+
+        keys = ['b', (1, 'a'), 2.5, None, 'a', (1,), -3, True,
+                float('nan'), ('a', 1), (1, 2)]
+        self.assertEqual(
+            sorted(keys, key=sorted_keys.sort_key)[:8],
+            [None, -3, True, 2.5, keys[8], 'a', 'b', (1,)]
+            )
+        self.assertEqual(
+            sorted(keys, key=sorted_keys.sort_key)[8:],
+            [(1, 2), (1, 'a'), ('a', 1)]
+            )
+
+    def test_index_is_updated_incrementally(self):
+        """
+        checks the sorted keys against a set of keys through
+        random adds and removes, and batches of every size
+        """
+
+        generator = random.Random(23)
+        # small blocks are split and emptied many times
+        block_size = unittest.mock.patch.object(sorted_keys, '_BLOCK_SIZE', 4)
+        block_size.start()
+        self.addCleanup(block_size.stop)
+        index = sorted_keys.SortedKeys()
+        keys = set()
+        candidates = (
+            [number for number in range(200)] +
+            ['job:' + str(number) for number in range(200)] +
+            [('job', number % 7, number) for number in range(200)]
+            )
+
+        for _ in range(2000):
+            key = generator.choice(candidates)
+            if generator.random() < 0.6:
+                index.add(key)
+                keys.add(key)
+            else:
+                index.discard(key)
+                keys.discard(key)
+
+        batch = generator.sample(candidates, 300)
+        index.update(batch)
+        keys.update(batch)
+        index.update([0.0, 1, 'job:1'])
+
+        self.assertEqual(len(index), len(keys))
+        self.assertEqual(list(index), expected_range(keys))
+        self.assertEqual(list(index.range(50, 'job:150')),
+                         expected_range(keys, 50, 'job:150'))
+        self.assertEqual(list(index.prefix('job:1')),
+                         expected_prefix(keys, 'job:1'))
+        self.assertEqual(list(index.prefix(('job', 3))),
+                         expected_prefix(keys, ('job', 3)))
+        self.assertEqual(list(index.prefix('')),
+                         expected_prefix(keys, ''))
+
+        with self.assertRaises(TypeError):
+            index.prefix(1)
+
+    def test_range_and_prefix(self):
+        """
+        checks range and prefix after every kind of write,
+        with and without the sorted keys
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_range_and_prefix.dictstore'
+                          )
+
+        options = [
+            {'sorted_keys': True},
+            {'sorted_keys': True, 'append_only': True},
+            {'sorted_keys': True, 'write_behind': True},
+            {'sorted_keys': True, 'lazy': True},
+            {'sorted_keys': True, 'thread_safe': True},
+            {},
+            ]
+
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        for option in options:
+            clean_temp_files(data_file_name)
+
+            dict_store = reopen_data_store(data_file_name, **option)
+            dict_store.set_many(
+                ('job:' + str(number), number) for number in range(30))
+            dict_store.set_many(
+                (('job', number % 3, number), None) for number in range(30))
+            dict_store[None] = 'none'
+            dict_store[2.5] = 'float'
+            dict_store['job:3'] = 'overwritten'
+            del dict_store['job:4']
+            dict_store.delete_many(['job:5', ('job', 1, 1)])
+            dict_store.pop('job:6')
+            dict_store.update({'jobs': 1, 'job:': 2})
+
+            for _ in range(2):
+                keys = list(dict_store)
+                self.assertEqual(list(dict_store.range()),
+                                 expected_range(keys), option)
+                self.assertEqual(list(dict_store.range(2, 'job:2')),
+                                 expected_range(keys, 2, 'job:2'), option)
+                self.assertEqual(list(dict_store.range(hi=('job', 1))),
+                                 expected_range(keys, hi=('job', 1)),
+                                 option)
+                self.assertEqual(list(dict_store.prefix('job:1')),
+                                 expected_prefix(keys, 'job:1'), option)
+                self.assertEqual(list(dict_store.prefix(('job', 1))),
+                                 expected_prefix(keys, ('job', 1)), option)
+
+                dict_store = reopen_data_store(data_file_name, **option)
+
+            dict_store.close()
+
+    def test_transaction_changes_are_scanned(self):
+        """
+        checks if range and prefix see the changes of the
+        transaction of the current thread
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_transaction_changes_are_scanned.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, sorted_keys=True)
+        dict_store.set_many(('job:' + str(number), number)
+                            for number in range(5))
+
+        with dict_store.transaction():
+            dict_store['job:25'] = 25
+            del dict_store['job:2']
+            dict_store['job:3'] = None
+            self.assertEqual(list(dict_store.prefix('job:2')), ['job:25'])
+            self.assertEqual(list(dict_store.range('job:1', 'job:4')),
+                             ['job:1', 'job:25', 'job:3'])
+
+        self.assertEqual(list(dict_store.range('job:1', 'job:4')),
+                         ['job:1', 'job:25', 'job:3'])
+        dict_store.close()
+
+    def test_sharded_range_and_prefix(self):
+        """checks if the keys of every shard are merged in order"""
+
+        directory = 'tests/test_data/test_sharded_range_and_prefix'
+        clean_temp_files(directory)
+        self.addCleanup(clean_temp_files, directory)
+
+        with ShardedDictStore(directory, shard_count=4,
+                              sorted_keys=True) as store:
+            store.set_many(('job:' + str(number), number)
+                           for number in range(50))
+            keys = list(store)
+            self.assertEqual(list(store.range('job:10', 'job:20')),
+                             expected_range(keys, 'job:10', 'job:20'))
+            self.assertEqual(list(store.prefix('job:4')),
+                             expected_prefix(keys, 'job:4'))
+
+
+def expected_find(records, **fields):
+    """returns the sorted keys matching the fields by going through them"""
+    return sorted(
+        key for key, value in records.items()
+        if isinstance(value, dict) and all(
+            field in value and value[field] == field_value
+            for field, field_value in fields.items()
+            )
+        )
+
+
+class TestFieldIndexes(unittest.TestCase):
+    """
+    checks if find returns the records whose dict values
+    hold the given fields, with and without indexes
+    """
+
+    def test_find_after_every_kind_of_write(self):
+        """
+        checks if the indexes are kept up to date by every kind
+        of write and built again when the data file is loaded
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_find_after_every_kind_of_write.dictstore'
+                          )
+
+        options = [
+            {},
+            {'append_only': True},
+            {'write_behind': True},
+            {'lazy': True},
+            {'thread_safe': True, 'sorted_keys': True},
+            ]
+        queries = [
+            {'status': 'done'},
+            {'status': 'failed'},
+            {'status': 'failed', 'owner': 'b'},
+            {'owner': 'a'},
+            {'status': None},
+            ]
+
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        for option in options:
+            clean_temp_files(data_file_name)
+
+            dict_store = reopen_data_store(data_file_name, **option)
+            dict_store.set_many(
+                ('job:' + str(number),
+                 {'status': ['done', 'failed', 'queued'][number % 3],
+                  'owner': 'ab'[number % 2]})
+                for number in range(30)
+                )
+            dict_store['plain'] = 'failed'
+            dict_store.create_index('status')
+            self.assertEqual(sorted(dict_store.find(status='done')),
+                             expected_find(dict(dict_store), status='done'))
+
+            dict_store['job:0'] = {'status': 'failed', 'owner': 'b'}
+            dict_store['job:1'] = 'no longer a dict'
+            dict_store['job:2'] = {'owner': 'a'}
+            dict_store['job:30'] = {'status': None}
+            del dict_store['job:3']
+            dict_store.delete_many(['job:4', 'job:5'])
+            dict_store.pop('job:6')
+            dict_store.update({'job:7': {'status': 'done', 'owner': 'b'}})
+            with dict_store.transaction():
+                dict_store['job:8'] = {'status': 'done'}
+                del dict_store['job:9']
+
+            for _ in range(2):
+                records = dict(dict_store)
+                for query in queries:
+                    self.assertEqual(sorted(dict_store.find(**query)),
+                                     expected_find(records, **query),
+                                     (option, query))
+
+                dict_store = reopen_data_store(data_file_name,
+                                               indexes=['status'],
+                                               **option)
+                self.assertEqual(dict_store.indexed_fields(), ['status'])
+
+            dict_store.close()
+
+    def test_unhashable_field_values(self):
+        """checks if fields holding lists and dicts can be found"""
+
+        data_file_name = ('tests/test_data/'
+                          'test_unhashable_field_values.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, indexes=['tags'])
+        dict_store.set_many([
+            ('a', {'tags': ['x', 'y']}),
+            ('b', {'tags': ('x', 'y')}),
+            ('c', {'tags': {'x': 1}}),
+            ('d', {'tags': 1}),
+            ('e', {'tags': True}),
+            ])
+        self.assertEqual(dict_store.find(tags=['x', 'y']), ['a'])
+        self.assertEqual(dict_store.find(tags=('x', 'y')), ['b'])
+        self.assertEqual(dict_store.find(tags={'x': 1}), ['c'])
+        self.assertEqual(sorted(dict_store.find(tags=1)), ['d', 'e'])
+
+        dict_store['a'] = {'tags': ['z']}
+        self.assertEqual(dict_store.find(tags=['x', 'y']), [])
+        self.assertEqual(dict_store.find(tags=['z']), ['a'])
+
+        with self.assertRaises(TypeError):
+            dict_store.find()
+        dict_store.close()
+
+    def test_transaction_changes_are_found(self):
+        """
+        checks if find sees the changes of the
+        transaction of the current thread
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_transaction_changes_are_found.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, indexes=['status'])
+        dict_store.set_many([
+            ('a', {'status': 'done'}),
+            ('b', {'status': 'done'}),
+            ('c', {'status': 'failed'}),
+            ])
+
+        with dict_store.transaction():
+            dict_store['a'] = {'status': 'failed'}
+            del dict_store['b']
+            dict_store['d'] = {'status': 'done'}
+            self.assertEqual(dict_store.find(status='done'), ['d'])
+            self.assertEqual(sorted(dict_store.find(status='failed')),
+                             ['a', 'c'])
+
+        self.assertEqual(sorted(dict_store.find(status='failed')),
+                         ['a', 'c'])
+        dict_store.close()
+
+    def test_sharded_find(self):
+        """checks if the records of every shard are found"""
+
+        directory = 'tests/test_data/test_sharded_find'
+        clean_temp_files(directory)
+        self.addCleanup(clean_temp_files, directory)
+
+        with ShardedDictStore(directory, shard_count=4) as store:
+            store['job:0'] = {'status': 'done'}
+            store.create_index('status')
+            store.set_many(('job:' + str(number), {'status': number % 2})
+                           for number in range(1, 20))
+            self.assertEqual(
+                sorted(store.find(status=0)),
+                expected_find(dict(store.items()), status=0)
+                )
+            self.assertEqual(store.find(status='done'), ['job:0'])
+            for index in range(4):
+                self.assertEqual(store.shard(index).indexed_fields(),
+                                 ['status'])
+
+
+class TestValueValidation(unittest.TestCase):
+    """
+    checks if nested values are validated
+    without recursion
+    """
+
+    def test_nested_values(self):
+        """
+        checks if unsupported values are found
+        anywhere inside a supported container
+        """
+
+        class Name(str):
+            """a subclass of a supported type"""
+
+        supported = [
+            [1, 'a', b'b', 2.5, True, None],
+            (1, [2, {3: {4, 5}}], {'a': (6,)}),
+            {(1, 2): [Name('x'), {'y': None}]},
+            set(),
+            ]
+        for value in supported:
+            self.assertTrue(helpers.is_supported_value_type(value))
+
+        unsupported = [
+            object(),
+            [1, 2, object()],
+            (1, [2, {3: [object()]}]),
+            {1: 2, 3: {4: object()}},
+            {frozenset(): 1},
+            {1, 2, frozenset()},
+            float('nan'),
+            [1.5, float('inf')],
+            {'a': [1, {'b': -float('inf')}]},
+            {float('nan'): 1},
+            ]
+        for value in unsupported:
+            self.assertFalse(helpers.is_supported_value_type(value))
+
+        self.assertFalse(helpers.is_supported_key_type(float('nan')))
+        self.assertFalse(helpers.is_supported_key_type((1, float('inf'))))
+        self.assertTrue(helpers.is_supported_key_type((1, 2.5)))
+        self.assertTrue(helpers.is_supported_key_type(
+            (1, ('a', b'b', None, True), ())))
+        for key in [(1, [2]), (1, (2, {3: 4})), ({5},)]:
+            self.assertFalse(helpers.is_supported_key_type(key))
+
+    def test_unhashable_keys_are_not_written(self):
+        """
+        checks if a tuple key holding a list fails
+        before it is written to the data file
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_unhashable_keys_are_not_written.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, append_only=True)
+        dict_store['a'] = 1
+
+        with self.assertRaises(KeyError):
+            dict_store[(1, [2])] = 5
+        with self.assertRaises(TypeError):
+            dict_store.upsert_record((1, [2]), 5, trusted=True)
+        with self.assertRaises(TypeError):
+            dict_store.set_many([('b', 2), ((1, [2]), 5)], trusted=True)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict(dict_store), {'a': 1})
+
+    def test_deep_and_cyclic_values(self):
+        """
+        checks if values nested up to MAX_DEPTH levels deep are
+        written and read back in both formats, and values nested
+        deeper or containing themselves are not supported
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_deep_and_cyclic_values.dictstore'
+                          )
+
+        deep_value = {'a': 1}
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        for _ in range(helpers.MAX_DEPTH - 1):
+            deep_value = [deep_value, {'a': 1}]
+        self.assertTrue(helpers.is_supported_value_type(deep_value))
+
+        deep_key = ()
+        for _ in range(helpers.MAX_DEPTH - 1):
+            deep_key = (deep_key, 1)
+        self.assertTrue(helpers.is_supported_key_type(deep_key))
+
+        for file_format in ['text', 'binary']:
+            clean_temp_files(data_file_name)
+            dict_store = reopen_data_store(data_file_name,
+                                           file_format=file_format)
+            dict_store['deep'] = deep_value
+            dict_store[deep_key] = 'deep key'
+
+            with self.assertRaises(UnsupportedValueType):
+                dict_store['too deep'] = [deep_value]
+            with self.assertRaises(KeyError):
+                dict_store[(deep_key, 1)] = 'too deep key'
+
+            dict_store = reopen_data_store(data_file_name)
+            self.assertEqual(dict_store['deep'], deep_value, file_format)
+            self.assertEqual(dict_store[deep_key], 'deep key', file_format)
+            self.assertNotIn('too deep', dict_store)
+            dict_store.close()
+
+        # deeper values are rejected without recursion
+        too_deep_value = []
+        for _ in range(100000):
+            too_deep_value = [too_deep_value, {'a': 1}]
+        self.assertFalse(helpers.is_supported_value_type(too_deep_value))
+
+        shared = [1, 2]
+        self.assertTrue(helpers.is_supported_value_type([shared, shared]))
+
+        cyclic = [1, [2]]
+        cyclic[1].append(cyclic)
+        self.assertFalse(helpers.is_supported_value_type(cyclic))
+
+    def test_trusted_writes_are_not_validated(self):
+        """
+        checks if writes made with trusted=True
+        skip the validation of their records
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_trusted_writes_are_not_validated.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name)
+
+        with unittest.mock.patch.object(
+                helpers,
+                'is_supported_value_type',
+                side_effect=helpers.is_supported_value_type
+                ) as is_supported_value_type:
+            dict_store.upsert_record(1, [1, 2], trusted=True)
+            dict_store.set_many({2: {'a': 1}, 3: 'c'}.items(), trusted=True)
+            dict_store.update({4: (4,)}, trusted=True)
+            self.assertFalse(is_supported_value_type.called)
+
+            dict_store[5] = [5]
+            self.assertTrue(is_supported_value_type.called)
+
+        with self.assertRaises(UnsupportedValueType):
+            dict_store.set_many([(6, object())])
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[2], {'a': 1})
+        self.assertEqual(dict_store[4], (4,))
+        dict_store.close()
+
+
+class TestFailedRewrites(unittest.TestCase):
+    """
+    checks if a write whose rewrite of the data file fails
+    leaves the datastore as it was
+    """
+
+    def test_memory_is_rolled_back(self):
+        """
+        checks if memory keeps the values of the data file when
+        a record cannot be encoded or the rewrite fails
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_memory_is_rolled_back.dictstore'
+                          )
+
+        expected = {'a': 1, 'b': {'s': set()}, 'c': [3]}
+
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        for file_format in ['text', 'binary']:
+            clean_temp_files(data_file_name)
+
+            dict_store = reopen_data_store(data_file_name,
+                                           file_format=file_format,
+                                           sorted_keys=True,
+                                           indexes=['s'])
+            dict_store.update(expected)
+            self.assertEqual(dict_store.find(s=set()), ['b'])
+
+            with self.assertRaises(UnsupportedValueType):
+                dict_store['a'] = float('nan')
+
+            # trusted writes reach the serializer, which refuses nan
+            if file_format == 'text':
+                with self.assertRaises(ValueError):
+                    dict_store.upsert_record('a', float('nan'), trusted=True)
+                with self.assertRaises(ValueError):
+                    dict_store.set_many(
+                        [('c', [float('nan')]), ('d', 4)], trusted=True)
+                self.assertFalse(os.path.exists(data_file_name + '.tmp'))
+
+            with unittest.mock.patch.object(
+                    dict_store.file_handler, 'rewrite_to_file',
+                    side_effect=OSError('disk full')):
+                with self.assertRaises(OSError):
+                    del dict_store['a']
+                with self.assertRaises(OSError):
+                    dict_store.delete_many(['b', 'c'])
+                with self.assertRaises(OSError):
+                    dict_store['b'] = 'b'
+
+            self.assertEqual(dict(dict_store), expected, file_format)
+            self.assertEqual(list(dict_store.range()), ['a', 'b', 'c'])
+            self.assertEqual(dict_store.find(s=set()), ['b'])
+
+            dict_store = reopen_data_store(data_file_name)
+            self.assertEqual(dict(dict_store), expected, file_format)
+            dict_store.close()
+
+
 class CheckSingletonBehavior(unittest.TestCase):
     """
     checks if the Singleton behavior of the
@@ -476,6 +1429,2368 @@ class CheckSingletonBehavior(unittest.TestCase):
             False
             )
 
+    def test_singleton_behavior_different_options(self):
+        """
+        opens a data file that is already open with other options
+        and verifies that it raises ValueError
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_singleton_behavior_different_options'
+                          '.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, append_only=True)
+        self.assertIs(DictStore(data_file_name), dict_store)
+        self.assertIs(DictStore(data_file_name, append_only=True),
+                      dict_store)
+        self.assertIs(DictStore(data_file_name, lazy=False), dict_store)
+
+        with self.assertRaises(ValueError):
+            DictStore(data_file_name, append_only=False)
+        with self.assertRaises(ValueError):
+            DictStore(data_file_name, lazy=True)
+        with self.assertRaises(TypeError):
+            DictStore(data_file_name, no_such_option=True)
+
+        dict_store.close()
+        dict_store = DictStore(data_file_name, lazy=True)
+        self.assertTrue(dict_store.lazy)
+        dict_store.close()
+
+
+class TestAppendOnlyMode(unittest.TestCase):
+    """
+    checks if updates and deletes are appended to the
+    data file and replayed correctly in append only mode
+    """
+
+    def test_update_is_appended(self):
+        """
+        checks if overwriting a key appends a record
+        and the last record wins when the file is loaded
+        """
+
+        data_file_name = 'tests/test_data/test_update_is_appended.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, append_only=True)
+        dict_store[1] = 'a'
+        dict_store.flush()
+        size_after_insert = os.path.getsize(data_file_name)
+        dict_store[1] = 'b'
+        dict_store.flush()
+
+        self.assertGreater(os.path.getsize(data_file_name), size_after_insert)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[1], 'b')
+
+    def test_delete_appends_tombstone(self):
+        """
+        checks if deleting a key appends a tombstone
+        and the key is absent when the file is loaded
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_delete_appends_tombstone.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, append_only=True)
+        dict_store[1] = 'a'
+        dict_store[2] = 'b'
+        del dict_store[1]
+        dict_store[1] = 'c'
+        del dict_store[2]
+        dict_store.flush()
+
+        with open(data_file_name, 'r', encoding='utf-8') as data_file:
+            self.assertEqual(
+                data_file.read().count(file_handler.TOMBSTONE),
+                2
+                )
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[1], 'c')
+        self.assertEqual(dict_store[2], None)
+
+
+class TestCompaction(unittest.TestCase):
+    """
+    checks if dead records are removed from
+    the data file by compaction
+    """
+
+    def test_threshold_triggers_compaction(self):
+        """
+        checks if crossing the garbage ratio compacts the data file
+        and the data file size stays bounded
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_threshold_triggers_compaction.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(
+            data_file_name,
+            append_only=True,
+            compaction_ratio=0.5,
+            min_compaction_size=0
+            )
+        dict_store['counter'] = 0
+        dict_store.flush()
+        size_after_insert = os.path.getsize(data_file_name)
+
+        for count in range(1, 100):
+            dict_store['counter'] = count
+        dict_store.flush()
+
+        self.assertLess(dict_store.garbage_ratio(), 0.5)
+        self.assertLess(
+            os.path.getsize(data_file_name),
+            3 * size_after_insert
+            )
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store['counter'], 99)
+
+    def test_reads_wait_for_background_compaction(self):
+        """
+        checks if reads of a lazy datastore see the right values
+        while a background compaction replaces the data file
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_reads_wait_for_background_compaction'
+                          '.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name,
+                                       append_only=True,
+                                       lazy=True,
+                                       cache_size=0,
+                                       background_compaction=True,
+                                       compaction_ratio=0.3,
+                                       min_compaction_size=0)
+        self.assertTrue(dict_store.thread_safe)
+
+        expected = {}
+        for number in range(300):
+            key = number % 20
+            dict_store[key] = 'value ' * number * 20
+            expected[key] = 'value ' * number * 20
+            for read_key in range(0, 20, 3):
+                self.assertEqual(dict_store.get(read_key),
+                                 expected.get(read_key))
+        dict_store.close()
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict(dict_store), expected)
+
+    def test_manual_compaction(self):
+        """
+        checks if compact removes dead records and tombstones
+        """
+
+        data_file_name = 'tests/test_data/test_manual_compaction.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(
+            data_file_name,
+            append_only=True,
+            compaction_ratio=None
+            )
+        dict_store[1] = 'a'
+        dict_store[1] = 'b'
+        dict_store[2] = 'c'
+        del dict_store[2]
+
+        self.assertGreater(dict_store.garbage_ratio(), 0)
+
+        dict_store.compact()
+
+        self.assertEqual(dict_store.garbage_ratio(), 0)
+        self.assertFalse(os.path.exists(data_file_name + '.tmp'))
+        with open(data_file_name, 'r', encoding='utf-8') as data_file:
+            self.assertNotIn(file_handler.TOMBSTONE, data_file.read())
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[1], 'b')
+        self.assertEqual(dict_store[2], None)
+
+
+class TestBufferedWrites(unittest.TestCase):
+    """
+    checks if appends are buffered by the file handler
+    and written on flush and close
+    """
+
+    def test_flush_writes_buffered_appends(self):
+        """
+        checks if buffered appends are written to
+        the data file only when flushed
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_flush_writes_buffered_appends.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name,
+                                       buffer_size=1024,
+                                       durability='none')
+        size_before_insert = os.path.getsize(data_file_name)
+        dict_store[1] = 'a'
+
+        self.assertEqual(os.path.getsize(data_file_name), size_before_insert)
+
+        dict_store.flush()
+
+        self.assertGreater(os.path.getsize(data_file_name), size_before_insert)
+
+    def test_context_manager_closes_data_store(self):
+        """
+        checks if leaving the with block writes the buffered
+        appends and the next DictStore call loads a new instance
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_context_manager_closes_data_store.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with reopen_data_store(data_file_name) as dict_store:
+            dict_store[1] = 'a'
+            dict_store[2] = 'b'
+
+        reopened_dict_store = DictStore(data_file_name)
+        self.assertIsNot(reopened_dict_store, dict_store)
+        self.assertEqual(reopened_dict_store[1], 'a')
+        self.assertEqual(reopened_dict_store[2], 'b')
+
+
+class TestDurabilityModes(unittest.TestCase):
+    """
+    checks if appends are flushed and synced
+    as required by the durability mode
+    """
+
+    def test_invalid_durability_mode(self):
+        """
+        checks if an unknown durability mode raises ValueError
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_invalid_durability_mode.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with self.assertRaises(ValueError):
+            file_handler.FileHandler(data_file_name, durability='always')
+
+    def test_flush_durability(self):
+        """
+        checks if appends reach the data file after every write
+        without calling fsync
+        """
+
+        data_file_name = 'tests/test_data/test_flush_durability.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, durability='flush')
+        size_before_insert = os.path.getsize(data_file_name)
+
+        with unittest.mock.patch('os.fsync') as fsync:
+            dict_store[1] = 'a'
+            fsync.assert_not_called()
+
+        self.assertGreater(os.path.getsize(data_file_name), size_before_insert)
+
+        # flush is the default durability mode
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store.file_handler.durability, 'flush')
+        size_before_insert = os.path.getsize(data_file_name)
+        dict_store[2] = 'b'
+        self.assertGreater(os.path.getsize(data_file_name), size_before_insert)
+        dict_store.close()
+
+    def test_fsync_per_write_durability(self):
+        """
+        checks if every write is synced to the disk
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_fsync_per_write_durability.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(
+            data_file_name,
+            durability='fsync-per-write'
+            )
+
+        with unittest.mock.patch('os.fsync') as fsync:
+            for key in range(3):
+                dict_store[key] = key
+            self.assertEqual(fsync.call_count, 3)
+
+    def test_rewrite_syncs_directory(self):
+        """
+        checks if the directory of the data file is synced after
+        a rewrite replaces the data file in the modes that sync
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_rewrite_syncs_directory.dictstore'
+                          )
+
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        for durability, synced in [('flush', False),
+                                   ('fsync-per-write', True),
+                                   ('group-commit', True)]:
+            clean_temp_files(data_file_name)
+            dict_store = reopen_data_store(data_file_name,
+                                           durability=durability)
+            dict_store['a'] = 1
+
+            with unittest.mock.patch.object(
+                    file_handler, '_sync_directory',
+                    wraps=file_handler._sync_directory) as sync_directory:
+                # overwriting a key rewrites the data file
+                dict_store['a'] = 2
+            if synced:
+                sync_directory.assert_called_once_with(
+                    os.path.dirname(os.path.abspath(data_file_name)))
+            else:
+                sync_directory.assert_not_called()
+            dict_store.close()
+
+    def test_group_commit_durability(self):
+        """
+        checks if writes are synced to the disk in groups
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_group_commit_durability.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(
+            data_file_name,
+            durability='group-commit',
+            group_commit_interval=60,
+            group_commit_size=32
+            )
+
+        with unittest.mock.patch('os.fsync') as fsync:
+            for key in range(10):
+                dict_store[key] = 'value'
+            self.assertGreater(fsync.call_count, 0)
+            self.assertLess(fsync.call_count, 10)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[9], 'value')
+
+
+class TestBatchWrites(unittest.TestCase):
+    """
+    checks if batch writes are validated up front
+    and written with a single append or rewrite
+    """
+
+    def test_update_single_append(self):
+        """
+        checks if inserting a mapping of new keys
+        appends to the data file once
+        """
+
+        data_file_name = 'tests/test_data/test_update_single_append.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name)
+        handler = dict_store.file_handler
+
+        with unittest.mock.patch.object(
+                handler, 'append_to_file',
+                wraps=handler.append_to_file) as append_to_file:
+            dict_store.update({key: str(key) for key in range(100)})
+            self.assertEqual(append_to_file.call_count, 1)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[42], '42')
+        self.assertEqual(dict_store[99], '99')
+
+    def test_set_many_single_rewrite(self):
+        """
+        checks if overwriting many keys rewrites the data file once
+        and the last value of a repeated key wins
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_set_many_single_rewrite.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name)
+        dict_store.set_many((key, key) for key in range(10))
+        handler = dict_store.file_handler
+
+        with unittest.mock.patch.object(
+                handler, 'rewrite_to_file',
+                wraps=handler.rewrite_to_file) as rewrite_to_file:
+            dict_store.set_many([(1, 'a'), (2, 'b'), (1, 'c')])
+            self.assertEqual(rewrite_to_file.call_count, 1)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[1], 'c')
+        self.assertEqual(dict_store[2], 'b')
+        self.assertEqual(dict_store[3], 3)
+
+    def test_set_many_validates_before_writing(self):
+        """
+        checks if an unsupported value in a batch
+        leaves the datastore unchanged
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_set_many_validates_before_writing.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name)
+
+        with self.assertRaises(UnsupportedValueType):
+            dict_store.set_many([(1, 'a'), (2, Test())])
+
+        self.assertEqual(dict_store[1], None)
+
+    def test_delete_many_single_append(self):
+        """
+        checks if deleting many keys in append only mode
+        appends all the tombstones at once
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_delete_many_single_append.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, append_only=True)
+        dict_store.update({key: key for key in range(10)})
+        handler = dict_store.file_handler
+
+        with unittest.mock.patch.object(
+                handler, 'append_to_file',
+                wraps=handler.append_to_file) as append_to_file:
+            dict_store.delete_many([2, 4, 6, 42])
+            self.assertEqual(append_to_file.call_count, 1)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[2], None)
+        self.assertEqual(dict_store[3], 3)
+
+
+class TestTransactions(unittest.TestCase):
+    """
+    checks if the writes made in a transaction
+    are committed or rolled back together
+    """
+
+    def test_transaction_commit(self):
+        """
+        checks if the writes of a transaction are visible
+        inside it and persisted as a single group
+        """
+
+        data_file_name = 'tests/test_data/test_transaction_commit.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, append_only=True)
+        dict_store['a'] = 1
+        dict_store['b'] = 2
+
+        with dict_store.transaction():
+            dict_store['a'] = 10
+            dict_store['c'] = 30
+            del dict_store['b']
+            self.assertEqual(dict_store['a'], 10)
+            self.assertEqual(dict_store['b'], None)
+
+        dict_store.flush()
+        with open(data_file_name, 'r', encoding='utf-8') as data_file:
+            contents = data_file.read()
+        self.assertIn(file_handler.BEGIN_MARKER, contents)
+        self.assertIn(file_handler.COMMIT_MARKER, contents)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store['a'], 10)
+        self.assertEqual(dict_store['b'], None)
+        self.assertEqual(dict_store['c'], 30)
+
+    def test_transaction_rollback(self):
+        """
+        checks if none of the writes of a transaction
+        are applied when it raises an exception
+        """
+
+        data_file_name = 'tests/test_data/test_transaction_rollback.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name)
+        dict_store['a'] = 1
+
+        with self.assertRaises(RuntimeError):
+            with dict_store.transaction():
+                dict_store['a'] = 10
+                dict_store['b'] = 20
+                raise RuntimeError()
+
+        self.assertEqual(dict_store['a'], 1)
+        self.assertEqual(dict_store['b'], None)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store['a'], 1)
+        self.assertEqual(dict_store['b'], None)
+
+    def test_partial_trailing_group_skipped(self):
+        """
+        checks if a group without a commit marker is skipped
+        and dropped from the data file on load
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_partial_trailing_group_skipped.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, append_only=True)
+        dict_store['a'] = 1
+        dict_store.close()
+
+        with open(data_file_name, 'a', encoding='utf-8') as data_file:
+            data_file.write(file_handler.BEGIN_MARKER + '\n')
+            data_file.write("'a'\n2\n'b'\n")
+
+        dict_store = DictStore(data_file_name, append_only=True)
+        self.assertEqual(dict_store['a'], 1)
+        self.assertEqual(dict_store['b'], None)
+
+        dict_store['b'] = 3
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store['a'], 1)
+        self.assertEqual(dict_store['b'], 3)
+
+
+class TestCodecs(unittest.TestCase):
+    """
+    checks if the codecs read back
+    what ast.literal_eval reads
+    """
+
+    def test_fast_literal_codec_matches_literal_eval(self):
+        """
+        checks if the fast paths return the same
+        values as ast.literal_eval
+        """
+
+        codec = FastLiteralCodec()
+        lines = [
+            "'abc'", '"abc"', "''", "'a\\'b'", '"it\'s"', "'a' 'b'",
+            '0', '-12', '12345678901234567890',
+            '1.5', '-0.25', '.5', '1.', '1e+16', '2.5E-05',
+            'None', 'True', 'False',
+            "b'abc'", '(1, 2)', "[1, '2']", "{'a': 1}", '{1, 2}',
+            ]
+
+        for line in lines:
+            decoded = codec.decode(line + '\n')
+            expected = ast.literal_eval(line)
+            self.assertEqual(decoded, expected, line)
+            self.assertIs(type(decoded), type(expected), line)
+
+        # python before 3.9 does not read set() with ast.literal_eval
+        for codec in (LiteralCodec(), FastLiteralCodec()):
+            self.assertEqual(codec.decode('set()\n'), set())
+            self.assertEqual(codec.decode("[set(), {'a': set()}]\n"),
+                             [set(), {'a': set()}])
+            for line in ['set([1])', 'set(x=1)', 'frozenset()', 'print()']:
+                with self.assertRaises(DataStoreFileCorrupted):
+                    codec.decode(line + '\n')
+
+    def test_invalid_literal_raises_file_corrupted(self):
+        """
+        checks if a line that is not a literal
+        raises DataStoreFileCorrupted
+        """
+
+        for codec in (LiteralCodec(), FastLiteralCodec()):
+            with self.assertRaises(DataStoreFileCorrupted):
+                codec.decode('abcd\n')
+
+    def test_custom_codec(self):
+        """
+        checks if the datastore reads and
+        writes through the given codec
+        """
+
+        class CountingCodec(LiteralCodec):
+            """counts the lines decoded by the codec"""
+            decoded_lines = 0
+
+            def decode(self, line):
+                CountingCodec.decoded_lines += 1
+                return super().decode(line)
+
+        data_file_name = 'tests/test_data/test_custom_codec.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name)
+        dict_store.update({1: 'a', 2: 'b'})
+
+        dict_store = reopen_data_store(data_file_name, codec=CountingCodec())
+        self.assertEqual(dict_store[2], 'b')
+        self.assertEqual(CountingCodec.decoded_lines, 4)
+
+
+class TestSerializer(unittest.TestCase):
+    """
+    checks if keys and values are written as
+    literals that read back as the same key or value
+    """
+
+    CHARACTERS = 'ab \'"\\\n\r\t\x00\x85\u2028\u00e9\U0001f600\ud800'
+
+    def assert_same(self, first, second):
+        """checks if two values are equal and of the same types"""
+        self.assertIs(type(first), type(second))
+        if isinstance(first, (list, tuple)):
+            self.assertEqual(len(first), len(second))
+            for first_item, second_item in zip(first, second):
+                self.assert_same(first_item, second_item)
+        elif isinstance(first, dict):
+            self.assertEqual(list(first), list(second))
+            for key in first:
+                self.assert_same(first[key], second[key])
+        else:
+            self.assertEqual(first, second)
+
+    def random_key(self, generator, depth=0):
+        """returns a random key"""
+        choice = generator.randrange(5 if depth < 3 else 4)
+        if choice == 0:
+            return ''.join(generator.choice(self.CHARACTERS)
+                           for _ in range(generator.randrange(8)))
+        if choice == 1:
+            return generator.randint(-2 ** 70, 2 ** 70)
+        if choice == 2:
+            return generator.choice(
+                [generator.uniform(-1e6, 1e6), 0.0, -0.0, 1e300,
+                 float('inf'), float('-inf')])
+        if choice == 3:
+            return generator.choice([True, False, None])
+        return tuple(self.random_key(generator, depth + 1)
+                     for _ in range(generator.randrange(4)))
+
+    def random_value(self, generator, depth=0):
+        """returns a random value"""
+        choice = generator.randrange(7 if depth < 4 else 3)
+        if choice == 0:
+            return self.random_key(generator, depth)
+        if choice == 1:
+            return bytes(generator.randrange(256)
+                         for _ in range(generator.randrange(6)))
+        if choice == 2:
+            return generator.choice(['', 'x' * 100, 'it\'s "quoted"'])
+        if choice == 3:
+            return [self.random_value(generator, depth + 1)
+                    for _ in range(generator.randrange(4))]
+        if choice == 4:
+            return tuple(self.random_value(generator, depth + 1)
+                         for _ in range(generator.randrange(4)))
+        if choice == 5:
+            return {self.random_key(generator, depth + 1):
+                    self.random_value(generator, depth + 1)
+                    for _ in range(generator.randrange(4))}
+        return {self.random_key(generator, 3)
+                for _ in range(generator.randrange(4))}
+
+    def test_random_values_round_trip(self):
+        """
+        checks if random keys and values read back
+        from their literal as the same key or value
+        """
+
+        generator = random.Random(20210501)
+
+        for _ in range(2000):
+            value = self.random_value(generator)
+            literal = serializer.serialize(value)
+            self.assertNotIn('\n', literal)
+            self.assert_same(literal_eval(literal), value)
+            self.assert_same(FastLiteralCodec().decode(literal + '\n'), value)
+
+    def test_special_values(self):
+        """
+        checks the literals of strings with quotes and newlines,
+        of floats that are not finite and of subclasses
+        """
+
+        class Number(int):
+            """an int with its own repr"""
+
+            def __repr__(self):
+                return 'Number()'
+
+        self.assertEqual(serializer.serialize('it\'s'), '"it\'s"')
+        self.assertEqual(serializer.serialize('a\nb'), "'a\\nb'")
+        self.assertEqual(serializer.serialize(float('inf')), '1e999')
+        self.assertEqual(serializer.serialize([float('-inf')]), '[-1e999]')
+        self.assertEqual(serializer.serialize(Number(5)), '5')
+        self.assertEqual(serializer.serialize({Number(1): (1,)}), '{1: (1,)}')
+        self.assertEqual(serializer.serialize(set()), 'set()')
+
+        with self.assertRaises(ValueError):
+            serializer.serialize([float('nan')])
+        with self.assertRaises(TypeError):
+            serializer.serialize(object())
+
+    def test_serialization_cache(self):
+        """
+        checks if the literals of repeated strings are cached
+        and tuples equal to a cached tuple are not confused with it
+        """
+
+        cached_serializer = serializer.Serializer(cache_size=2)
+        self.assertEqual(cached_serializer.serialize(('a', 'b')),
+                         "('a', 'b')")
+        self.assertEqual(cached_serializer.serialize((1,)), '(1,)')
+        self.assertEqual(cached_serializer.serialize((True,)), '(True,)')
+        self.assertEqual(cached_serializer.serialize((1.0,)), '(1.0,)')
+
+        with unittest.mock.patch('builtins.repr', side_effect=repr) as mock:
+            cached_serializer.serialize('abc')
+            cached_serializer.serialize('abc')
+            self.assertEqual(mock.call_count, 1)
+
+            # the full cache is emptied
+            cached_serializer.serialize('def')
+            cached_serializer.serialize('ghi')
+            cached_serializer.serialize('abc')
+            self.assertEqual(mock.call_count, 4)
+
+    def test_large_literals_are_not_cached(self):
+        """
+        checks if the literals longer than max_literal_size are not
+        cached, so the memory of large values written is released
+        """
+
+        cached_serializer = serializer.Serializer(max_literal_size=8)
+        with unittest.mock.patch('builtins.repr', side_effect=repr) as mock:
+            cached_serializer.serialize('a' * 9)
+            cached_serializer.serialize('a' * 9)
+            cached_serializer.serialize(('abc', 'def'))
+            cached_serializer.serialize(('abc', 'def'))
+            self.assertEqual(mock.call_count, 4)
+
+        data_file_name = ('tests/test_data/'
+                          'test_large_literals_are_not_cached.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name, max_memory=100000)
+        tracemalloc.start()
+        for key in range(100):
+            dict_store[key] = str(key) * 100000
+        kept_size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        dict_store.close()
+
+        # a hundred values of 100 kB to 500 kB were written
+        self.assertLess(kept_size, 5000000)
+
+    def test_strings_with_newlines_are_stored(self):
+        """
+        checks if keys and values with quotes, backslashes
+        and newlines are read back from a text data file
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_strings_with_newlines_are_stored.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        records = {
+            'line\nbreak': 'it\'s a "value"\n',
+            ('back\\slash', "'"): ['\r\n', b'\n'],
+            2.5e300: {'nested\n': "'\\'"},
+            }
+
+        dict_store = reopen_data_store(data_file_name)
+        dict_store.update(records)
+
+        dict_store = reopen_data_store(data_file_name)
+        for key, value in records.items():
+            self.assertEqual(dict_store[key], value)
+        dict_store.close()
+
+
+class TestBinaryFormat(unittest.TestCase):
+    """
+    checks if the binary format stores every supported
+    value type and detects corrupted records
+    """
+
+    def test_binary_round_trip(self):
+        """
+        checks if keys and values are read back
+        exactly from a binary data file
+        """
+
+        data_file_name = 'tests/test_data/test_binary_round_trip.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        records = {
+            'quote \' and newline \n': 'value with \'\"\\\n',
+            1: 2 ** 100,
+            -1.5: -(2 ** 63),
+            (1, 'a', (2.5, None)): [True, False, None, b'\x00\n'],
+            'nested': {'a': [1, {2, 3}], (1, 2): {'b': ()}},
+            'empty': '',
+            }
+
+        dict_store = reopen_data_store(
+            data_file_name,
+            file_format='binary',
+            append_only=True
+            )
+        dict_store.update(records)
+        dict_store['deleted'] = 1
+        del dict_store['deleted']
+        dict_store.close()
+
+        with open(data_file_name, 'rb') as data_file:
+            self.assertTrue(data_file.read().startswith(formats.BINARY_MAGIC))
+
+        dict_store = DictStore(data_file_name)
+        for key, value in records.items():
+            self.assertEqual(dict_store[key], value)
+        self.assertEqual(dict_store['deleted'], None)
+
+    def test_binary_crc_mismatch(self):
+        """
+        checks if a record whose contents do not
+        match its CRC raises DataStoreFileCorrupted
+        """
+
+        data_file_name = 'tests/test_data/test_binary_crc_mismatch.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with reopen_data_store(data_file_name, file_format='binary') as store:
+            store['key'] = 'value'
+
+        with open(data_file_name, 'r+b') as data_file:
+            contents = data_file.read()
+            data_file.seek(contents.index(b'value'))
+            data_file.write(b'VALUE')
+
+        with self.assertRaises(DataStoreFileCorrupted):
+            DictStore(data_file_name)
+
+    def test_convert_text_to_binary(self):
+        """
+        checks if a text data file is converted to
+        a binary data file with the same records
+        """
+
+        source_file_name = ('tests/test_data/'
+                            'test_convert_text_to_binary.dictstore'
+                            )
+        target_file_name = ('tests/test_data/'
+                            'test_convert_text_to_binary_target.dictstore'
+                            )
+
+        clean_temp_files(source_file_name)
+        self.addCleanup(clean_temp_files, source_file_name)
+        clean_temp_files(target_file_name)
+        self.addCleanup(clean_temp_files, target_file_name)
+
+        with reopen_data_store(source_file_name) as dict_store:
+            dict_store.update({1: 'a', 'b': [1, 2], (1, 2): None})
+
+        convert_file(source_file_name, target_file_name, 'binary')
+
+        with open(target_file_name, 'rb') as data_file:
+            self.assertTrue(data_file.read().startswith(formats.BINARY_MAGIC))
+
+        dict_store = reopen_data_store(target_file_name)
+        self.assertEqual(dict_store[1], 'a')
+        self.assertEqual(dict_store['b'], [1, 2])
+        dict_store.close()
+
+        convert_file(target_file_name, file_format='text')
+
+        with open(target_file_name, 'r', encoding='utf-8') as data_file:
+            self.assertEqual(data_file.readline(),
+                             '// Python Dictstore File\n')
+
+        dict_store = reopen_data_store(target_file_name)
+        self.assertEqual(dict_store['b'], [1, 2])
+
+        # the open datastore would keep the records it was opened with
+        with self.assertRaises(ValueError):
+            convert_file(source_file_name, target_file_name, 'binary')
+        self.assertEqual(dict_store['b'], [1, 2])
+        dict_store.close()
+
+        convert_file(source_file_name, target_file_name, 'binary')
+        dict_store = reopen_data_store(target_file_name)
+        self.assertEqual(dict_store[(1, 2)], None)
+        self.assertIn((1, 2), dict_store)
+
+        # converting in place would close the open datastore
+        for target in (None, target_file_name):
+            with self.assertRaises(ValueError):
+                convert_file(target_file_name, target, 'text')
+        self.assertIs(DictStore.opened_instance(target_file_name), dict_store)
+        dict_store['c'] = 3
+        dict_store.close()
+
+        convert_file(target_file_name, file_format='text')
+        dict_store = reopen_data_store(target_file_name)
+        self.assertEqual(dict_store['c'], 3)
+
+
+class TestStreamingLoad(unittest.TestCase):
+    """
+    checks if the data file is streamed
+    instead of being read into memory
+    """
+
+    def test_load_does_not_hold_file_contents(self):
+        """
+        checks if loading a data file allocates little
+        more than the in memory dictionary it builds
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_load_does_not_hold_file_contents.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with reopen_data_store(data_file_name) as dict_store:
+            dict_store.set_many(
+                (key, 'value ' * 20) for key in range(20000)
+                )
+
+        file_size = os.path.getsize(data_file_name)
+
+        tracemalloc.start()
+        dict_store = DictStore(data_file_name)
+        loaded_size, peak_size = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        self.assertEqual(dict_store[19999], 'value ' * 20)
+        self.assertLess(peak_size - loaded_size, file_size / 4)
+
+    def test_empty_data_file(self):
+        """
+        checks if an empty data file is loaded as an empty datastore
+        """
+
+        data_file_name = 'tests/test_data/test_empty_data_file.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+        open(data_file_name, 'wb').close()
+
+        dict_store = reopen_data_store(data_file_name)
+        dict_store[1] = 'a'
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[1], 'a')
+
+
+class TestParallelLoad(unittest.TestCase):
+    """
+    checks if data files parsed by several
+    processes load the same records
+    """
+
+    def setUp(self):
+        # small data files are parsed in parallel as well
+        patcher = unittest.mock.patch.object(
+            parallel, 'PARALLEL_LOAD_MIN_SIZE', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def write_history(data_file_name, file_format):
+        """
+        writes overwrites, tombstones and transactions
+        to an append only data file
+        """
+        clean_temp_files(data_file_name)
+        with reopen_data_store(data_file_name,
+                               append_only=True,
+                               compaction_ratio=None,
+                               file_format=file_format) as dict_store:
+            for round_number in range(3):
+                dict_store.set_many(
+                    (key, (round_number, 'value ' * (key % 7)))
+                    for key in range(300)
+                    )
+                dict_store.delete_many(range(round_number, 300, 11))
+                with dict_store.transaction():
+                    for key in range(round_number, 300, 5):
+                        dict_store[key] = {'round': round_number}
+                    dict_store['round'] = round_number
+
+    def test_parallel_load_matches_sequential_load(self):
+        """
+        checks if the records merged from the workers
+        give the same datastore as a sequential load
+        """
+
+        for file_format in ('text', 'binary'):
+            data_file_name = ('tests/test_data/'
+                              'test_parallel_load_{}.dictstore'.format(
+                                  file_format)
+                              )
+            self.write_history(data_file_name, file_format)
+            self.addCleanup(clean_temp_files, data_file_name)
+
+            dict_store = reopen_data_store(data_file_name)
+            expected = {key: dict_store[key] for key in dict_store.keys()
+                        if key is not None}
+
+            for lazy in (False, True):
+                with unittest.mock.patch.object(
+                        parallel,
+                        'iter_records',
+                        side_effect=parallel.iter_records
+                        ) as iter_records:
+                    dict_store = reopen_data_store(data_file_name,
+                                                   load_workers=3,
+                                                   lazy=lazy)
+
+                self.assertTrue(iter_records.called)
+                self.assertEqual(
+                    {key: dict_store[key] for key in dict_store.keys()
+                     if key is not None},
+                    expected
+                    )
+                self.assertEqual(dict_store['round'], 2)
+            dict_store.close()
+
+    def test_split_at_record_boundaries(self):
+        """
+        checks if the data file is split at the start of records
+        """
+
+        for file_format in ('text', 'binary'):
+            data_file_name = ('tests/test_data/'
+                              'test_split_at_record_boundaries_{}'
+                              '.dictstore'.format(file_format)
+                              )
+            self.write_history(data_file_name, file_format)
+            self.addCleanup(clean_temp_files, data_file_name)
+            DictStore(data_file_name).close()
+
+            data_format = file_handler.FileHandler(data_file_name).format
+            with open(data_file_name, 'rb') as data_file:
+                record_offsets = {
+                    record[1] for record in data_format.iter_records(data_file)
+                    }
+                data_file.seek(0)
+                start = data_format.first_record_offset(data_file)
+                end = os.path.getsize(data_file_name)
+
+                # blocks smaller than the records cross many of them
+                with unittest.mock.patch.object(
+                        formats, 'SPLIT_BLOCK_SIZE', 7):
+                    boundaries = data_format.split(data_file, start, end, 16)
+
+            self.assertEqual(boundaries[0], start)
+            self.assertGreater(len(boundaries), 8)
+            self.assertEqual(boundaries, sorted(set(boundaries)))
+            self.assertTrue(set(boundaries) <= record_offsets)
+
+    def test_interrupted_group_is_skipped(self):
+        """
+        checks if a group without a commit marker
+        at the end of the data file is skipped
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_parallel_interrupted_group.dictstore'
+                          )
+        self.write_history(data_file_name, 'text')
+        self.addCleanup(clean_temp_files, data_file_name)
+        DictStore(data_file_name).close()
+
+        with open(data_file_name, 'ab') as data_file:
+            data_file.write(b'// begin\n"round"\n99\n1000\n"unfinished')
+
+        dict_store = DictStore(data_file_name,
+                               mode='r',
+                               load_workers=2)
+        self.assertEqual(dict_store['round'], 2)
+        self.assertNotIn(1000, dict_store.keys())
+        dict_store.close()
+
+    def test_small_data_file_is_parsed_in_process(self):
+        """
+        checks if data files below the minimum size
+        are not sent to the workers
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_small_data_file_is_parsed_in_process'
+                          '.dictstore'
+                          )
+        self.write_history(data_file_name, 'text')
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with unittest.mock.patch.object(
+                parallel, 'PARALLEL_LOAD_MIN_SIZE', 1024 * 1024), \
+                unittest.mock.patch.object(
+                    parallel, 'iter_records') as iter_records:
+            dict_store = reopen_data_store(data_file_name, load_workers=4)
+
+        self.assertFalse(iter_records.called)
+        self.assertEqual(dict_store['round'], 2)
+        dict_store.close()
+
+
+class TestLazyMode(unittest.TestCase):
+    """
+    checks if values are read from the data file on demand
+    """
+
+    def test_lazy_load_reads_values_on_demand(self):
+        """
+        checks if opening a datastore in lazy mode decodes no values
+        and a value is decoded the first time it is read
+        """
+
+        for file_format in ('text', 'binary'):
+            data_file_name = ('tests/test_data/'
+                              'test_lazy_load_reads_values_on_demand_'
+                              + file_format + '.dictstore'
+                              )
+
+            clean_temp_files(data_file_name)
+            self.addCleanup(clean_temp_files, data_file_name)
+
+            with reopen_data_store(data_file_name,
+                                   file_format=file_format) as dict_store:
+                dict_store.set_many((key, [key] * 3) for key in range(100))
+
+            format_class = formats.FORMATS[file_format]
+
+            with unittest.mock.patch.object(
+                    format_class,
+                    'decode_record_value',
+                    side_effect=format_class.decode_record_value,
+                    autospec=True
+                    ) as decode_record_value:
+                dict_store = DictStore(data_file_name, lazy=True)
+                self.assertEqual(decode_record_value.call_count, 0)
+                self.assertEqual(len(dict_store), 100)
+                self.assertEqual(dict_store[42], [42] * 3)
+                self.assertEqual(dict_store[42], [42] * 3)
+                self.assertEqual(decode_record_value.call_count, 1)
+
+            self.assertIsNone(dict_store[100])
+            dict_store.close()
+
+    def test_lazy_writes(self):
+        """
+        checks if writes made in lazy mode are visible
+        and persisted in both the append only and rewrite modes
+        """
+
+        for append_only in (False, True):
+            data_file_name = ('tests/test_data/'
+                              'test_lazy_writes_'
+                              + str(append_only) + '.dictstore'
+                              )
+
+            clean_temp_files(data_file_name)
+            self.addCleanup(clean_temp_files, data_file_name)
+
+            dict_store = reopen_data_store(data_file_name,
+                                           lazy=True,
+                                           append_only=append_only)
+            dict_store.set_many((key, str(key)) for key in range(10))
+            dict_store[3] = 'three'
+            del dict_store[4]
+            with dict_store.transaction():
+                dict_store[5] = 'five'
+                del dict_store[6]
+
+            expected = {key: str(key) for key in range(10)}
+            expected.update({3: 'three', 5: 'five'})
+            del expected[4]
+            del expected[6]
+
+            self.assertEqual(dict(zip(dict_store.keys(),
+                                      dict_store.values())), expected)
+
+            dict_store.compact()
+            self.assertEqual(dict_store[3], 'three')
+
+            dict_store = reopen_data_store(data_file_name, lazy=True)
+            self.assertEqual(dict(zip(dict_store.keys(),
+                                      dict_store.values())), expected)
+
+    def test_lazy_cache_is_bounded(self):
+        """
+        checks if the values read in lazy mode are cached
+        up to the given cache size
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_lazy_cache_is_bounded.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with reopen_data_store(data_file_name) as dict_store:
+            dict_store.set_many((key, key * 2) for key in range(100))
+
+        dict_store = reopen_data_store(data_file_name,
+                                       lazy=True,
+                                       cache_size=10)
+        for key in range(100):
+            self.assertEqual(dict_store[key], key * 2)
+
+        cache = dict_store.in_memory_dictionary.cache
+        self.assertEqual(len(cache), 10)
+        self.assertEqual(cache.get(99), 198)
+        self.assertIs(cache.get(0), MISSING)
+
+
+class TestBoundedMemory(unittest.TestCase):
+    """
+    checks if max_items and max_memory bound the values kept
+    in memory and the cache counters
+    """
+
+    def test_max_items_evicts_least_recently_used(self):
+        """
+        checks if the least recently used values are evicted
+        once max_items values are cached
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_max_items_evicts_least_recently_used'
+                          '.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with reopen_data_store(data_file_name) as dict_store:
+            dict_store.set_many((key, key * 2) for key in range(100))
+            self.assertIsNone(dict_store.cache_info())
+
+        dict_store = reopen_data_store(data_file_name, max_items=10)
+        self.assertTrue(dict_store.lazy)
+        for key in range(100):
+            self.assertEqual(dict_store[key], key * 2)
+        self.assertEqual(dict_store.cache_info(),
+                         (0, 100, 90, 10, dict_store.cache_info().bytes))
+
+        # the most recently used value stays cached
+        self.assertEqual(dict_store[90], 180)
+        self.assertEqual(dict_store[0], 0)
+        self.assertEqual(dict_store[90], 180)
+        self.assertEqual(dict_store[91], 182)
+        info = dict_store.cache_info()
+        self.assertEqual((info.hits, info.misses, info.evictions),
+                         (2, 102, 92))
+
+        dict_store[100] = 200
+        dict_store[0] = 'zero'
+        self.assertEqual(dict_store.cache_info().items, 10)
+
+        dict_store = reopen_data_store(data_file_name, max_items=10)
+        expected = {key: key * 2 for key in range(101)}
+        expected[0] = 'zero'
+        self.assertEqual(dict(dict_store.items()), expected)
+        dict_store.close()
+
+    def test_max_memory_bounds_cached_bytes(self):
+        """
+        checks if the records of the cached values never take
+        more than max_memory bytes and larger values are not cached
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_max_memory_bounds_cached_bytes.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        values = {key: 'x' * (key * 7) for key in range(60)}
+        values[59] = 'x' * 2000
+
+        for file_format in ['text', 'binary']:
+            clean_temp_files(data_file_name)
+            with reopen_data_store(data_file_name,
+                                   file_format=file_format) as dict_store:
+                dict_store.update(values)
+
+            dict_store = reopen_data_store(data_file_name, max_memory=1000)
+            generator = random.Random(25)
+            for _ in range(300):
+                key = generator.randrange(60)
+                self.assertEqual(dict_store[key], values[key])
+                self.assertLessEqual(dict_store.cache_info().bytes, 1000)
+
+            info = dict_store.cache_info()
+            self.assertGreater(info.items, 1)
+            self.assertGreater(info.evictions, 0)
+            self.assertEqual(info.hits + info.misses, 300)
+
+            # a value larger than the cache is read every time
+            misses = info.misses
+            self.assertEqual(dict_store[59], values[59])
+            self.assertEqual(dict_store[59], values[59])
+            self.assertEqual(dict_store.cache_info().misses, misses + 2)
+            dict_store.close()
+
+    def test_iteration_is_not_counted(self):
+        """
+        checks if going through the items neither counts
+        nor evicts the cached values
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_iteration_is_not_counted.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with reopen_data_store(data_file_name) as dict_store:
+            dict_store.set_many((key, str(key)) for key in range(50))
+
+        dict_store = reopen_data_store(data_file_name, max_items=5)
+        for key in range(5):
+            self.assertEqual(dict_store[key], str(key))
+        info = dict_store.cache_info()
+
+        self.assertEqual(dict(dict_store.items()),
+                         {key: str(key) for key in range(50)})
+        self.assertEqual(dict_store.cache_info(), info)
+        dict_store.close()
+
+
+class TestMemoryMappedReads(unittest.TestCase):
+    """
+    checks the read only mode and the memory mapped read path
+    """
+
+    def test_read_only_mode(self):
+        """
+        checks if a datastore opened in read only mode
+        can be read and rejects every write
+        """
+
+        data_file_name = 'tests/test_data/test_read_only_mode.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with self.assertRaises(FileNotFoundError):
+            reopen_data_store(data_file_name, mode='r')
+
+        with reopen_data_store(data_file_name) as dict_store:
+            dict_store['a'] = 1
+
+        data_file_size = os.path.getsize(data_file_name)
+
+        dict_store = DictStore(data_file_name, mode='r')
+        self.assertEqual(dict_store['a'], 1)
+
+        with self.assertRaises(ReadOnlyDataStore):
+            dict_store['b'] = 2
+        with self.assertRaises(ReadOnlyDataStore):
+            del dict_store['a']
+        with self.assertRaises(ReadOnlyDataStore):
+            dict_store.update({'b': 2})
+        with self.assertRaises(ReadOnlyDataStore):
+            dict_store.delete_many(['a'])
+        with self.assertRaises(ReadOnlyDataStore):
+            with dict_store.transaction():
+                pass
+        with self.assertRaises(ReadOnlyDataStore):
+            dict_store.compact()
+
+        dict_store.close()
+        self.assertEqual(os.path.getsize(data_file_name), data_file_size)
+
+    def test_memory_mapped_reads(self):
+        """
+        checks if values are decoded from the memory mapping
+        without reading the data file through a file handle
+        """
+
+        for file_format in ('text', 'binary'):
+            data_file_name = ('tests/test_data/'
+                              'test_memory_mapped_reads_'
+                              + file_format + '.dictstore'
+                              )
+
+            clean_temp_files(data_file_name)
+            self.addCleanup(clean_temp_files, data_file_name)
+
+            with reopen_data_store(data_file_name,
+                                   file_format=file_format) as dict_store:
+                dict_store.set_many((key, {'id': key}) for key in range(100))
+                dict_store['text'] = 'value'
+
+            dict_store = DictStore(data_file_name, mode='r', mmap=True)
+            with unittest.mock.patch('builtins.open') as mocked_open:
+                self.assertEqual(dict_store[7], {'id': 7})
+                self.assertEqual(dict_store[99], {'id': 99})
+                self.assertIsNone(dict_store[100])
+            mocked_open.assert_not_called()
+
+            self.assertEqual(len(dict_store), 101)
+            dict_store.close()
+
+    def test_memory_mapped_writes(self):
+        """
+        checks if values written after the data file was
+        mapped are read back from the new mapping
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_memory_mapped_writes.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name,
+                                       mmap=True,
+                                       append_only=True,
+                                       cache_size=0)
+        dict_store['a'] = 'first'
+        self.assertEqual(dict_store['a'], 'first')
+        dict_store['a'] = 'second'
+        dict_store['b'] = 'third'
+        self.assertEqual(dict_store['a'], 'second')
+
+        dict_store.compact()
+        self.assertEqual(dict_store['b'], 'third')
+
+        dict_store = reopen_data_store(data_file_name, mmap=True)
+        self.assertEqual(dict_store['a'], 'second')
+
+
+class TestSnapshots(unittest.TestCase):
+    """
+    checks if the data file is loaded from its snapshot
+    """
+
+    def test_snapshot_replays_tail(self):
+        """
+        checks if only the records appended after
+        the snapshot are replayed when the data file is loaded
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_snapshot_replays_tail.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+        clean_temp_files(data_file_name + '.snapshot')
+        self.addCleanup(clean_temp_files, data_file_name + '.snapshot')
+
+        with reopen_data_store(data_file_name,
+                               append_only=True,
+                               snapshot=True) as dict_store:
+            dict_store.set_many((key, str(key)) for key in range(100))
+            del dict_store[0]
+
+        self.assertTrue(os.path.exists(data_file_name + '.snapshot'))
+        snapshot_position = os.path.getsize(data_file_name)
+
+        # appended without updating the snapshot
+        with DictStore(data_file_name, append_only=True) as dict_store:
+            dict_store[1] = 'one'
+            del dict_store[2]
+            dict_store[100] = '100'
+
+        expected = {key: str(key) for key in range(3, 101)}
+        expected[1] = 'one'
+
+        for lazy in (False, True):
+            with unittest.mock.patch.object(
+                    file_handler.FileHandler,
+                    'read_records',
+                    side_effect=file_handler.FileHandler.read_records,
+                    autospec=True
+                    ) as read_records:
+                dict_store = DictStore(data_file_name,
+                                       snapshot=True,
+                                       lazy=lazy)
+
+            self.assertEqual(read_records.call_args[0][1], snapshot_position)
+            self.assertEqual(
+                {key: dict_store[key] for key in dict_store.keys()
+                 if key is not None},
+                expected
+                )
+
+            # closing the datastore updates the snapshot
+            dict_store.close()
+            snapshot_position = os.path.getsize(data_file_name)
+
+    def test_corrupted_tail_is_not_checkpointed(self):
+        """
+        checks if a datastore whose data file fails to load is
+        not closed at exit, so no snapshot covers the records
+        it could not read and the next load fails again
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_corrupted_tail_is_not_checkpointed.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with reopen_data_store(data_file_name,
+                               file_format='binary',
+                               snapshot=True) as dict_store:
+            dict_store['key'] = 'value'
+
+        with DictStore(data_file_name) as dict_store:
+            dict_store['tail'] = 'tail value'
+
+        with open(data_file_name, 'r+b') as data_file:
+            contents = data_file.read()
+            data_file.seek(contents.index(b'tail value'))
+            data_file.write(b'TAIL VALUE')
+
+        with open(data_file_name + '.snapshot', 'rb') as snapshot_file:
+            snapshot = snapshot_file.read()
+
+        with self.assertRaises(DataStoreFileCorrupted):
+            DictStore(data_file_name, snapshot=True)
+
+        self.assertFalse(any(
+            dict_store.datastore_location.endswith(
+                'test_corrupted_tail_is_not_checkpointed.dictstore')
+            for dict_store in interface._open_stores
+            ))
+        interface._close_open_stores()
+
+        with open(data_file_name + '.snapshot', 'rb') as snapshot_file:
+            self.assertEqual(snapshot_file.read(), snapshot)
+        with self.assertRaises(DataStoreFileCorrupted):
+            DictStore(data_file_name, snapshot=True)
+
+    def test_snapshot_invalidated_by_rewrite(self):
+        """
+        checks if a snapshot that does not match the data file
+        after it was rewritten is ignored
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_snapshot_invalidated_by_rewrite.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+        clean_temp_files(data_file_name + '.snapshot')
+        self.addCleanup(clean_temp_files, data_file_name + '.snapshot')
+
+        with reopen_data_store(data_file_name, snapshot=True) as dict_store:
+            dict_store.set_many((key, key) for key in range(10))
+
+        with DictStore(data_file_name) as dict_store:
+            dict_store[5] = 'five'
+
+        with unittest.mock.patch.object(
+                file_handler.FileHandler,
+                'read_records',
+                side_effect=file_handler.FileHandler.read_records,
+                autospec=True
+                ) as read_records:
+            dict_store = DictStore(data_file_name, snapshot=True)
+
+        self.assertIsNone(read_records.call_args[0][1])
+        self.assertEqual(dict_store[5], 'five')
+        self.assertEqual(dict_store[9], 9)
+        dict_store.close()
+
+
+class TestThreadSafety(unittest.TestCase):
+    """
+    checks if a datastore shared by many threads
+    stays consistent with its data file
+    """
+
+    def test_read_write_lock(self):
+        """
+        checks if readers share the lock and
+        a writer holds it on its own
+        """
+
+        lock = ReadWriteLock()
+        readers_inside = threading.Barrier(3, timeout=5)
+
+        def read():
+            with lock.read():
+                readers_inside.wait()
+
+        readers = [threading.Thread(target=read) for _ in range(2)]
+        for reader in readers:
+            reader.start()
+
+        # all the readers hold the lock at the same time
+        readers_inside.wait()
+        for reader in readers:
+            reader.join()
+
+        writer_inside = threading.Event()
+        release_writer = threading.Event()
+        reads = []
+
+        def write():
+            with lock.write():
+                # the writer can read and write again
+                with lock.read(), lock.write():
+                    writer_inside.set()
+                    release_writer.wait(5)
+
+        def read_after_write():
+            with lock.read():
+                reads.append(release_writer.is_set())
+
+        writer = threading.Thread(target=write)
+        writer.start()
+        writer_inside.wait(5)
+
+        reader = threading.Thread(target=read_after_write)
+        reader.start()
+        reader.join(0.1)
+        self.assertTrue(reader.is_alive())
+
+        release_writer.set()
+        writer.join()
+        reader.join()
+        self.assertEqual(reads, [True])
+
+        with lock.read():
+            with self.assertRaises(RuntimeError):
+                lock.acquire_write()
+
+    def test_concurrent_reads_and_writes(self):
+        """
+        checks if the in memory state matches the state replayed
+        from the data file after many threads read and write it
+        """
+
+        for append_only in (True, False):
+            data_file_name = ('tests/test_data/'
+                              'test_concurrent_reads_and_writes_'
+                              + str(append_only) + '.dictstore'
+                              )
+
+            clean_temp_files(data_file_name)
+            self.addCleanup(clean_temp_files, data_file_name)
+
+            dict_store = reopen_data_store(data_file_name,
+                                           append_only=append_only,
+                                           thread_safe=True,
+                                           min_compaction_size=0)
+            errors = []
+
+            def write(thread_number):
+                try:
+                    for number in range(40):
+                        key = (thread_number, number % 10)
+                        dict_store[key] = number
+                        dict_store['shared'] = (thread_number, number)
+                        if number % 7 == 0:
+                            del dict_store[key]
+                        if number % 13 == 0:
+                            with dict_store.transaction():
+                                dict_store[thread_number] = number
+                                dict_store.delete_many([key])
+                except Exception as error:
+                    errors.append(error)
+
+            def read():
+                try:
+                    for _ in range(200):
+                        for key in dict_store.keys():
+                            dict_store.get(key)
+                        len(dict_store)
+                except Exception as error:
+                    errors.append(error)
+
+            threads = [
+                threading.Thread(target=write, args=(thread_number,))
+                for thread_number in range(8)
+                ] + [threading.Thread(target=read) for _ in range(4)]
+
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors, [])
+
+            expected = dict(zip(dict_store.keys(), dict_store.values()))
+
+            dict_store = reopen_data_store(data_file_name)
+            self.assertEqual(
+                dict(zip(dict_store.keys(), dict_store.values())),
+                expected
+                )
+
+
+@unittest.skipIf(importlib.util.find_spec('fcntl') is None,
+                 'file locks need fcntl')
+class TestMultipleProcesses(unittest.TestCase):
+    """
+    checks if processes sharing a data file
+    see the changes made by each other
+    """
+
+    def test_foreign_changes_are_replayed(self):
+        """
+        checks if appends made by another instance are replayed
+        from the end of the data file last seen and a rewrite
+        makes the data file load again
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_foreign_changes_are_replayed.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        # two instances of the same data file stand in for two processes
+        first = reopen_data_store(data_file_name,
+                                  multiprocess=True,
+                                  append_only=True)
+        DictStore.release(first.datastore_location)
+        second = DictStore(data_file_name, multiprocess=True)
+
+        first['a'] = 1
+        first['b'] = 2
+        self.assertEqual(second['b'], 2)
+        data_file_size = os.path.getsize(data_file_name)
+        first['a'] = 3
+
+        with unittest.mock.patch.object(
+                file_handler.FileHandler,
+                'read_records',
+                side_effect=file_handler.FileHandler.read_records,
+                autospec=True
+                ) as read_records:
+            self.assertEqual(second['a'], 3)
+            self.assertEqual(read_records.call_args[0][1], data_file_size)
+
+            # second rewrites the data file when a key is overwritten
+            second['b'] = 4
+            self.assertEqual(first['b'], 4)
+            self.assertEqual(read_records.call_args[0],
+                             (first.file_handler,))
+
+        del first['a']
+        self.assertIsNone(second['a'])
+        self.assertEqual(len(second), len(first))
+
+        first.close()
+        second.close()
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store['b'], 4)
+        self.assertIsNone(dict_store['a'])
+
+    def test_processes_share_data_file(self):
+        """
+        checks if transactions of many processes
+        on the same data file are serialized
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_processes_share_data_file.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with reopen_data_store(data_file_name) as dict_store:
+            dict_store['counter'] = 0
+
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=increment_counters,
+                            args=(data_file_name, worker_number))
+            for worker_number in range(4)
+            ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store['counter'], 100)
+        self.assertEqual(dict_store[(3, 24)], 24)
+
+    def test_file_locks_are_only_needed_by_multiprocess(self):
+        """
+        checks if datastores open on platforms without fcntl
+        unless multiprocess mode asks for file locks
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_file_locks_are_only_needed_by_multiprocess'
+                          '.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        # importing a module set to None in sys.modules fails
+        with unittest.mock.patch.dict('sys.modules', {'fcntl': None}):
+            dict_store = reopen_data_store(data_file_name, thread_safe=True)
+            dict_store['a'] = 1
+            dict_store.close()
+
+            with self.assertRaises(NotImplementedError):
+                reopen_data_store(data_file_name, multiprocess=True)
+            self.assertIsNone(DictStore.opened_instance(data_file_name))
+
+
+class TestAsyncDictStore(unittest.TestCase):
+    """
+    checks the asyncio interface
+    """
+
+    def run_coroutine(self, coroutine):
+        """runs the coroutine on a new event loop"""
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_writes_are_batched(self):
+        """
+        checks if writes made at the same time are written
+        with a single append and reads are served from memory
+        """
+
+        data_file_name = 'tests/test_data/test_writes_are_batched.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        async def write():
+            store = AsyncDictStore(data_file_name, append_only=True)
+            await store.set('warm', 'up')
+
+            with unittest.mock.patch.object(
+                    file_handler.FileHandler,
+                    'append_to_file',
+                    side_effect=file_handler.FileHandler.append_to_file,
+                    autospec=True
+                    ) as append_to_file:
+                await asyncio.gather(*(
+                    store.set(key, key * 2) for key in range(100)
+                    ), store.delete('warm'))
+
+            self.assertLess(append_to_file.call_count, 10)
+            self.assertEqual(store[99], 198)
+            self.assertIsNone(store['warm'])
+            self.assertEqual(len(store.keys()), 100)
+            await store.close()
+
+        self.run_coroutine(write())
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[50], 100)
+        self.assertIsNone(dict_store['warm'])
+
+    def test_invalid_write_fails_alone(self):
+        """
+        checks if an invalid write raises from its own awaitable
+        without failing the writes batched with it
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_invalid_write_fails_alone.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        async def write():
+            async with AsyncDictStore(data_file_name) as store:
+                results = await asyncio.gather(
+                    store.set('a', 1),
+                    store.set('b', Test()),
+                    store.update({'c': 3}),
+                    return_exceptions=True
+                    )
+                self.assertIsNone(results[0])
+                self.assertIsInstance(results[1], UnsupportedValueType)
+                self.assertEqual(store['c'], 3)
+
+        self.run_coroutine(write())
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store['a'], 1)
+        self.assertIsNone(dict_store['b'])
+
+    def test_closed_event_loop_does_not_stop_writer(self):
+        """
+        checks if a write whose event loop is closed before it
+        completes leaves the writer thread running
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_closed_event_loop_does_not_stop_writer'
+                          '.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        store = AsyncDictStore(data_file_name)
+        written = threading.Event()
+        set_many = store.dict_store.set_many
+
+        def wait_and_set_many(records):
+            written.wait()
+            set_many(records)
+
+        with unittest.mock.patch.object(store.dict_store, 'set_many',
+                                        side_effect=wait_and_set_many):
+            loop = asyncio.new_event_loop()
+            task = loop.create_task(store.set('a', 1))
+            loop.run_until_complete(asyncio.sleep(0.01))
+            task.cancel()
+            loop.run_until_complete(asyncio.gather(
+                task, return_exceptions=True))
+            loop.close()
+            written.set()
+
+            async def write():
+                await asyncio.wait_for(store.set('b', 2), 5)
+                await store.close()
+
+            self.run_coroutine(write())
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store['a'], 1)
+        self.assertEqual(dict_store['b'], 2)
+
+    def test_reads_do_not_wait_for_rewrites(self):
+        """
+        checks if reads made while the writer thread rewrites
+        the data file return without waiting for it, and that
+        the datastore must be thread safe
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_reads_do_not_wait_for_rewrites.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        rewrite_to_file = file_handler.FileHandler.rewrite_to_file
+
+        def slow_rewrite_to_file(*args, **kwargs):
+            time.sleep(0.5)
+            return rewrite_to_file(*args, **kwargs)
+
+        async def read_while_writing():
+            async with AsyncDictStore(data_file_name) as store:
+                await store.set('a', 1)
+
+                with unittest.mock.patch.object(
+                        file_handler.FileHandler,
+                        'rewrite_to_file',
+                        side_effect=slow_rewrite_to_file,
+                        autospec=True
+                        ):
+                    # overwriting a key rewrites the data file
+                    write = asyncio.ensure_future(store.set('a', 2))
+                    await asyncio.sleep(0.1)
+
+                    start = time.monotonic()
+                    self.assertIn(store.get('a'), (1, 2))
+                    self.assertIn('a', store)
+                    self.assertNotIn('c', store)
+                    self.assertIsNone(store['c'])
+                    self.assertLess(time.monotonic() - start, 0.1)
+                    self.assertFalse(write.done())
+                    await write
+
+                self.assertEqual(store['a'], 2)
+
+        self.run_coroutine(read_while_writing())
+
+        dict_store = reopen_data_store(data_file_name)
+        with self.assertRaises(ValueError):
+            AsyncDictStore(data_file_name)
+        dict_store.close()
+        with self.assertRaises(ValueError):
+            AsyncDictStore(data_file_name, thread_safe=False)
+        DictStore(data_file_name).close()
+
+    def test_flush_syncs_data_file(self):
+        """
+        checks if flush completes once the writes
+        before it are written to the disk
+        """
+
+        data_file_name = 'tests/test_data/test_flush_syncs_data_file.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        async def write():
+            async with AsyncDictStore(data_file_name) as store:
+                await store.set('a', 1)
+                with unittest.mock.patch('os.fsync') as fsync:
+                    await store.flush()
+                fsync.assert_called_once()
+
+                # rewrites are written to the disk as well
+                await store.set('a', 2)
+                with unittest.mock.patch('os.fsync') as fsync:
+                    await store.flush()
+                fsync.assert_called_once()
+
+        self.run_coroutine(write())
+
+
+class TestWriteBehind(unittest.TestCase):
+    """
+    checks if writes are deferred and coalesced in write behind mode
+    """
+
+    def test_repeated_writes_are_coalesced(self):
+        """
+        checks if many writes of the same keys are written
+        to the data file once, with a single append
+        """
+
+        for append_only in (False, True):
+            data_file_name = ('tests/test_data/'
+                              'test_repeated_writes_are_coalesced_'
+                              + str(append_only) + '.dictstore'
+                              )
+
+            clean_temp_files(data_file_name)
+            self.addCleanup(clean_temp_files, data_file_name)
+
+            dict_store = reopen_data_store(data_file_name,
+                                           append_only=append_only,
+                                           write_behind=True,
+                                           flush_interval=60)
+            dict_store['removed'] = 0
+            dict_store.flush()
+            data_file_size = os.path.getsize(data_file_name)
+
+            with unittest.mock.patch.object(
+                    file_handler.FileHandler,
+                    'append_to_file',
+                    side_effect=file_handler.FileHandler.append_to_file,
+                    autospec=True
+                    ) as append_to_file:
+                for number in range(500):
+                    dict_store['counter'] = number
+                    dict_store['other'] = -number
+                del dict_store['removed']
+
+                self.assertEqual(dict_store['counter'], 499)
+                self.assertIsNone(dict_store['removed'])
+                self.assertEqual(dict_store.pending_write_count(), 3)
+                self.assertEqual(os.path.getsize(data_file_name),
+                                 data_file_size)
+
+                dict_store.flush()
+
+            self.assertEqual(dict_store.pending_write_count(), 0)
+            self.assertLessEqual(append_to_file.call_count, 1)
+
+            dict_store = reopen_data_store(data_file_name)
+            self.assertEqual(dict_store['counter'], 499)
+            self.assertEqual(dict_store['other'], -499)
+            self.assertIsNone(dict_store['removed'])
+
+    def test_pending_writes_are_flushed(self):
+        """
+        checks if the pending writes are written once the
+        flush threshold or the flush interval is reached
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_pending_writes_are_flushed.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name,
+                                       write_behind=True,
+                                       flush_interval=60,
+                                       flush_threshold=10)
+        dict_store.set_many((key, key) for key in range(9))
+        self.assertEqual(dict_store.pending_write_count(), 9)
+        dict_store[9] = 9
+        self.assertEqual(dict_store.pending_write_count(), 0)
+        self.assertLess(dict_store.time_since_last_flush(), 1)
+
+        dict_store = reopen_data_store(data_file_name,
+                                       write_behind=True,
+                                       flush_interval=0.05)
+        dict_store[10] = 10
+        self.assertEqual(dict_store.pending_write_count(), 1)
+        time.sleep(0.5)
+        self.assertEqual(dict_store.pending_write_count(), 0)
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict_store[9], 9)
+        self.assertEqual(dict_store[10], 10)
+
+    def test_lazy_write_behind(self):
+        """
+        checks if the pending writes of a lazy datastore are kept
+        in memory until they are written to the data file
+        """
+
+        data_file_name = 'tests/test_data/test_lazy_write_behind.dictstore'
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        with reopen_data_store(data_file_name) as dict_store:
+            dict_store.set_many((key, str(key)) for key in range(5))
+
+        dict_store = reopen_data_store(data_file_name,
+                                       lazy=True,
+                                       cache_size=0,
+                                       write_behind=True,
+                                       flush_interval=60)
+        dict_store[0] = 'zero'
+        dict_store[5] = 'five'
+        del dict_store[1]
+        dict_store[6] = 'six'
+        del dict_store[6]
+
+        self.assertEqual(dict_store[0], 'zero')
+        self.assertIsNone(dict_store[1])
+        self.assertIsNone(dict_store[6])
+        self.assertEqual(len(dict_store), 5)
+        self.assertEqual(dict_store.pending_write_count(), 4)
+
+        dict_store.close()
+
+        dict_store = reopen_data_store(data_file_name, lazy=True)
+        self.assertEqual(
+            dict(zip(dict_store.keys(), dict_store.values())),
+            {0: 'zero', 2: '2', 3: '3', 4: '4', 5: 'five'}
+            )
+
+    def test_reads_wait_for_the_flush_timer(self):
+        """
+        checks if reads of a lazy write behind datastore see the
+        right values while its timer thread rewrites the data file
+        """
+
+        data_file_name = ('tests/test_data/'
+                          'test_reads_wait_for_the_flush_timer.dictstore'
+                          )
+
+        clean_temp_files(data_file_name)
+        self.addCleanup(clean_temp_files, data_file_name)
+
+        dict_store = reopen_data_store(data_file_name,
+                                       lazy=True,
+                                       cache_size=0,
+                                       write_behind=True,
+                                       flush_interval=0.001,
+                                       compaction_ratio=None)
+        self.assertTrue(dict_store.thread_safe)
+
+        expected = {}
+        for number in range(300):
+            key = number % 20
+            dict_store[key] = 'value ' * number * 20
+            expected[key] = 'value ' * number * 20
+            for read_key in range(0, 20, 3):
+                self.assertEqual(dict_store.get(read_key),
+                                 expected.get(read_key))
+        dict_store.close()
+
+        dict_store = reopen_data_store(data_file_name)
+        self.assertEqual(dict(dict_store), expected)
+
+
+class TestShardedDictStore(unittest.TestCase):
+    """
+    checks if keys are partitioned across shard data files
+    """
+
+    def test_keys_are_partitioned(self):
+        """
+        checks if every key goes to one shard, shards are loaded
+        when they are used and reopened with the same layout
+        """
+
+        directory = 'tests/test_data/test_keys_are_partitioned'
+        clean_temp_files(directory)
+        self.addCleanup(clean_temp_files, directory)
+
+        with ShardedDictStore(directory, shard_count=4) as store:
+            store['a'] = 1
+            self.assertEqual(store.loaded_shards(),
+                             [sharding.shard_index('a', 4)])
+
+            store.set_many((key, str(key)) for key in range(100))
+            del store[5]
+            store.delete_many([6, 7])
+
+            self.assertEqual(store[1.0], '1')
+            self.assertIsNone(store[(1, 2)])
+            self.assertEqual(sorted(store.loaded_shards()), [0, 1, 2, 3])
+
+        self.assertEqual(
+            sorted(os.listdir(directory)),
+            ['shard-{:04d}-of-0004.dictstore'.format(index)
+             for index in range(4)]
+            )
+
+        with self.assertRaises(ValueError):
+            ShardedDictStore(directory, shard_count=8)
+
+        with ShardedDictStore(directory) as store:
+            self.assertEqual(store.shard_count, 4)
+            self.assertEqual(store['a'], 1)
+            self.assertEqual(store[99], '99')
+            self.assertIsNone(store[5])
+            self.assertIsNone(store[7])
+
+            for index in range(4):
+                for key in store.shard(index).keys():
+                    self.assertEqual(sharding.shard_index(key, 4), index)
+
+            self.assertIn(99, store)
+            self.assertNotIn(5, store)
+            self.assertEqual(len(store), 98)
+            self.assertEqual(sorted(store, key=str), sorted(
+                ['a'] + [key for key in range(100) if key not in (5, 6, 7)],
+                key=str))
+            self.assertEqual(dict(store.items())[42], '42')
+
+    def test_shards_are_compacted_separately(self):
+        """
+        checks if compacting a shard leaves the other shards
+        and loading the shards in parallel loads all of them
+        """
+
+        directory = 'tests/test_data/test_shards_are_compacted_separately'
+        clean_temp_files(directory)
+        self.addCleanup(clean_temp_files, directory)
+
+        with ShardedDictStore(directory,
+                              shard_count=2,
+                              append_only=True,
+                              min_compaction_size=0,
+                              compaction_ratio=None) as store:
+            store.set_many((key, key) for key in range(20))
+            store.set_many((key, -key) for key in range(20))
+            store.flush()
+
+            sizes = [os.path.getsize(store.shard_path(index))
+                     for index in range(2)]
+            store.shard(0).compact()
+
+            self.assertLess(os.path.getsize(store.shard_path(0)), sizes[0])
+            self.assertEqual(os.path.getsize(store.shard_path(1)), sizes[1])
+
+        with ShardedDictStore(directory, preload=True, workers=2) as store:
+            self.assertEqual(store.loaded_shards(), [0, 1])
+            self.assertEqual(store[19], -19)
+
 
 if __name__ == '__main__':
     unittest.main()